@@ -0,0 +1,193 @@
+"""
+Contrôle d'admission des endpoints coûteux (ADMISSION_CONFIG)
+
+Chaque endpoint configuré a une limite de requêtes traitées en même temps et
+une file d'attente bornée. Une requête qui trouve la file pleine, ou qui y
+attend plus de max_wait_seconds, reçoit aussitôt une réponse 503 server_busy
+avec Retry-After, avant même la lecture de son corps : sous une rafale, le
+worker ne garde pas en mémoire des dizaines d'uploads et d'images décodées
+qu'il ne pourra pas traiter à temps. Les endpoints non configurés (/health,
+/ready, /config, /metrics...) ne passent par aucune file et ne sont jamais
+affamés.
+"""
+import asyncio
+import json
+import math
+import time
+from collections import deque
+from config import ADMISSION_CONFIG
+from metrics import admission_queue_depth, admission_rejected, admission_wait, endpoint_label, record_error
+
+
+class AdmissionRejected(Exception):
+    """Exception levée quand une requête n'est pas admise (file pleine ou attente trop longue)"""
+    def __init__(self, message, reason, retry_after):
+        self.message = message
+        self.reason = reason
+        self.retry_after = retry_after
+        super().__init__(self.message)
+
+
+class AdmissionGate:
+    """Limite de concurrence et file d'attente FIFO bornée d'un endpoint"""
+
+    def __init__(self, name, concurrency, max_queue, max_wait_seconds):
+        self.name = name
+        self.concurrency = max(1, int(concurrency))
+        self.max_queue = max(0, int(max_queue))
+        self.max_wait = float(max_wait_seconds)
+        self.active = 0
+        self._waiters = deque()
+
+        # Statistiques (modifiées uniquement depuis la boucle d'événements)
+        self._admitted = 0
+        self._rejected = {"queue_full": 0, "timeout": 0}
+        self._service_time = None  # moyenne mobile de la durée de traitement (s)
+        self._total_wait = 0.0
+        self._max_wait_seen = 0.0
+
+    def retry_after(self):
+        """Secondes estimées avant qu'une place se libère pour une nouvelle requête"""
+        service_time = self._service_time or 1.0
+        return max(1, math.ceil(service_time * (len(self._waiters) + 1) / self.concurrency))
+
+    def _reject(self, reason):
+        self._rejected[reason] += 1
+        admission_rejected.inc(endpoint_label(self.name), reason)
+        if reason == "queue_full":
+            message = f"Service surchargé ({self.name} : {self.active} en cours, file pleine), réessayez plus tard"
+        else:
+            message = f"Service surchargé ({self.name} : attente supérieure à {self.max_wait:g} s), réessayez plus tard"
+        return AdmissionRejected(message, reason, self.retry_after())
+
+    async def acquire(self):
+        """
+        Attend une place et retourne le temps d'attente (secondes)
+
+        Raises:
+            AdmissionRejected: File pleine ou attente supérieure à max_wait_seconds
+        """
+        if self.active < self.concurrency and not self._waiters:
+            self.active += 1
+            self._admitted += 1
+            return 0.0
+        if len(self._waiters) >= self.max_queue:
+            raise self._reject("queue_full")
+
+        start = time.perf_counter()
+        future = asyncio.get_running_loop().create_future()
+        self._waiters.append(future)
+        admission_queue_depth.inc(endpoint_label(self.name))
+        try:
+            # asyncio.wait n'annule pas le futur : la place transmise par release() n'est jamais perdue
+            await asyncio.wait({future}, timeout=self.max_wait)
+        except asyncio.CancelledError:
+            # Client parti pendant l'attente : rendre la place si elle venait d'être transmise
+            if future.done():
+                self.release()
+            else:
+                future.cancel()
+            raise
+        finally:
+            if future in self._waiters:
+                self._waiters.remove(future)
+            admission_queue_depth.dec(endpoint_label(self.name))
+
+        if not future.done():
+            future.cancel()
+            raise self._reject("timeout")
+
+        waited = time.perf_counter() - start
+        self._admitted += 1
+        self._total_wait += waited
+        self._max_wait_seen = max(self._max_wait_seen, waited)
+        return waited
+
+    def release(self, service_time=None):
+        """Libère une place et la transmet au plus ancien en attente"""
+        if service_time is not None:
+            self._service_time = service_time if self._service_time is None else (
+                0.8 * self._service_time + 0.2 * service_time
+            )
+        while self._waiters:
+            future = self._waiters.popleft()
+            if not future.done():
+                # La place passe directement au suivant (active inchangé)
+                future.set_result(None)
+                return
+        self.active -= 1
+
+    def stats(self):
+        return {
+            "concurrency": self.concurrency,
+            "max_queue": self.max_queue,
+            "max_wait_seconds": self.max_wait,
+            "active": self.active,
+            "waiting": len(self._waiters),
+            "admitted": self._admitted,
+            "rejected": dict(self._rejected),
+            "avg_wait_ms": self._total_wait / self._admitted * 1000.0 if self._admitted else 0.0,
+            "max_wait_ms": self._max_wait_seen * 1000.0,
+            "avg_service_ms": self._service_time * 1000.0 if self._service_time is not None else None,
+        }
+
+
+# Une file par endpoint configuré
+gates = {
+    path: AdmissionGate(path, **limits)
+    for path, limits in ADMISSION_CONFIG["endpoints"].items()
+}
+
+
+def admission_stats():
+    """Statistiques de toutes les files d'admission (exposées par /stats)"""
+    return {path: gate.stats() for path, gate in gates.items()}
+
+
+class AdmissionMiddleware:
+    """
+    Middleware ASGI : admet les requêtes des endpoints configurés dans la
+    limite de concurrence, ou répond 503 sans lire le corps
+    """
+
+    def __init__(self, app, gates=None):
+        self.app = app
+        self.gates = gates if gates is not None else globals()["gates"]
+
+    async def __call__(self, scope, receive, send):
+        gate = self.gates.get(scope.get("path")) if scope["type"] == "http" else None
+        if gate is None or not ADMISSION_CONFIG["enabled"]:
+            return await self.app(scope, receive, send)
+
+        try:
+            waited = await gate.acquire()
+        except AdmissionRejected as e:
+            record_error("server_busy")
+            return await self._reject(send, e)
+        admission_wait.observe(waited, endpoint_label(gate.name))
+
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            gate.release(time.perf_counter() - start)
+
+    @staticmethod
+    async def _reject(send, rejection):
+        body = json.dumps({
+            "detail": {
+                "error": "server_busy",
+                "message": rejection.message,
+                "reason": rejection.reason,
+            }
+        }).encode("utf-8")
+        await send({
+            "type": "http.response.start",
+            "status": 503,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode("latin-1")),
+                (b"retry-after", str(rejection.retry_after).encode("latin-1")),
+            ],
+        })
+        await send({"type": "http.response.body", "body": body})
@@ -1,28 +1,320 @@
-from PIL import Image
+from PIL import Image, ImageChops
 import io
+import queue
+import threading
+import time
 import numpy as np
-from typing import Tuple
+from contextlib import contextmanager
+from typing import Tuple, Union
+from image_context import ImageContext
+from mask_refinement import upsample_mask
+from metrics import observe_stage, stage
+from model_registry import model_registry
+from cpu_threads import current_budget, rembg_session_threads
+from config import BACKGROUND_REMOVAL_CONFIG, EXECUTOR_CONFIG, THREADING_CONFIG
+
+# Formats d'entrée pris en charge
+INPUT_FORMATS = ("JPEG", "PNG", "WEBP")
+
+# Formats de sortie : image RGBA détourée, ou masque alpha seul
+OUTPUT_FORMATS = ("png", "webp", "mask")
+OUTPUT_MEDIA_TYPES = {"png": "image/png", "webp": "image/webp", "mask": "image/png"}
+
+
+def check_input_format(context):
+    """
+    Vérifie, sur l'en-tête seul, que le format de l'upload est pris en charge
+
+    Raises:
+        ValueError: Si l'image est illisible ou dans un format non supporté
+    """
+    try:
+        image_format = context.format
+    except OSError as e:
+        raise ValueError(f"Image invalide: {str(e)}")
+    if image_format not in INPUT_FORMATS:
+        raise ValueError(f"Format d'image non supporté: {image_format}")
+
+
+def output_options(output_format=None, compress_level=None, lossless=None, quality=None):
+    """
+    Options d'encodage complétées par BACKGROUND_REMOVAL_CONFIG
+
+    Raises:
+        ValueError: Si le format ou un réglage est invalide
+    """
+    config = BACKGROUND_REMOVAL_CONFIG
+    options = {
+        "output_format": output_format or config["output_format"],
+        "compress_level": config["png_compress_level"] if compress_level is None else int(compress_level),
+        "lossless": config["webp_lossless"] if lossless is None else bool(lossless),
+        "quality": config["webp_quality"] if quality is None else int(quality),
+    }
+    if options["output_format"] not in OUTPUT_FORMATS:
+        raise ValueError(
+            f"Format de sortie inconnu: {options['output_format']} (attendu: {', '.join(OUTPUT_FORMATS)})"
+        )
+    if not 0 <= options["compress_level"] <= 9:
+        raise ValueError("Le niveau de compression PNG doit être compris entre 0 et 9")
+    if not 0 <= options["quality"] <= 100:
+        raise ValueError("La qualité WebP doit être comprise entre 0 et 100")
+    return options
+
+
+def encode_output(image, output_format=None, compress_level=None, lossless=None, quality=None):
+    """
+    Encode l'image détourée (RGBA, ou masque "L" déjà extrait) dans le format demandé
+
+    Returns:
+        Tuple[bytes, dict]: (octets encodés, {output_format, media_type, mode, encode_ms, output_bytes})
+    """
+    options = output_options(output_format, compress_level, lossless, quality)
+    output_format = options["output_format"]
+
+    start = time.perf_counter()
+    buffer = io.BytesIO()
+    if output_format == "mask":
+        # Canal alpha seul : 1 octet par pixel au lieu de 4
+        if image.mode == "RGBA":
+            image = image.getchannel("A")
+        elif image.mode != "L":
+            image = Image.new("L", image.size, 255)
+        image.save(buffer, format="PNG", compress_level=options["compress_level"])
+    elif output_format == "webp":
+        image.save(buffer, format="WEBP", lossless=options["lossless"], quality=options["quality"])
+    else:
+        image.save(buffer, format="PNG", compress_level=options["compress_level"])
+    output_bytes = buffer.getvalue()
+    encode_seconds = time.perf_counter() - start
+    observe_stage("encode", encode_seconds)
+
+    return output_bytes, {
+        "output_format": output_format,
+        "media_type": OUTPUT_MEDIA_TYPES[output_format],
+        "mode": image.mode,
+        "encode_ms": encode_seconds * 1000.0,
+        "output_bytes": len(output_bytes),
+    }
+
 
 class BackgroundRemovalService:
     """Service pour supprimer l'arrière-plan des images de vêtements"""
 
-    def __init__(self):
-        """Initialise le service de suppression d'arrière-plan"""
-        self.rembg_available = False
+    def __init__(self, model_name=None, pool_size=None, intra_op_threads=None, inter_op_threads=None,
+                 mask_max_side=False):
+        """
+        Initialise le service de suppression d'arrière-plan
+
+        Args:
+            model_name: Modèle rembg (u2net, u2netp, isnet-general-use, silueta...)
+            pool_size: Nombre de sessions onnxruntime réutilisables (une par worker)
+            intra_op_threads: Threads onnxruntime par opérateur, par session
+            inter_op_threads: Threads onnxruntime entre opérateurs, par session
+            mask_max_side: Plus grand côté de la copie réduite sur laquelle le masque
+                           est calculé (None = pleine résolution, défaut: config)
+        """
+        config = BACKGROUND_REMOVAL_CONFIG
+        self.model_name = model_name or config["model_name"]
+        self.mask_max_side = config["mask_max_side"] if mask_max_side is False else mask_max_side
+        self.pool_size = max(1, int(
+            pool_size
+            or config["session_pool_size"]
+            or EXECUTOR_CONFIG["remove_background"]["max_workers"]
+        ))
+        self._intra_op_threads = intra_op_threads
+        self.inter_op_threads = inter_op_threads if inter_op_threads is not None else THREADING_CONFIG["rembg_inter_op_threads"]
+
+        # Pool de sessions pré-créées et réutilisées entre les appels
+        self._sessions = queue.Queue()
+        self._sessions_created = 0
+        self._pool_lock = threading.Lock()
+        self.warmup_time = None
+
+        # rembg est importé au premier usage (import coûteux)
+        self._load_lock = threading.Lock()
+        self._rembg_loaded = False
+        self._rembg_available = False
+        self.remove_func = None
+        self.new_session_func = None
+
+    def load(self):
+        """Importe rembg si ce n'est pas déjà fait (sinon fallback simple)"""
+        if self._rembg_loaded:
+            return self
+        with self._load_lock:
+            if not self._rembg_loaded:
+                try:
+                    from rembg import remove, new_session
+                    self.remove_func = remove
+                    self.new_session_func = new_session
+                    self._rembg_available = True
+                except ImportError:
+                    print("⚠️ rembg n'est pas disponible. Utilisation d'un fallback simple.")
+                self._rembg_loaded = True
+        return self
+
+    @property
+    def rembg_available(self):
+        self.load()
+        return self._rembg_available
+
+    @property
+    def intra_op_threads(self):
+        """Threads par session : explicites, sinon budget du worker (appliqué après le fork) partagé entre les sessions"""
+        if self._intra_op_threads is not None:
+            return self._intra_op_threads
+        return rembg_session_threads(current_budget()["per_worker_cpus"], self.pool_size)
+
+    def _create_session(self):
+        """Crée une session rembg avec les réglages de threads onnxruntime"""
+        import onnxruntime as ort
+
+        sess_opts = ort.SessionOptions()
+        sess_opts.intra_op_num_threads = int(self.intra_op_threads)
+        sess_opts.inter_op_num_threads = int(self.inter_op_threads)
         try:
-            from rembg import remove
-            self.remove_func = remove
-            self.rembg_available = True
-        except ImportError:
-            print("⚠️ rembg n'est pas disponible. Utilisation d'un fallback simple.")
-            self.remove_func = None
-
-    def remove_background(self, image_bytes: bytes) -> Tuple[bytes, dict]:
+            return self.new_session_func(self.model_name, sess_opts=sess_opts)
+        except TypeError:
+            # Anciennes versions de rembg : options non configurables (OMP_NUM_THREADS)
+            return self.new_session_func(self.model_name)
+
+    @contextmanager
+    def session(self):
+        """
+        Emprunte une session du pool (créée à la demande jusqu'à pool_size,
+        sinon attend qu'une session soit rendue)
+        """
+        try:
+            session = self._sessions.get_nowait()
+        except queue.Empty:
+            session = None
+            with self._pool_lock:
+                if self._sessions_created < self.pool_size:
+                    self._sessions_created += 1
+                    create = True
+                else:
+                    create = False
+            if create:
+                try:
+                    session = self._create_session()
+                except Exception:
+                    with self._pool_lock:
+                        self._sessions_created -= 1
+                    raise
+            else:
+                session = self._sessions.get()
+        try:
+            yield session
+        finally:
+            self._sessions.put(session)
+
+    def warmup(self):
+        """
+        Crée toutes les sessions du pool et exécute une inférence sur chacune
+        pour que la première requête ne paie pas l'initialisation
+        """
+        if not self.rembg_available:
+            return None
+
+        start = time.perf_counter()
+        sample = Image.new('RGBA', (64, 64), (255, 255, 255, 255))
+        with self._pool_lock:
+            missing = self.pool_size - self._sessions_created
+            self._sessions_created += missing
+        for _ in range(missing):
+            self._sessions.put(self._create_session())
+
+        sessions = [self._sessions.get() for _ in range(self.pool_size)]
+        try:
+            for session in sessions:
+                self.remove_func(sample, session=session)
+        finally:
+            for session in sessions:
+                self._sessions.put(session)
+
+        self.warmup_time = time.perf_counter() - start
+        return self.warmup_time
+
+    def stats(self):
+        """État du pool de sessions"""
+        return {
+            "method": ('rembg' if self._rembg_available else 'fallback') if self._rembg_loaded else 'not_loaded',
+            "model_name": self.model_name,
+            "pool_size": self.pool_size,
+            "sessions_created": self._sessions_created,
+            "sessions_idle": self._sessions.qsize(),
+            "intra_op_threads": self.intra_op_threads,
+            "inter_op_threads": self.inter_op_threads,
+            "mask_max_side": self.mask_max_side,
+            "warmup_ms": self.warmup_time * 1000.0 if self.warmup_time is not None else None,
+        }
+
+    def _remove_full(self, context):
+        """Détourage sur l'image complète (chemin d'origine)"""
+        # Convertir en RGBA si nécessaire
+        input_image = context.rgba
+
+        if self.rembg_available and self.remove_func:
+            # Utiliser rembg si disponible, avec une session du pool
+            with self.session() as session, stage("segmentation"):
+                output_image = self.remove_func(input_image, session=session)
+        else:
+            # Fallback simple : créer une image avec fond transparent simulé
+            # Pour le MVP, on retourne simplement l'image originale avec un canal alpha
+
+            # Simulation simple : rendre les pixels blancs transparents
+            # (très basique, juste pour le développement)
+            data = context.rgba_array.copy()
+            with stage("segmentation"):
+                # Rendre les pixels très clairs transparents
+                mask = (data[:, :, 0] > 240) & (data[:, :, 1] > 240) & (data[:, :, 2] > 240)
+                data[mask, 3] = 0  # Alpha = 0 pour les pixels blancs
+            output_image = Image.fromarray(data, 'RGBA')
+        return input_image, output_image
+
+    def _remove_downscaled(self, context, options):
+        """
+        Masque calculé sur une copie réduite (décodage JPEG à échelle réduite
+        avant le décodage complet), agrandi en suivant les contours puis
+        appliqué aux pixels d'origine
+        """
+        small_image = context.thumbnail(self.mask_max_side)
+        full_image = context.rgb
+        with stage("segmentation"):
+            mask = upsample_mask(self._mask(small_image), small_image, full_image)
+
+        image = context.image
+        if image.mode in ('RGBA', 'LA', 'PA') or 'transparency' in image.info:
+            # Conserver la transparence d'origine (PNG/WebP avec alpha)
+            input_image = context.rgba
+            mask = ImageChops.darker(input_image.getchannel('A'), mask)
+        else:
+            input_image = context.rgb
+
+        if options['output_format'] == 'mask':
+            # Le client compose lui-même : inutile de construire l'image RGBA
+            return input_image, mask
+        output_image = context.rgb.copy()
+        output_image.putalpha(mask)
+        return input_image, output_image
+
+    def _mask(self, image):
+        """Masque "L" de l'avant-plan d'une image RGB (rembg ou fallback)"""
+        if self.rembg_available and self.remove_func:
+            with self.session() as session:
+                return self.remove_func(image, session=session, only_mask=True)
+        data = np.asarray(image)
+        background = (data[:, :, 0] > 240) & (data[:, :, 1] > 240) & (data[:, :, 2] > 240)
+        return Image.fromarray(np.where(background, 0, 255).astype(np.uint8), 'L')
+
+    def remove_background(self, image_data: Union[bytes, ImageContext], **output) -> Tuple[bytes, dict]:
         """
         Supprime l'arrière-plan d'une image
 
         Args:
-            image_bytes: Bytes de l'image d'entrée
+            image_data: Bytes de l'image d'entrée ou ImageContext partagé
+            **output: Options d'encodage (output_format, compress_level, lossless, quality),
+                      BACKGROUND_REMOVAL_CONFIG par défaut
 
         Returns:
             Tuple[bytes, dict]: (image_sans_arriere_plan_bytes, metadata)
@@ -31,46 +323,35 @@ class BackgroundRemovalService:
             ValueError: Si l'image est invalide
         """
         try:
-            # Charger l'image
-            input_image = Image.open(io.BytesIO(image_bytes))
+            # Charger l'image (décodage partagé avec les autres étapes)
+            context = ImageContext.from_input(image_data)
 
             # Vérifier le format
-            if input_image.format not in ['JPEG', 'PNG', 'WEBP']:
-                raise ValueError(f"Format d'image non supporté: {input_image.format}")
-
-            # Convertir en RGBA si nécessaire
-            if input_image.mode != 'RGBA':
-                input_image = input_image.convert('RGBA')
+            check_input_format(context)
 
-            if self.rembg_available and self.remove_func:
-                # Utiliser rembg si disponible
-                output_image = self.remove_func(input_image)
+            if self.mask_max_side and max(context.size) > self.mask_max_side:
+                input_image, output_image = self._remove_downscaled(context, output_options(**output))
+                mask_size = context.thumbnail(self.mask_max_side).size
             else:
-                # Fallback simple : créer une image avec fond transparent simulé
-                # Pour le MVP, on retourne simplement l'image originale avec un canal alpha
-                output_image = input_image
+                input_image, output_image = self._remove_full(context)
+                mask_size = input_image.size
 
-                # Simulation simple : rendre les pixels blancs transparents
-                # (très basique, juste pour le développement)
-                data = np.array(output_image)
-                # Rendre les pixels très clairs transparents
-                mask = (data[:, :, 0] > 240) & (data[:, :, 1] > 240) & (data[:, :, 2] > 240)
-                data[mask, 3] = 0  # Alpha = 0 pour les pixels blancs
-                output_image = Image.fromarray(data, 'RGBA')
-
-            # Convertir en bytes
-            output_buffer = io.BytesIO()
-            output_image.save(output_buffer, format='PNG')
-            output_bytes = output_buffer.getvalue()
+            # Convertir en bytes (PNG, WebP ou masque seul)
+            output_bytes, encoding = encode_output(output_image, **output)
 
             # Métadonnées
             metadata = {
                 'original_size': input_image.size,
                 'original_mode': input_image.mode,
                 'processed_size': output_image.size,
-                'processed_mode': output_image.mode,
-                'has_transparency': output_image.mode == 'RGBA',
-                'method': 'rembg' if self.rembg_available else 'fallback'
+                'processed_mode': encoding['mode'],
+                'has_transparency': encoding['mode'] == 'RGBA',
+                'method': 'rembg' if self.rembg_available else 'fallback',
+                'mask_size': mask_size,
+                'output_format': encoding['output_format'],
+                'media_type': encoding['media_type'],
+                'encode_ms': encoding['encode_ms'],
+                'output_bytes': encoding['output_bytes']
             }
 
             return output_bytes, metadata
@@ -94,8 +375,9 @@ class BackgroundRemovalService:
             input_image = Image.open(image_path)
 
             if self.rembg_available and self.remove_func:
-                # Utiliser rembg si disponible
-                output_image = self.remove_func(input_image)
+                # Utiliser rembg si disponible, avec une session du pool
+                with self.session() as session:
+                    output_image = self.remove_func(input_image, session=session)
                 method = 'rembg'
             else:
                 # Fallback simple
@@ -128,4 +410,20 @@ class BackgroundRemovalService:
             }
 
 # Instance globale du service
-background_removal_service = BackgroundRemovalService()
\ No newline at end of file
+background_removal_service = BackgroundRemovalService()
+
+model_registry.register(
+    "background_removal",
+    loader=background_removal_service.load,
+    warmup=BackgroundRemovalService.warmup,
+    model_name=f"rembg/{background_removal_service.model_name}",
+    executor="remove_background",
+    preload=BACKGROUND_REMOVAL_CONFIG["warmup_on_startup"]
+)
+
+def remove_background(image_data: Union[bytes, ImageContext], **output) -> Tuple[bytes, dict]:
+    """
+    Raccourci module vers l'instance globale (sérialisable pour un pool de processus)
+    Le premier appel charge et préchauffe rembg s'il ne l'est pas déjà.
+    """
+    return model_registry.get("background_removal").remove_background(image_data, **output)
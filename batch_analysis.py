@@ -0,0 +1,178 @@
+"""
+Analyse en lot pour les imports de garde-robe
+Les images (plusieurs fichiers ou une archive zip) passent par la modération
+puis par l'inférence micro-batchée ; chaque résultat est émis en NDJSON dès
+qu'il est prêt, les erreurs par image étant reportées sans interrompre le lot
+"""
+import asyncio
+import io
+import os
+import zipfile
+from config import BATCH_CONFIG, UPLOAD_CONFIG
+from content_moderation import validate_image_for_clothing, ContentModerationError
+from executors import run_in_executor, ExecutorSaturatedError
+from image_context import ImageContext
+from metrics import record_error
+from result_cache import cached_analysis
+from serialization import dumps, with_embedding_format
+from uploads import read_file_buffer, too_large_message, UploadTooLargeError
+from utils import analyze_image_batched
+
+ZIP_CONTENT_TYPES = ("application/zip", "application/x-zip-compressed")
+
+
+class BatchTooLargeError(ValueError):
+    """Exception levée quand le lot dépasse BATCH_CONFIG["max_items"]"""
+
+
+def is_zip_upload(upload):
+    """Vrai si l'upload est une archive zip"""
+    return (upload.content_type in ZIP_CONTENT_TYPES
+            or (upload.filename or "").lower().endswith(".zip"))
+
+
+def _take_file(upload):
+    """
+    Prend possession du fichier spoolé de l'upload : FastAPI ferme les uploads
+    dès le retour de l'endpoint, avant la fin du flux NDJSON
+    """
+    owned = upload.file
+    upload.file = io.BytesIO()
+    return owned
+
+
+def _zip_entries(archive):
+    """Entrées utiles d'une archive (ni dossiers ni métadonnées macOS)"""
+    for info in archive.infolist():
+        name = info.filename
+        if info.is_dir() or name.startswith("__MACOSX/") or os.path.basename(name).startswith("."):
+            continue
+        yield name, info.file_size, (lambda info=info: archive.read(info))
+
+
+def _file_reader(owned):
+    return lambda: read_file_buffer(owned)
+
+
+def collect_batch_items(uploads):
+    """
+    Liste les images du lot sous forme (nom, taille, lecteur)
+    Le contenu n'est lu qu'au moment du traitement de chaque image
+
+    Returns:
+        tuple: (items, fichiers à fermer une fois le flux terminé)
+
+    Raises:
+        BatchTooLargeError: Si le lot contient trop d'images
+        ValueError: Si une archive zip est invalide
+    """
+    items = []
+    owned_files = []
+    try:
+        for upload in uploads:
+            owned = _take_file(upload)
+            owned_files.append(owned)
+            if is_zip_upload(upload):
+                try:
+                    items.extend(_zip_entries(zipfile.ZipFile(owned)))
+                except zipfile.BadZipFile as e:
+                    raise ValueError(f"Archive zip invalide ({upload.filename}): {e}")
+            else:
+                items.append((upload.filename, upload.size, _file_reader(owned)))
+
+            if len(items) > BATCH_CONFIG["max_items"]:
+                raise BatchTooLargeError(
+                    f"Trop d'images dans le lot (maximum {BATCH_CONFIG['max_items']})"
+                )
+    except Exception:
+        close_files(owned_files)
+        raise
+    return items, owned_files
+
+
+def close_files(files):
+    """Ferme les fichiers dont le lot a pris possession"""
+    for f in files:
+        f.close()
+
+
+def _error_line(index, filename, error, message, **extra):
+    record_error(error)
+    return {"index": index, "filename": filename, "status": "error",
+            "error": error, "message": message, **extra}
+
+
+async def analyze_batch_item(index, filename, size, read, embedding_format="json"):
+    """
+    Analyse une image du lot et retourne sa ligne de résultat
+    (les erreurs sont converties en ligne d'erreur, jamais levées)
+    """
+    if size is not None and size > UPLOAD_CONFIG["max_bytes"]:
+        return _error_line(index, filename, "file_too_large", too_large_message(UPLOAD_CONFIG["max_bytes"]))
+    try:
+        image_bytes = await run_in_executor("analyze", read)
+
+        # Modération avant le cache : /analyze y range des résultats non modérés
+        context = ImageContext(image_bytes)
+        await run_in_executor("analyze", validate_image_for_clothing, context)
+
+        result = await cached_analysis(image_bytes, lambda: analyze_image_batched(context))
+        return {"index": index, "filename": filename, "status": "ok",
+                "result": with_embedding_format(result, embedding_format)}
+
+    except ContentModerationError as e:
+        return _error_line(index, filename, "content_blocked", e.message,
+                           reason=e.reason, confidence=e.confidence)
+    except UploadTooLargeError as e:
+        return _error_line(index, filename, "file_too_large", e.message)
+    except ExecutorSaturatedError as e:
+        return _error_line(index, filename, "server_busy", e.message)
+    except ValueError as e:
+        return _error_line(index, filename, "invalid_image", str(e))
+    except Exception as e:
+        return _error_line(index, filename, "analysis_failed", f"Erreur lors de l'analyse: {str(e)}")
+
+
+async def stream_batch_analysis(items, owned_files=(), embedding_format="json"):
+    """
+    Générateur NDJSON : une ligne par image dans l'ordre de fin de traitement,
+    puis une ligne de résumé. Ferme owned_files à la fin du flux
+
+    Args:
+        embedding_format: Encodage des embeddings (serialization.EMBEDDING_FORMATS)
+    """
+    concurrency = max(1, BATCH_CONFIG["concurrency"])
+    pending = set()
+    queue = iter(enumerate(items))
+    exhausted = False
+    succeeded = failed = 0
+
+    try:
+        while True:
+            while not exhausted and len(pending) < concurrency:
+                try:
+                    index, (filename, size, read) = next(queue)
+                except StopIteration:
+                    exhausted = True
+                    break
+                pending.add(asyncio.ensure_future(analyze_batch_item(index, filename, size, read, embedding_format)))
+
+            if not pending:
+                break
+
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                line = task.result()
+                if line["status"] == "ok":
+                    succeeded += 1
+                else:
+                    failed += 1
+                yield dumps(line) + b"\n"
+
+        summary = {"summary": {"total": succeeded + failed, "succeeded": succeeded, "failed": failed}}
+        yield dumps(summary) + b"\n"
+    finally:
+        # Client déconnecté : abandonner les analyses en cours
+        for task in pending:
+            task.cancel()
+        close_files(owned_files)
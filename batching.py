@@ -0,0 +1,133 @@
+"""
+Micro-batching dynamique pour l'inférence
+Regroupe les requêtes concurrentes pendant une courte fenêtre (ou jusqu'à une
+taille maximale) puis exécute un seul forward pass sur le batch empilé
+"""
+import asyncio
+import contextvars
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+
+class MicroBatcher:
+    """Planificateur qui collecte des éléments et les traite par batch"""
+
+    def __init__(self, run_batch, max_batch_size=8, max_wait_ms=10, name="batcher"):
+        """
+        Args:
+            run_batch: Fonction synchrone list[item] -> list[résultat] (même ordre)
+            max_batch_size: Nombre maximum d'éléments par batch
+            max_wait_ms: Fenêtre maximale d'attente pour compléter un batch (ms)
+            name: Nom du batcher (statistiques, threads)
+        """
+        self.run_batch = run_batch
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait = max(0.0, max_wait_ms / 1000.0)
+        self.name = name
+
+        # Un seul forward pass à la fois : le batch suivant se remplit pendant ce temps
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix=name)
+        self._queue = None
+        self._worker_task = None
+        self._loop = None
+
+        # Statistiques
+        self._in_flight = 0
+        self._total_batches = 0
+        self._total_items = 0
+        self._total_batch_time = 0.0
+        self._max_batch_seen = 0
+        self._histogram = {}
+
+    def _ensure_worker(self):
+        """Démarre la tâche de collecte sur la boucle d'événements courante"""
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop or self._worker_task is None or self._worker_task.done():
+            self._loop = loop
+            self._queue = asyncio.Queue()
+            # Contexte vide : la tâche survit à la requête qui l'a démarrée
+            self._worker_task = loop.create_task(self._worker(), context=contextvars.Context())
+
+    async def submit(self, item):
+        """
+        Soumet un élément et attend son résultat individuel
+
+        Raises:
+            Exception: L'exception levée par run_batch pour le batch concerné
+        """
+        self._ensure_worker()
+        future = self._loop.create_future()
+        await self._queue.put((item, future))
+        return await future
+
+    async def _worker(self):
+        """Boucle de collecte : un batch par fenêtre ou dès qu'il est plein"""
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            deadline = loop.time() + self.max_wait
+
+            while len(batch) < self.max_batch_size:
+                # Prendre d'abord ce qui est déjà en file sans attendre
+                if not self._queue.empty():
+                    batch.append(self._queue.get_nowait())
+                    continue
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+
+            # Ignorer les requêtes annulées entre-temps
+            batch = [(item, future) for item, future in batch if not future.done()]
+            if not batch:
+                continue
+
+            await self._process(loop, batch)
+
+    async def _process(self, loop, batch):
+        """Exécute run_batch hors de la boucle et distribue les résultats"""
+        items = [item for item, _ in batch]
+        size = len(items)
+        self._in_flight = size
+        start = time.perf_counter()
+        try:
+            results = await loop.run_in_executor(self._executor, self.run_batch, items)
+            if len(results) != size:
+                raise RuntimeError(
+                    f"run_batch a retourné {len(results)} résultats pour {size} éléments"
+                )
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+        else:
+            for (_, future), result in zip(batch, results):
+                if not future.done():
+                    future.set_result(result)
+        finally:
+            self._in_flight = 0
+            self._total_batches += 1
+            self._total_items += size
+            self._total_batch_time += time.perf_counter() - start
+            self._max_batch_seen = max(self._max_batch_seen, size)
+            self._histogram[size] = self._histogram.get(size, 0) + 1
+
+    def stats(self):
+        """Retourne les statistiques de file et de taille de batch"""
+        batches = self._total_batches
+        return {
+            "name": self.name,
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait * 1000.0,
+            "queue_depth": self._queue.qsize() if self._queue is not None else 0,
+            "in_flight": self._in_flight,
+            "total_batches": batches,
+            "total_items": self._total_items,
+            "avg_batch_size": self._total_items / batches if batches else 0.0,
+            "max_batch_size_seen": self._max_batch_seen,
+            "avg_batch_time_ms": self._total_batch_time / batches * 1000.0 if batches else 0.0,
+            "batch_size_histogram": {str(k): v for k, v in sorted(self._histogram.items())},
+        }
@@ -0,0 +1,3 @@
+"""
+Benchmarks du service (à lancer depuis la racine : python -m benchmarks.<module>)
+"""
@@ -0,0 +1,201 @@
+"""
+Autotuning des threads, workers et tailles de batch sur la machine courante
+
+Pour chaque combinaison workers x threads (sans dépasser les cœurs disponibles)
+et chaque taille de batch, lance N processus qui exécutent en même temps le
+chemin de /analyze (décodage + prétraitement + forward pass + résultat) ou de
+/remove-background, et mesure le débit total et la latence par appel.
+La meilleure configuration (débit maximal, sous une limite de p95 optionnelle)
+est écrite dans le fichier lu au démarrage par config.py (AUTOTUNE_PATH).
+
+Usage :
+    python -m benchmarks.autotune [--duration 5] [--batch-sizes 1,4,8] [--max-p95-ms 500]
+                                  [--output cache/autotune.json] [--dry-run]
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import statistics
+import time
+from benchmarks.common import make_image_bytes, print_table
+from config import AUTOTUNE_PATH
+from cpu_threads import available_cpus
+
+
+def _measure(kind, threads, batch_size, duration, barrier, queue):
+    """Processus de mesure : prépare le modèle, attend les autres, puis boucle"""
+    import torch
+
+    torch.set_num_threads(threads)
+    try:
+        torch.set_num_interop_threads(1)
+    except RuntimeError:
+        pass
+
+    images = [make_image_bytes(1024, 768, seed=i) for i in range(max(batch_size, 4))]
+    if kind == "analyze":
+        from utils import preprocess_image, run_model_batch, build_analysis, get_model
+
+        get_model()
+
+        def step(i):
+            tensors = [preprocess_image(images[(i + j) % len(images)]) for j in range(batch_size)]
+            for outputs in run_model_batch(tensors):
+                build_analysis(outputs)
+    else:
+        from background_removal import BackgroundRemovalService
+
+        service = BackgroundRemovalService(pool_size=1, intra_op_threads=threads)
+        service.warmup()
+
+        def step(i):
+            service.remove_background(images[i % len(images)])
+
+    step(0)
+    barrier.wait()
+
+    latencies = []
+    deadline = time.perf_counter() + duration
+    i = 0
+    while time.perf_counter() < deadline:
+        start = time.perf_counter()
+        step(i)
+        latencies.append((time.perf_counter() - start) * 1000.0)
+        i += 1
+    queue.put((len(latencies) * batch_size, latencies))
+
+
+def measure(kind, workers, threads, batch_size, duration):
+    """Débit total (images/s) et latence par appel de `workers` processus concurrents"""
+    context = multiprocessing.get_context("spawn")
+    barrier = context.Barrier(workers)
+    queue = context.Queue()
+    processes = [
+        context.Process(target=_measure, args=(kind, threads, batch_size, duration, barrier, queue))
+        for _ in range(workers)
+    ]
+    for process in processes:
+        process.start()
+    images, latencies = 0, []
+    for _ in processes:
+        count, samples = queue.get()
+        images += count
+        latencies.extend(samples)
+    for process in processes:
+        process.join()
+
+    latencies.sort()
+    return {
+        "kind": kind,
+        "workers": workers,
+        "threads": threads,
+        "batch_size": batch_size,
+        "images_per_s": images / duration,
+        "p50_ms": statistics.median(latencies),
+        "p95_ms": latencies[min(len(latencies) - 1, int(round(0.95 * (len(latencies) - 1))))],
+    }
+
+
+def powers_of_two(limit):
+    values = []
+    value = 1
+    while value < limit:
+        values.append(value)
+        value *= 2
+    values.append(limit)
+    return values
+
+
+def best(results, max_p95_ms=None):
+    """Débit maximal parmi les mesures qui respectent la limite de p95"""
+    eligible = [r for r in results if max_p95_ms is None or r["p95_ms"] <= max_p95_ms]
+    return max(eligible or results, key=lambda r: r["images_per_s"])
+
+
+def sweep(cpus, batch_sizes, duration, max_p95_ms=None):
+    combos = [
+        (workers, threads)
+        for workers in powers_of_two(cpus)
+        for threads in powers_of_two(cpus)
+        if workers * threads <= cpus
+    ]
+
+    analyze = []
+    for workers, threads in combos:
+        for batch_size in batch_sizes:
+            analyze.append(measure("analyze", workers, threads, batch_size, duration))
+            print(f"   analyze  workers={workers} threads={threads} batch={batch_size} : "
+                  f"{analyze[-1]['images_per_s']:.1f} images/s")
+    chosen = best(analyze, max_p95_ms)
+
+    # rembg : threads par session pour le nombre de workers retenu
+    remove_background = []
+    for threads in powers_of_two(max(1, cpus // chosen["workers"])):
+        remove_background.append(measure("remove_background", chosen["workers"], threads, 1, duration))
+        print(f"   remove_background workers={chosen['workers']} threads={threads} : "
+              f"{remove_background[-1]['images_per_s']:.1f} images/s")
+    chosen_rembg = best(remove_background, max_p95_ms)
+
+    overlay = {
+        "PREFORK_CONFIG": {"workers": chosen["workers"]},
+        "THREADING_CONFIG": {
+            "torch_intra_op_threads": chosen["threads"],
+            "rembg_intra_op_threads": chosen_rembg["threads"],
+        },
+        "BATCHING_CONFIG": {"max_batch_size": chosen["batch_size"]},
+        "_autotune": {
+            "cpus": cpus,
+            "duration_s": duration,
+            "max_p95_ms": max_p95_ms,
+            "measured_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "results": analyze + remove_background,
+        },
+    }
+    return overlay, analyze + remove_background
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--duration", type=float, default=5.0, help="Secondes de mesure par combinaison")
+    parser.add_argument("--batch-sizes", default="1,4,8")
+    parser.add_argument("--max-p95-ms", type=float, default=None, help="Latence p95 maximale par appel")
+    parser.add_argument("--cpus", type=int, default=None, help="Cœurs à répartir (défaut: détectés)")
+    parser.add_argument("--output", default=AUTOTUNE_PATH)
+    parser.add_argument("--dry-run", action="store_true", help="Afficher sans écrire le fichier")
+    args = parser.parse_args()
+
+    cpus = args.cpus or available_cpus()
+    print(f"🔧 Autotuning sur {cpus} cœur(s)")
+    overlay, results = sweep(
+        cpus,
+        [int(size) for size in args.batch_sizes.split(",")],
+        args.duration,
+        args.max_p95_ms
+    )
+
+    print_table(
+        ["endpoint", "workers", "threads", "batch", "images/s", "p50 (ms)", "p95 (ms)"],
+        [
+            [r["kind"], r["workers"], r["threads"], r["batch_size"], f"{r['images_per_s']:.1f}",
+             f"{r['p50_ms']:.1f}", f"{r['p95_ms']:.1f}"]
+            for r in results
+        ]
+    )
+    print()
+    print(f"✅ Retenu : {overlay['PREFORK_CONFIG']['workers']} worker(s), "
+          f"{overlay['THREADING_CONFIG']['torch_intra_op_threads']} thread(s) torch, "
+          f"batch {overlay['BATCHING_CONFIG']['max_batch_size']}, "
+          f"{overlay['THREADING_CONFIG']['rembg_intra_op_threads']} thread(s) rembg")
+
+    if not args.dry_run:
+        directory = os.path.dirname(args.output)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(args.output, "w") as f:
+            json.dump(overlay, f, indent=2)
+        print(f"💾 Configuration écrite dans {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""
+Benchmark du décodage à résolution réduite (DECODE_CONFIG["fast_decode"])
+
+Compare, pour plusieurs tailles d'image, le décodage complet actuel et le
+décodage JPEG à échelle réduite (Image.draft / reduce) :
+  - temps décodage + prétraitement du tenseur 224x224 (analyse)
+  - temps de la miniature de modération
+  - mémoire de pointe ajoutée (mesurée dans un processus neuf)
+
+Usage :
+    python -m benchmarks.bench_decode [--repeat 5] [--sizes 3MP,12MP] [--json out.json]
+"""
+import argparse
+import json
+from benchmarks.common import IMAGE_SIZES, make_image_bytes, time_call, run_isolated, print_table
+from config import DECODE_CONFIG
+from image_context import ImageContext, get_tensor_transform
+
+
+def decode_for_analysis(image_bytes, fast_decode):
+    """Chemin /analyze : décodage + tenseur du modèle"""
+    return ImageContext(image_bytes, fast_decode=fast_decode).tensor
+
+
+def decode_for_moderation(image_bytes, fast_decode):
+    """Chemin modération : image à la résolution utilisée pour les statistiques"""
+    context = ImageContext(image_bytes, fast_decode=fast_decode)
+    if fast_decode:
+        return context.thumbnail(DECODE_CONFIG["moderation_max_side"])
+    return context.rgb
+
+
+def decode_all_stages(image_bytes, fast_decode):
+    """Analyse + modération sur le même contexte (mesure mémoire)"""
+    context = ImageContext(image_bytes, fast_decode=fast_decode)
+    context.tensor
+    if fast_decode:
+        context.thumbnail(DECODE_CONFIG["moderation_max_side"])
+    else:
+        context.rgb_array
+    return None
+
+
+def run(sizes, repeat):
+    results = []
+    for label in sizes:
+        width, height = IMAGE_SIZES[label]
+        image_bytes = make_image_bytes(width, height, fmt="JPEG")
+        for fast_decode in (False, True):
+            analysis = time_call(decode_for_analysis, image_bytes, fast_decode, repeat=repeat)
+            moderation = time_call(decode_for_moderation, image_bytes, fast_decode, repeat=repeat)
+            _, peak_mb = run_isolated(
+                decode_all_stages, image_bytes, fast_decode, setup=get_tensor_transform
+            )
+            results.append({
+                "size": label,
+                "resolution": f"{width}x{height}",
+                "mode": "fast" if fast_decode else "full",
+                "analysis_ms": analysis["median_ms"],
+                "moderation_ms": moderation["median_ms"],
+                "peak_memory_mb": peak_mb,
+            })
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--sizes", default=",".join(IMAGE_SIZES))
+    parser.add_argument("--json", help="Écrire les résultats dans ce fichier JSON")
+    args = parser.parse_args()
+
+    results = run(args.sizes.split(","), args.repeat)
+
+    print_table(
+        ["taille", "résolution", "mode", "analyse (ms)", "modération (ms)", "mémoire (Mo)"],
+        [
+            [r["size"], r["resolution"], r["mode"], f"{r['analysis_ms']:.1f}",
+             f"{r['moderation_ms']:.1f}", f"{r['peak_memory_mb']:.1f}"]
+            for r in results
+        ]
+    )
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
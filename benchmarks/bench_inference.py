@@ -0,0 +1,83 @@
+"""
+Latence du classifieur selon le backend d'inférence (INFERENCE_CONFIG["backend"])
+
+Pour chaque backend et taille de batch : temps médian et p95 d'un forward pass,
+débit en images/s, et écart des logits par rapport à PyTorch eager.
+
+Usage :
+    python -m benchmarks.bench_inference [--backends torch,onnxruntime] [--batch-sizes 1,8]
+                                         [--threads 1] [--repeat 30] [--json out.json]
+"""
+import argparse
+import json
+import torch
+from benchmarks.common import make_image_bytes, time_call, print_table
+from image_context import ImageContext
+from inference_backends import create_backend
+
+
+def sample_batch(batch_size):
+    """Tenseurs prétraités d'images synthétiques (même chemin que /analyze)"""
+    tensors = [
+        ImageContext(make_image_bytes(640, 480, seed=i)).tensor
+        for i in range(batch_size)
+    ]
+    return torch.stack(tensors)
+
+
+def run(backend_names, batch_sizes, repeat):
+    backends = {name: create_backend(name) for name in backend_names}
+    reference = backends.get("torch") or create_backend("torch")
+    results = []
+    for batch_size in batch_sizes:
+        batch = sample_batch(batch_size)
+        expected = reference.run(batch)
+        for name, backend in backends.items():
+            timing = time_call(backend.run, batch, repeat=repeat, warmup=3)
+            outputs = backend.run(batch)
+            results.append({
+                "backend": name,
+                "batch_size": batch_size,
+                "median_ms": timing["median_ms"],
+                "p95_ms": timing["p95_ms"],
+                "images_per_s": batch_size * 1000.0 / timing["median_ms"],
+                "max_abs_diff": (outputs - expected).abs().max().item(),
+                "top1_agreement": (outputs.argmax(1) == expected.argmax(1)).float().mean().item(),
+            })
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--backends", default="torch,onnxruntime")
+    parser.add_argument("--batch-sizes", default="1,8")
+    parser.add_argument("--threads", type=int, default=None, help="Threads torch/onnxruntime (défaut: torch)")
+    parser.add_argument("--repeat", type=int, default=30)
+    parser.add_argument("--json", help="Écrire les résultats dans ce fichier JSON")
+    args = parser.parse_args()
+
+    if args.threads:
+        torch.set_num_threads(args.threads)
+
+    results = run(
+        args.backends.split(","),
+        [int(size) for size in args.batch_sizes.split(",")],
+        args.repeat
+    )
+
+    print_table(
+        ["backend", "batch", "médiane (ms)", "p95 (ms)", "images/s", "écart max", "top-1 identique"],
+        [
+            [r["backend"], r["batch_size"], f"{r['median_ms']:.1f}", f"{r['p95_ms']:.1f}",
+             f"{r['images_per_s']:.0f}", f"{r['max_abs_diff']:.1e}", f"{r['top1_agreement']:.0%}"]
+            for r in results
+        ]
+    )
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
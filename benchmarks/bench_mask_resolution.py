@@ -0,0 +1,143 @@
+"""
+Benchmark du détourage à basse résolution (BACKGROUND_REMOVAL_CONFIG["mask_max_side"])
+
+Compare, pour plusieurs tailles d'image, le détourage pleine résolution et le
+masque calculé sur une copie réduite puis agrandi par filtre guidé :
+  - temps de bout en bout (décodage, masque, agrandissement, application à
+    l'image ; sortie en masque PNG niveau 1 pour ne pas mesurer l'encodage)
+  - mémoire de pointe ajoutée (mesurée dans un processus neuf)
+  - IoU du masque (alpha > 127) par rapport au chemin pleine résolution
+    et fraction de pixels dont l'alpha diffère de plus de 32
+
+Le masque vient de rembg s'il est installé. Sinon, --simulate-rembg reproduit
+le traitement de rembg autour du réseau (réduction LANCZOS à 320x320, masque,
+agrandissement LANCZOS à la taille d'entrée, découpe), avec un seuil sur le
+blanc à la place du modèle ; sans cette option, c'est le fallback du service.
+La colonne "méthode" l'indique.
+
+Usage :
+    python -m benchmarks.bench_mask_resolution [--repeat 3] [--sizes 3MP,12MP]
+                                               [--mask-sizes 1024,640] [--simulate-rembg]
+                                               [--json out.json]
+"""
+import argparse
+import io
+import json
+import numpy as np
+from PIL import Image
+from benchmarks.common import IMAGE_SIZES, encode, make_image, time_call, run_isolated, print_table
+from background_removal import BackgroundRemovalService
+from image_context import ImageContext
+
+
+def make_product_photo(width, height, seed=0):
+    """Photo produit : vêtement texturé au bord adouci sur fond blanc légèrement bruité"""
+    garment = np.asarray(make_image(width, height, seed=seed), dtype=np.float32) * 0.8
+    y, x = np.mgrid[0:height, 0:width].astype(np.float32)
+    distance = ((x - width / 2) / (width * 0.3)) ** 2 + ((y - height / 2) / (height * 0.4)) ** 2
+    # Manches : deux rectangles arrondis de part et d'autre
+    sleeves = (np.abs(y - height * 0.35) < height * 0.08) & (np.abs(x - width / 2) < width * 0.42)
+    coverage = np.clip((1.0 - distance) * 30.0, 0, 1)
+    coverage[sleeves] = 1.0
+    rng = np.random.RandomState(seed)
+    background = 248 + rng.normal(0, 2, size=(height, width, 3))
+    data = garment * coverage[..., None] + background * (1 - coverage[..., None])
+    return encode(Image.fromarray(np.clip(data, 0, 255).astype(np.uint8), "RGB"), "JPEG")
+
+
+MODEL_SIZE = (320, 320)
+
+
+def simulated_rembg_remove(image, session=None, only_mask=False):
+    """Traitement de rembg.remove autour du réseau (seuil sur le blanc à la place du modèle)"""
+    small = np.asarray(image.convert("RGB").resize(MODEL_SIZE, Image.LANCZOS))
+    foreground = ~((small[:, :, 0] > 240) & (small[:, :, 1] > 240) & (small[:, :, 2] > 240))
+    mask = Image.fromarray(np.where(foreground, 255, 0).astype(np.uint8), "L").resize(image.size, Image.LANCZOS)
+    if only_mask:
+        return mask
+    return Image.composite(image.convert("RGBA"), Image.new("RGBA", image.size, 0), mask)
+
+
+def make_service(mask_max_side, simulate_rembg):
+    service = BackgroundRemovalService(pool_size=1, mask_max_side=mask_max_side)
+    if simulate_rembg:
+        service.load()
+        service._rembg_available = True
+        service.remove_func = simulated_rembg_remove
+        service.new_session_func = lambda *args, **kwargs: None
+    return service
+
+
+def alpha_of(service, image_bytes):
+    output_bytes, metadata = service.remove_background(ImageContext(image_bytes), output_format="mask", compress_level=1)
+    return np.asarray(Image.open(io.BytesIO(output_bytes))), metadata
+
+
+def remove(mask_max_side, simulate_rembg, image_bytes):
+    """Détourage complet dans un processus neuf (mesure mémoire)"""
+    service = make_service(mask_max_side, simulate_rembg)
+    service.remove_background(ImageContext(image_bytes), output_format="mask", compress_level=1)
+    return None
+
+
+def run(sizes, mask_sizes, repeat, simulate_rembg=False):
+    results = []
+    for label in sizes:
+        width, height = IMAGE_SIZES[label]
+        image_bytes = make_product_photo(width, height)
+        reference = None
+        for mask_max_side in [None] + mask_sizes:
+            service = make_service(mask_max_side, simulate_rembg)
+            alpha, metadata = alpha_of(service, image_bytes)
+            if reference is None:
+                reference = alpha
+            foreground, expected = alpha > 127, reference > 127
+            union = np.logical_or(foreground, expected).sum()
+            timing = time_call(alpha_of, service, image_bytes, repeat=repeat)
+            _, peak_mb = run_isolated(remove, mask_max_side, simulate_rembg, image_bytes)
+            results.append({
+                "size": label,
+                "resolution": f"{width}x{height}",
+                "mask_max_side": mask_max_side,
+                "mask_size": "x".join(str(v) for v in metadata["mask_size"]),
+                "method": "rembg simulé" if simulate_rembg else metadata["method"],
+                "median_ms": timing["median_ms"],
+                "peak_memory_mb": peak_mb,
+                "iou": float(np.logical_and(foreground, expected).sum() / union) if union else 1.0,
+                "alpha_diff_gt_32": float((np.abs(alpha.astype(np.int16) - reference) > 32).mean()),
+            })
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--sizes", default="0.8MP,3MP,12MP")
+    parser.add_argument("--mask-sizes", default="1024,640")
+    parser.add_argument("--simulate-rembg", action="store_true", help="Traitement de rembg sans le modèle")
+    parser.add_argument("--json", help="Écrire les résultats dans ce fichier JSON")
+    args = parser.parse_args()
+
+    results = run(
+        args.sizes.split(","),
+        [int(size) for size in args.mask_sizes.split(",")],
+        args.repeat,
+        args.simulate_rembg
+    )
+
+    print_table(
+        ["taille", "masque", "méthode", "médiane (ms)", "mémoire (Mo)", "IoU", "alpha ±32"],
+        [
+            [r["size"], r["mask_size"], r["method"], f"{r['median_ms']:.0f}", f"{r['peak_memory_mb']:.1f}",
+             f"{r['iou']:.4f}", f"{r['alpha_diff_gt_32']:.2%}"]
+            for r in results
+        ]
+    )
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
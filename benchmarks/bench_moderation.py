@@ -0,0 +1,101 @@
+"""
+Benchmark du moteur de modération (content_moderation.moderation_stats)
+
+Compare, pour plusieurs tailles d'image, l'implémentation précédente
+(décodage pleine résolution, masques booléens sur les canaux uint8 puis
+passe ImageStat séparée pour la luminosité) et le moteur actuel (miniature
+bornée, une passe int16 par bandes avec arrêt anticipé) :
+  - temps de bout en bout de la modération (décodage compris)
+  - temps des seules statistiques de couleur
+  - mémoire de pointe ajoutée (mesurée dans un processus neuf)
+
+Usage :
+    python -m benchmarks.bench_moderation [--repeat 5] [--sizes 3MP,12MP] [--json out.json]
+"""
+import argparse
+import json
+import numpy as np
+from PIL import ImageStat
+from benchmarks.common import IMAGE_SIZES, make_image_bytes, time_call, run_isolated, print_table
+from config import DECODE_CONFIG
+from content_moderation import detect_inappropriate_content, moderation_stats
+from image_context import ImageContext
+
+
+def legacy_stats(image):
+    """Statistiques de l'implémentation précédente (uint8, deux passes)"""
+    img_array = np.asarray(image)
+    r, g, b = img_array[:, :, 0], img_array[:, :, 1], img_array[:, :, 2]
+    skin_mask = (
+        (r > 95) & (g > 40) & (b > 20) &
+        (r > g) & (r > b) &
+        (abs(r - g) > 15) &
+        (r - g > 15)
+    )
+    skin_percentage = np.sum(skin_mask) / skin_mask.size
+    stat = ImageStat.Stat(image)
+    return skin_percentage, sum(stat.mean) / len(stat.mean)
+
+
+def legacy_moderation(image_bytes):
+    """Chemin précédent : image complète décodée puis statistiques"""
+    return legacy_stats(ImageContext(image_bytes, fast_decode=False).rgb)
+
+
+def engine_moderation(image_bytes):
+    """Chemin actuel : detect_inappropriate_content sur un contexte neuf"""
+    return detect_inappropriate_content(ImageContext(image_bytes))
+
+
+def run(sizes, repeat):
+    results = []
+    for label in sizes:
+        width, height = IMAGE_SIZES[label]
+        image_bytes = make_image_bytes(width, height, fmt="JPEG")
+        full = ImageContext(image_bytes, fast_decode=False).rgb
+        thumbnail = ImageContext(image_bytes).thumbnail(DECODE_CONFIG["moderation_max_side"])
+
+        for mode, moderate, stats, image in (
+            ("legacy", legacy_moderation, legacy_stats, full),
+            ("engine", engine_moderation, moderation_stats, thumbnail),
+        ):
+            total = time_call(moderate, image_bytes, repeat=repeat)
+            kernel = time_call(stats, image, repeat=repeat)
+            _, peak_mb = run_isolated(moderate, image_bytes)
+            results.append({
+                "size": label,
+                "resolution": f"{width}x{height}",
+                "mode": mode,
+                "total_ms": total["median_ms"],
+                "stats_ms": kernel["median_ms"],
+                "pixels": image.size[0] * image.size[1],
+                "peak_memory_mb": peak_mb,
+            })
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--sizes", default=",".join(IMAGE_SIZES))
+    parser.add_argument("--json", help="Écrire les résultats dans ce fichier JSON")
+    args = parser.parse_args()
+
+    results = run(args.sizes.split(","), args.repeat)
+
+    print_table(
+        ["taille", "résolution", "mode", "total (ms)", "statistiques (ms)", "pixels", "mémoire (Mo)"],
+        [
+            [r["size"], r["resolution"], r["mode"], f"{r['total_ms']:.1f}", f"{r['stats_ms']:.2f}",
+             r["pixels"], f"{r['peak_memory_mb']:.1f}"]
+            for r in results
+        ]
+    )
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""
+Benchmark des formats de sortie de la suppression d'arrière-plan
+(BACKGROUND_REMOVAL_CONFIG["output_format"] et réglages d'encodage)
+
+Pour plusieurs tailles d'image détourée (RGBA, alpha réaliste), compare :
+  - PNG (niveaux de compression 1, 6 par défaut, 9)
+  - WebP sans perte et avec perte (alpha)
+  - masque seul (canal alpha 8 bits en PNG)
+en temps d'encodage et en taille de la réponse.
+
+Usage :
+    python -m benchmarks.bench_output_formats [--repeat 5] [--sizes 0.8MP,12MP] [--json out.json]
+"""
+import argparse
+import json
+import numpy as np
+from PIL import Image
+from benchmarks.common import IMAGE_SIZES, make_image, time_call, print_table
+from background_removal import encode_output
+
+OPTIONS = [
+    ("png (niveau 1)", {"output_format": "png", "compress_level": 1}),
+    ("png (niveau 6)", {"output_format": "png", "compress_level": 6}),
+    ("png (niveau 9)", {"output_format": "png", "compress_level": 9}),
+    ("webp sans perte", {"output_format": "webp", "lossless": True}),
+    ("webp q80", {"output_format": "webp", "lossless": False, "quality": 80}),
+    ("masque", {"output_format": "mask", "compress_level": 6}),
+]
+
+
+def make_cutout(width, height):
+    """Image détourée : vêtement elliptique opaque au bord adouci, fond transparent"""
+    image = make_image(width, height)
+    y, x = np.mgrid[0:height, 0:width].astype(np.float32)
+    distance = ((x - width / 2) / (width * 0.35)) ** 2 + ((y - height / 2) / (height * 0.4)) ** 2
+    alpha = np.clip((1.0 - distance) * 20.0, 0, 1) * 255
+    image.putalpha(Image.fromarray(alpha.astype(np.uint8), "L"))
+    return image
+
+
+def run(sizes, repeat):
+    results = []
+    for label in sizes:
+        width, height = IMAGE_SIZES[label]
+        image = make_cutout(width, height)
+        for name, options in OPTIONS:
+            timing = time_call(encode_output, image, repeat=repeat, **options)
+            output_bytes, _ = encode_output(image, **options)
+            results.append({
+                "size": label,
+                "resolution": f"{width}x{height}",
+                "format": name,
+                "encode_ms": timing["median_ms"],
+                "output_kb": len(output_bytes) / 1024,
+            })
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--sizes", default="0.8MP,3MP,12MP")
+    parser.add_argument("--json", help="Écrire les résultats dans ce fichier JSON")
+    args = parser.parse_args()
+
+    results = run(args.sizes.split(","), args.repeat)
+
+    print_table(
+        ["taille", "résolution", "format", "encodage (ms)", "taille (Ko)"],
+        [
+            [r["size"], r["resolution"], r["format"], f"{r['encode_ms']:.1f}", f"{r['output_kb']:.0f}"]
+            for r in results
+        ]
+    )
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
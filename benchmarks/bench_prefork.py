@@ -0,0 +1,114 @@
+"""
+Mémoire du serveur pré-forké (prefork.py) selon le nombre de workers
+
+Lance le serveur, attend que chaque worker ait répondu puis relève, pour le
+maître et chaque worker, la mémoire résidente (RSS) et la part proportionnelle
+(PSS, pages partagées divisées entre les processus qui les partagent).
+Sans partage copie-sur-écriture, la mémoire totale serait N x RSS d'un worker.
+
+Usage :
+    python -m benchmarks.bench_prefork [--workers 1,2,4] [--port 18100] [--json out.json]
+"""
+import argparse
+import json
+import os
+import signal
+import subprocess
+import sys
+import time
+import httpx
+from benchmarks.common import make_image_bytes, print_table
+
+
+def memory_kb(pid):
+    """RSS et PSS d'un processus (Linux, /proc/<pid>/smaps_rollup)"""
+    values = {}
+    with open(f"/proc/{pid}/smaps_rollup") as f:
+        for line in f:
+            name, _, rest = line.partition(":")
+            if name in ("Rss", "Pss"):
+                values[name] = int(rest.split()[0])
+    return values["Rss"], values["Pss"]
+
+
+def children(pid):
+    with open(f"/proc/{pid}/task/{pid}/children") as f:
+        return [int(child) for child in f.read().split()]
+
+
+def wait_for_workers(port, workers, timeout=120):
+    """Interroge /health (nouvelle connexion à chaque fois) jusqu'à avoir vu tous les workers prêts"""
+    url = f"http://127.0.0.1:{port}"
+    seen = set()
+    deadline = time.monotonic() + timeout
+    while len(seen) < workers:
+        if time.monotonic() > deadline:
+            raise RuntimeError("Les workers ne sont pas prêts")
+        try:
+            health = httpx.get(f"{url}/health", headers={"Connection": "close"}, timeout=5).json()
+            if health["status"] == "healthy":
+                seen.add(health["worker"]["pid"])
+        except httpx.TransportError:
+            pass
+        time.sleep(0.1)
+
+    # Quelques analyses pour mesurer la mémoire en régime de croisière
+    image_bytes = make_image_bytes(640, 480)
+    for _ in range(workers * 4):
+        httpx.post(f"{url}/analyze", files={"file": ("bench.jpg", image_bytes, "image/jpeg")},
+                   headers={"Connection": "close"}, timeout=60)
+
+
+def measure(workers, port):
+    server = subprocess.Popen(
+        [sys.executable, "prefork.py", "--workers", str(workers), "--port", str(port),
+         "--host", "127.0.0.1", "--log-level", "warning"],
+        stdout=subprocess.DEVNULL,
+    )
+    try:
+        wait_for_workers(port, workers)
+        master_rss, master_pss = memory_kb(server.pid)
+        worker_memory = [memory_kb(pid) for pid in children(server.pid)]
+    finally:
+        server.send_signal(signal.SIGTERM)
+        server.wait(timeout=60)
+
+    worker_rss = sum(rss for rss, _ in worker_memory) / len(worker_memory)
+    total_pss = master_pss + sum(pss for _, pss in worker_memory)
+    return {
+        "workers": workers,
+        "master_rss_mb": master_rss / 1024,
+        "worker_rss_mb": worker_rss / 1024,
+        "total_pss_mb": total_pss / 1024,
+        "unshared_estimate_mb": (master_rss + worker_rss * workers) / 1024,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", default="1,2,4")
+    parser.add_argument("--port", type=int, default=18100)
+    parser.add_argument("--json", help="Écrire les résultats dans ce fichier JSON")
+    args = parser.parse_args()
+
+    if not os.path.exists("/proc/self/smaps_rollup"):
+        sys.exit("❌ Ce benchmark nécessite Linux (/proc/<pid>/smaps_rollup)")
+
+    results = [measure(int(n), args.port) for n in args.workers.split(",")]
+
+    print_table(
+        ["workers", "RSS maître (Mo)", "RSS worker (Mo)", "PSS total (Mo)", "sans partage (Mo)"],
+        [
+            [r["workers"], f"{r['master_rss_mb']:.0f}", f"{r['worker_rss_mb']:.0f}",
+             f"{r['total_pss_mb']:.0f}", f"{r['unshared_estimate_mb']:.0f}"]
+            for r in results
+        ]
+    )
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+"""
+Benchmark du mode quantifié INT8 (INFERENCE_CONFIG["quantization"] = "int8")
+
+Compare le classifieur onnxruntime float32 et INT8 :
+  - taille du fichier modèle
+  - latence médiane / p95 par taille de batch
+  - mémoire de pointe ajoutée par le chargement de la session et une inférence
+    (processus neuf)
+  - dérive : taux d'accord du top-1 et cosinus des embeddings sur des images
+    différentes de la calibration
+
+Usage :
+    python -m benchmarks.bench_quantization [--batch-sizes 1,8] [--threads 1] [--eval-size 64]
+                                            [--calibration-dir photos/] [--json out.json]
+"""
+import argparse
+import json
+import os
+import torch
+from benchmarks.common import time_call, run_isolated, print_table
+from inference_backends import (
+    OnnxRuntimeBackend,
+    build_mobilenet,
+    export_onnx,
+    int8_model_path,
+    onnx_model_path,
+)
+from quantization import calibration_tensors, quantize_model, drift_report
+
+
+def load_and_run(path, threads):
+    """Session onnxruntime + une inférence batch 1 (mesure mémoire isolée)"""
+    backend = OnnxRuntimeBackend(path, intra_op_threads=threads)
+    backend.run(torch.zeros(1, 3, 224, 224))
+    return None
+
+
+def prepare_models(calibration_dir):
+    float_path = onnx_model_path()
+    if not os.path.exists(float_path):
+        export_onnx(build_mobilenet(), float_path)
+    int8_path = quantize_model(float_path, int8_model_path(), calibration_tensors(directory=calibration_dir))
+    return {"float32": float_path, "int8": int8_path}
+
+
+def run(batch_sizes, threads, eval_size, calibration_dir):
+    paths = prepare_models(calibration_dir)
+    backends = {name: OnnxRuntimeBackend(path, intra_op_threads=threads) for name, path in paths.items()}
+    eval_tensors = calibration_tensors(max(eval_size, max(batch_sizes)), seed=1)
+
+    rows = []
+    for name, backend in backends.items():
+        _, peak_mb = run_isolated(load_and_run, paths[name], threads)
+        for batch_size in batch_sizes:
+            batch = torch.stack(eval_tensors[:batch_size])
+            timing = time_call(backend.run, batch, repeat=30, warmup=3)
+            rows.append({
+                "mode": name,
+                "batch_size": batch_size,
+                "model_mb": os.path.getsize(paths[name]) / 1e6,
+                "median_ms": timing["median_ms"],
+                "p95_ms": timing["p95_ms"],
+                "peak_memory_mb": peak_mb,
+            })
+
+    report = drift_report(backends["float32"], backends["int8"], eval_tensors[:eval_size])
+    return rows, report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--batch-sizes", default="1,8")
+    parser.add_argument("--threads", type=int, default=1)
+    parser.add_argument("--eval-size", type=int, default=64)
+    parser.add_argument("--calibration-dir", default=None)
+    parser.add_argument("--json", help="Écrire les résultats dans ce fichier JSON")
+    args = parser.parse_args()
+
+    rows, report = run(
+        [int(size) for size in args.batch_sizes.split(",")],
+        args.threads,
+        args.eval_size,
+        args.calibration_dir
+    )
+
+    print_table(
+        ["mode", "batch", "modèle (Mo)", "médiane (ms)", "p95 (ms)", "mémoire (Mo)"],
+        [
+            [r["mode"], r["batch_size"], f"{r['model_mb']:.1f}", f"{r['median_ms']:.1f}",
+             f"{r['p95_ms']:.1f}", f"{r['peak_memory_mb']:.1f}"]
+            for r in rows
+        ]
+    )
+    print()
+    print(f"Top-1 identique : {report['top1_agreement']:.1%} sur {report['images']} images")
+    print(f"Cosinus des embeddings : moyenne {report['embedding_cosine_mean']:.4f}, "
+          f"min {report['embedding_cosine_min']:.4f}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"latency": rows, "drift": report}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+"""
+Benchmark de l'index de similarité (recall / latence)
+
+Pour chaque taille d'index : temps d'insertion, temps d'entraînement IVF,
+latence de la recherche exacte et de la recherche approximative pour
+plusieurs nprobe, avec le recall@k de l'approximatif par rapport à l'exact.
+
+Usage :
+    python -m benchmarks.bench_similarity [--sizes 10000,100000,1000000] [--queries 50] [--json out.json]
+"""
+import argparse
+import json
+import statistics
+import tempfile
+import time
+import numpy as np
+from benchmarks.common import print_table
+from similarity_index import SimilarityIndex
+from config import SIMILARITY_CONFIG
+
+
+def clustered_vectors(n, dimensions, seed=0, clusters=256):
+    """Embeddings synthétiques regroupés (distribution proche d'une garde-robe)"""
+    rng = np.random.RandomState(seed)
+    centers = rng.normal(size=(clusters, dimensions)).astype(np.float32)
+    vectors = np.empty((n, dimensions), dtype=np.float32)
+    for start in range(0, n, 100000):
+        size = min(100000, n - start)
+        labels = rng.randint(0, clusters, size=size)
+        vectors[start:start + size] = centers[labels] + 0.5 * rng.normal(size=(size, dimensions))
+    return vectors
+
+
+def timed_searches(index, queries, k, mode, nprobe=None):
+    latencies, results = [], []
+    for query in queries:
+        start = time.perf_counter()
+        found, _ = index.search(query, k=k, mode=mode, nprobe=nprobe)
+        latencies.append((time.perf_counter() - start) * 1000.0)
+        results.append({r["id"] for r in found})
+    latencies.sort()
+    return results, statistics.median(latencies), latencies[int(0.95 * (len(latencies) - 1))]
+
+
+def run(sizes, num_queries, k, nprobes, dimensions):
+    rows = []
+    for n in sizes:
+        with tempfile.TemporaryDirectory() as tmp:
+            index = SimilarityIndex(tmp, dimensions=dimensions)
+            vectors = clustered_vectors(n, dimensions)
+
+            start = time.perf_counter()
+            for chunk in range(0, n, 50000):
+                block = vectors[chunk:chunk + 50000]
+                index.add([str(i) for i in range(chunk, chunk + len(block))], block)
+            insert_s = time.perf_counter() - start
+
+            start = time.perf_counter()
+            ivf = index.build_ivf()
+            train_s = time.perf_counter() - start
+
+            queries = clustered_vectors(num_queries, dimensions, seed=1)
+            exact, p50, p95 = timed_searches(index, queries, k, "exact")
+            rows.append({"vectors": n, "mode": "exact", "nprobe": None, "recall": 1.0,
+                         "p50_ms": p50, "p95_ms": p95, "insert_s": insert_s,
+                         "train_s": train_s, "nlist": ivf["nlist"]})
+
+            for nprobe in nprobes:
+                approx, p50, p95 = timed_searches(index, queries, k, "approximate", nprobe)
+                recall = sum(len(a & e) for a, e in zip(approx, exact)) / (k * num_queries)
+                rows.append({"vectors": n, "mode": "approximate", "nprobe": nprobe,
+                             "recall": recall, "p50_ms": p50, "p95_ms": p95,
+                             "insert_s": insert_s, "train_s": train_s, "nlist": ivf["nlist"]})
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="10000,100000,1000000")
+    parser.add_argument("--queries", type=int, default=50)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--nprobes", default="4,8,16,32")
+    parser.add_argument("--dimensions", type=int, default=SIMILARITY_CONFIG["dimensions"])
+    parser.add_argument("--json", help="Écrire les résultats dans ce fichier JSON")
+    args = parser.parse_args()
+
+    rows = run(
+        [int(n) for n in args.sizes.split(",")],
+        args.queries,
+        args.k,
+        [int(n) for n in args.nprobes.split(",")],
+        args.dimensions
+    )
+
+    print_table(
+        ["vecteurs", "mode", "nlist", "nprobe", f"recall@{args.k}", "p50 (ms)", "p95 (ms)",
+         "insertion (s)", "entraînement (s)"],
+        [
+            [r["vectors"], r["mode"], r["nlist"], r["nprobe"] or "-", f"{r['recall']:.3f}",
+             f"{r['p50_ms']:.2f}", f"{r['p95_ms']:.2f}", f"{r['insert_s']:.2f}", f"{r['train_s']:.2f}"]
+            for r in rows
+        ]
+    )
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(rows, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
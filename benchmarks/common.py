@@ -0,0 +1,162 @@
+"""
+Outils partagés des benchmarks : images synthétiques déterministes,
+chronométrage et mesure de la mémoire de pointe
+"""
+import io
+import multiprocessing
+import resource
+import statistics
+import sys
+import time
+import numpy as np
+from PIL import Image
+
+# Résolutions typiques des uploads (du web aux photos de téléphone 12+ MP)
+IMAGE_SIZES = {
+    "0.8MP": (1024, 768),
+    "3MP": (2048, 1536),
+    "12MP": (4032, 3024),
+    "24MP": (6000, 4000),
+}
+
+
+def make_image(width, height, mode="RGB", seed=0):
+    """
+    Image synthétique déterministe : dégradé, formes colorées et bruit
+    (le bruit rend le coût d'encodage/décodage proche d'une vraie photo)
+    """
+    rng = np.random.RandomState(seed)
+    y, x = np.mgrid[0:height, 0:width].astype(np.float32)
+    r = 255 * x / max(width - 1, 1)
+    g = 255 * y / max(height - 1, 1)
+    b = 128 + 127 * np.sin((x + y) / max(width, height) * 6.28)
+    data = np.stack([r, g, b], axis=-1)
+
+    # Quelques disques de couleur peau / vêtement
+    for _ in range(6):
+        cx, cy = rng.randint(0, width), rng.randint(0, height)
+        radius = rng.randint(max(1, min(width, height) // 10), max(2, min(width, height) // 4))
+        mask = (x - cx) ** 2 + (y - cy) ** 2 < radius ** 2
+        data[mask] = rng.randint(0, 256, size=3)
+
+    data += rng.normal(0, 12, size=data.shape)
+    data = np.clip(data, 0, 255).astype(np.uint8)
+    image = Image.fromarray(data, "RGB")
+
+    if mode == "RGBA":
+        alpha = np.full((height, width), 255, dtype=np.uint8)
+        alpha[: height // 8, :] = 0
+        image.putalpha(Image.fromarray(alpha, "L"))
+    elif mode != "RGB":
+        image = image.convert(mode)
+    return image
+
+
+def encode(image, fmt="JPEG", **options):
+    """Encode une image PIL en bytes"""
+    if fmt == "JPEG" and image.mode not in ("RGB", "L"):
+        image = image.convert("RGB")
+    if fmt == "JPEG":
+        options.setdefault("quality", 90)
+    buffer = io.BytesIO()
+    image.save(buffer, format=fmt, **options)
+    return buffer.getvalue()
+
+
+def make_image_bytes(width, height, fmt="JPEG", mode="RGB", seed=0, **options):
+    """Raccourci : image synthétique encodée"""
+    return encode(make_image(width, height, mode=mode, seed=seed), fmt, **options)
+
+
+def time_call(fn, *args, repeat=5, warmup=1, **kwargs):
+    """
+    Chronomètre fn et retourne les statistiques en millisecondes
+    """
+    for _ in range(warmup):
+        fn(*args, **kwargs)
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn(*args, **kwargs)
+        samples.append((time.perf_counter() - start) * 1000.0)
+    samples.sort()
+    return {
+        "median_ms": statistics.median(samples),
+        "min_ms": samples[0],
+        "p95_ms": samples[min(len(samples) - 1, int(round(0.95 * (len(samples) - 1))))],
+        "max_ms": samples[-1],
+        "repeat": repeat,
+    }
+
+
+def reset_peak_rss():
+    """
+    Remet à zéro le pic de mémoire résidente (Linux : /proc/self/clear_refs).
+    Retourne False si la plateforme ne le permet pas
+    """
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+        return True
+    except OSError:
+        return False
+
+
+def peak_rss_mb():
+    """Mémoire résidente de pointe du processus courant (Mo)"""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss est en octets sous macOS, en kilo-octets sous Linux
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def _isolated_worker(queue, setup, fn, args):
+    try:
+        if setup is not None:
+            setup()
+        reset_peak_rss()
+        before = peak_rss_mb()
+        result = fn(*args)
+        queue.put((True, result, peak_rss_mb() - before))
+    except Exception as e:
+        queue.put((False, repr(e), 0.0))
+
+
+def run_isolated(fn, *args, setup=None):
+    """
+    Exécute fn(*args) dans un processus neuf pour mesurer la mémoire de pointe
+    qu'il ajoute (fn et setup doivent être des fonctions de module)
+
+    Args:
+        setup: Fonction appelée avant la mesure (imports, chargement de modèle)
+
+    Returns:
+        tuple: (résultat, mémoire de pointe ajoutée en Mo)
+    """
+    context = multiprocessing.get_context("spawn")
+    queue = context.Queue()
+    process = context.Process(target=_isolated_worker, args=(queue, setup, fn, args))
+    process.start()
+    ok, result, peak_delta = queue.get()
+    process.join()
+    if not ok:
+        raise RuntimeError(f"Échec du benchmark isolé: {result}")
+    return result, peak_delta
+
+
+def print_table(headers, rows):
+    """Affiche un tableau texte aligné"""
+    widths = [
+        max(len(str(h)), *(len(str(row[i])) for row in rows)) if rows else len(str(h))
+        for i, h in enumerate(headers)
+    ]
+    print("  ".join(str(h).ljust(w) for h, w in zip(headers, widths)))
+    print("  ".join("-" * w for w in widths))
+    for row in rows:
+        print("  ".join(str(c).ljust(w) for c, w in zip(row, widths)))
@@ -0,0 +1,402 @@
+"""
+Test de charge HTTP : débit, latence de queue et retard de la boucle d'événements
+
+Envoie un mélange de requêtes (/analyze, /remove-background, /health) à
+l'application FastAPI de main.py et mesure, par endpoint et au total :
+requêtes/s, p50/p95/p99, taux d'erreur, ainsi que la durée moyenne de chaque
+étape rapportée par l'en-tête Server-Timing.
+
+Cibles (aucun accès réseau nécessaire) :
+  - asgi (défaut) : l'application dans le même processus, via httpx.ASGITransport.
+    Le retard de la boucle d'événements mesuré est celui du serveur.
+  - uvicorn : un serveur uvicorn lancé en local sur 127.0.0.1
+  - prefork : le serveur de production prefork.py (--workers) lancé en local
+  - --url : un serveur déjà démarré
+  Pour les cibles externes, le retard mesuré est celui de la boucle du client
+  (vérifie que le générateur de charge n'est pas le goulot d'étranglement).
+
+Charge en boucle fermée (--concurrency utilisateurs qui enchaînent les requêtes)
+ou en boucle ouverte (--rate requêtes/s à arrivées poissonniennes, latence
+mesurée depuis l'heure d'arrivée prévue). Chaque upload est rendu unique
+(octets ajoutés après la fin de l'image) pour ne pas mesurer le cache des
+résultats, sauf avec --cache-hits.
+
+Usage :
+    python -m benchmarks.load_test [--concurrency 8] [--duration 20] [--warmup 3]
+                                   [--mix analyze=70,remove-background=20,health=10]
+                                   [--sizes 0.8MP=60,3MP=30,12MP=10] [--rate 0]
+                                   [--target asgi|uvicorn|prefork] [--workers 2] [--url URL]
+                                   [--seed 0] [--json out.json]
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import signal
+import subprocess
+import sys
+import time
+import httpx
+from benchmarks.common import IMAGE_SIZES, make_image_bytes, print_table
+
+# Endpoints du mélange : méthode et chemin
+ENDPOINTS = {
+    "analyze": ("POST", "/analyze"),
+    "remove-background": ("POST", "/remove-background"),
+    "health": ("GET", "/health"),
+}
+
+# Images différentes par taille (le contenu change aussi le coût d'encodage)
+IMAGES_PER_SIZE = 4
+
+
+def parse_weights(value, allowed):
+    """ "a=70,b=30" -> [("a", 70.0), ("b", 30.0)] (ValueError si un nom est inconnu)"""
+    weights = []
+    for part in value.split(","):
+        name, _, weight = part.strip().partition("=")
+        if name not in allowed:
+            raise ValueError(f"Valeur inconnue: {name} (attendu: {', '.join(allowed)})")
+        weights.append((name, float(weight or 1)))
+    if not weights or sum(weight for _, weight in weights) <= 0:
+        raise ValueError(f"Poids invalides: {value}")
+    return weights
+
+
+def percentile(sorted_values, q):
+    """Percentile (rang le plus proche) d'une liste triée"""
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, int(round(q / 100.0 * len(sorted_values))) - 1))
+    return sorted_values[index]
+
+
+def parse_server_timing(value):
+    """ "decode;dur=3.2, total;dur=9.1" -> {"decode": 3.2, "total": 9.1} """
+    stages = {}
+    for entry in value.split(","):
+        name, _, params = entry.strip().partition(";")
+        for param in params.split(";"):
+            key, _, duration = param.partition("=")
+            if key.strip() == "dur":
+                stages[name] = stages.get(name, 0.0) + float(duration)
+    return stages
+
+
+class Workload:
+    """Tirage des requêtes : endpoint selon --mix, image selon --sizes"""
+
+    def __init__(self, mix, sizes, seed=0, cache_hits=False):
+        self.mix = mix
+        self.sizes = sizes
+        self.rng = random.Random(seed)
+        self.cache_hits = cache_hits
+        self._counter = 0
+        self.images = {
+            label: [make_image_bytes(*IMAGE_SIZES[label], seed=i) for i in range(IMAGES_PER_SIZE)]
+            for label, _ in sizes
+        }
+
+    @staticmethod
+    def _choice(rng, weights):
+        names = [name for name, _ in weights]
+        return rng.choices(names, weights=[weight for _, weight in weights])[0]
+
+    def next_request(self):
+        """(endpoint, taille, kwargs httpx)"""
+        endpoint = self._choice(self.rng, self.mix)
+        if endpoint == "health":
+            return endpoint, None, {}
+        size = self._choice(self.rng, self.sizes)
+        image_bytes = self.rng.choice(self.images[size])
+        if not self.cache_hits:
+            # Octets après la fin du JPEG : ignorés au décodage, clé de cache différente
+            self._counter += 1
+            image_bytes += self._counter.to_bytes(8, "little")
+        return endpoint, size, {"files": {"file": (f"{size}.jpg", image_bytes, "image/jpeg")}}
+
+
+class Recorder:
+    """Résultats des requêtes terminées pendant la fenêtre de mesure"""
+
+    def __init__(self):
+        self.records = []
+        self.loop_lag_ms = []
+        self.recording = False
+        self.started = None
+        self.stopped = None
+
+    def start(self):
+        self.recording = True
+        self.started = time.perf_counter()
+
+    def stop(self):
+        self.recording = False
+        self.stopped = time.perf_counter()
+
+    def add(self, endpoint, size, latency_ms, status, error=None, stages=None):
+        if self.recording:
+            self.records.append({
+                "endpoint": endpoint, "size": size, "latency_ms": latency_ms,
+                "status": status, "error": error, "stages": stages or {},
+            })
+
+
+async def send(client, workload, recorder, scheduled=None):
+    """Une requête ; la latence part de l'heure prévue en boucle ouverte"""
+    endpoint, size, kwargs = workload.next_request()
+    method, path = ENDPOINTS[endpoint]
+    start = scheduled if scheduled is not None else time.perf_counter()
+    try:
+        response = await client.request(method, path, **kwargs)
+        await response.aread()
+    except httpx.HTTPError as e:
+        recorder.add(endpoint, size, (time.perf_counter() - start) * 1000.0, None, type(e).__name__)
+        return
+    latency_ms = (time.perf_counter() - start) * 1000.0
+    error = None
+    if response.status_code >= 400:
+        try:
+            error = response.json()["detail"]["error"]
+        except (ValueError, KeyError, TypeError):
+            error = f"http_{response.status_code}"
+    stages = parse_server_timing(response.headers.get("server-timing", ""))
+    recorder.add(endpoint, size, latency_ms, response.status_code, error, stages)
+
+
+async def closed_loop(client, workload, recorder, concurrency, deadline):
+    async def user():
+        while time.perf_counter() < deadline:
+            await send(client, workload, recorder)
+
+    await asyncio.gather(*(user() for _ in range(concurrency)))
+
+
+async def open_loop(client, workload, recorder, rate, deadline):
+    """Arrivées poissonniennes à `rate` requêtes/s, sans limite de requêtes en cours"""
+    rng = random.Random(workload.rng.random())
+    tasks = set()
+    scheduled = time.perf_counter()
+    while scheduled < deadline:
+        scheduled += rng.expovariate(rate)
+        delay = scheduled - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        task = asyncio.create_task(send(client, workload, recorder, scheduled))
+        tasks.add(task)
+        task.add_done_callback(tasks.discard)
+    if tasks:
+        await asyncio.gather(*tasks)
+
+
+async def monitor_loop_lag(recorder, interval=0.01):
+    """Retard des réveils de la boucle d'événements (ms) au-delà de l'intervalle demandé"""
+    loop = asyncio.get_running_loop()
+    while True:
+        start = loop.time()
+        await asyncio.sleep(interval)
+        if recorder.recording:
+            recorder.loop_lag_ms.append(max(0.0, (loop.time() - start - interval) * 1000.0))
+
+
+async def run_load(client, workload, concurrency, duration, warmup, rate=0.0):
+    recorder = Recorder()
+    monitor = asyncio.create_task(monitor_loop_lag(recorder))
+    loop = asyncio.get_running_loop()
+    # Mesure après la période de chauffe, arrêt à la fin de la fenêtre
+    loop.call_later(warmup, recorder.start)
+    loop.call_later(warmup + duration, recorder.stop)
+    deadline = time.perf_counter() + warmup + duration
+    try:
+        if rate > 0:
+            await open_loop(client, workload, recorder, rate, deadline)
+        else:
+            await closed_loop(client, workload, recorder, concurrency, deadline)
+    finally:
+        monitor.cancel()
+    if recorder.stopped is None:
+        recorder.stop()
+    return recorder
+
+
+def summarize(recorder):
+    """Statistiques par endpoint et au total"""
+    elapsed = (recorder.stopped - recorder.started) if recorder.started else 0.0
+    groups = {}
+    for record in recorder.records:
+        groups.setdefault(record["endpoint"], []).append(record)
+    groups["total"] = recorder.records
+
+    summary = {}
+    for name, records in groups.items():
+        latencies = sorted(record["latency_ms"] for record in records)
+        errors = {}
+        stages = {}
+        for record in records:
+            if record["error"]:
+                errors[record["error"]] = errors.get(record["error"], 0) + 1
+            for stage, duration in record["stages"].items():
+                stages.setdefault(stage, []).append(duration)
+        summary[name] = {
+            "requests": len(records),
+            "requests_per_s": len(records) / elapsed if elapsed else 0.0,
+            "error_rate": sum(errors.values()) / len(records) if records else 0.0,
+            "errors": errors,
+            "p50_ms": percentile(latencies, 50),
+            "p95_ms": percentile(latencies, 95),
+            "p99_ms": percentile(latencies, 99),
+            "max_ms": latencies[-1] if latencies else 0.0,
+            "stages_mean_ms": {stage: sum(values) / len(values) for stage, values in stages.items()},
+        }
+
+    lag = sorted(recorder.loop_lag_ms)
+    return {
+        "duration_s": elapsed,
+        "endpoints": summary,
+        "event_loop_lag": {
+            "p50_ms": percentile(lag, 50),
+            "p99_ms": percentile(lag, 99),
+            "max_ms": lag[-1] if lag else 0.0,
+        },
+    }
+
+
+async def run_in_process(workload, args):
+    """Cible asgi : démarrage de l'application (modèles préchargés) puis charge"""
+    from main import app
+
+    await app.router.startup()
+    loading = getattr(app.state, "model_loading", None)
+    if loading is not None:
+        await loading
+    try:
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://loadtest", timeout=300) as client:
+            return await run_load(client, workload, args.concurrency, args.duration, args.warmup, args.rate)
+    finally:
+        await app.router.shutdown()
+
+
+async def run_against(url, workload, args):
+    limits = httpx.Limits(max_connections=max(args.concurrency, 100))
+    async with httpx.AsyncClient(base_url=url, timeout=300, limits=limits) as client:
+        return await run_load(client, workload, args.concurrency, args.duration, args.warmup, args.rate)
+
+
+def launch_server(target, port, workers):
+    """Démarre uvicorn ou prefork.py sur 127.0.0.1 et attend /ready"""
+    if target == "uvicorn":
+        command = [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1",
+                   "--port", str(port), "--log-level", "warning"]
+    else:
+        command = [sys.executable, "prefork.py", "--workers", str(workers), "--host", "127.0.0.1",
+                   "--port", str(port), "--log-level", "warning"]
+    server = subprocess.Popen(command, stdout=subprocess.DEVNULL)
+    url = f"http://127.0.0.1:{port}"
+    deadline = time.monotonic() + 300
+    while True:
+        if server.poll() is not None:
+            raise RuntimeError(f"Le serveur s'est arrêté (code {server.returncode})")
+        if time.monotonic() > deadline:
+            server.kill()
+            raise RuntimeError("Le serveur n'est pas prêt")
+        try:
+            if httpx.get(f"{url}/ready", timeout=5).status_code == 200:
+                return server, url
+        except httpx.TransportError:
+            pass
+        time.sleep(0.2)
+
+
+def print_report(report):
+    rows = []
+    for name, stats in report["endpoints"].items():
+        rows.append([
+            name, stats["requests"], f"{stats['requests_per_s']:.1f}", f"{stats['error_rate']:.1%}",
+            f"{stats['p50_ms']:.1f}", f"{stats['p95_ms']:.1f}", f"{stats['p99_ms']:.1f}", f"{stats['max_ms']:.1f}",
+        ])
+    print_table(["endpoint", "requêtes", "req/s", "erreurs", "p50 (ms)", "p95 (ms)", "p99 (ms)", "max (ms)"], rows)
+
+    print()
+    stage_rows = []
+    for name, stats in report["endpoints"].items():
+        if name != "total" and stats["stages_mean_ms"]:
+            stage_rows.append([name, ", ".join(
+                f"{stage} {duration:.1f}" for stage, duration in stats["stages_mean_ms"].items()
+            )])
+    if stage_rows:
+        print_table(["endpoint", "durée moyenne par étape, Server-Timing (ms)"], stage_rows)
+        print()
+
+    errors = report["endpoints"]["total"]["errors"]
+    if errors:
+        print("Erreurs : " + ", ".join(f"{code} x{count}" for code, count in sorted(errors.items())))
+    lag = report["event_loop_lag"]
+    print(f"Retard de la boucle d'événements ({report['loop']}) : p50 {lag['p50_ms']:.1f} ms, "
+          f"p99 {lag['p99_ms']:.1f} ms, max {lag['max_ms']:.1f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--concurrency", type=int, default=8, help="Utilisateurs simultanés (boucle fermée)")
+    parser.add_argument("--rate", type=float, default=0.0, help="Requêtes/s en boucle ouverte (0 = boucle fermée)")
+    parser.add_argument("--duration", type=float, default=20.0, help="Secondes de mesure")
+    parser.add_argument("--warmup", type=float, default=3.0, help="Secondes de chauffe non mesurées")
+    parser.add_argument("--mix", default="analyze=70,remove-background=20,health=10")
+    parser.add_argument("--sizes", default="0.8MP=60,3MP=30,12MP=10")
+    parser.add_argument("--cache-hits", action="store_true", help="Réutiliser les mêmes octets (cache des résultats)")
+    parser.add_argument("--target", choices=["asgi", "uvicorn", "prefork"], default="asgi")
+    parser.add_argument("--workers", type=int, default=2, help="Workers de la cible prefork")
+    parser.add_argument("--port", type=int, default=18200)
+    parser.add_argument("--url", help="Serveur déjà démarré (remplace --target)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", help="Écrire le rapport dans ce fichier JSON")
+    args = parser.parse_args()
+
+    try:
+        mix = parse_weights(args.mix, ENDPOINTS)
+        sizes = parse_weights(args.sizes, IMAGE_SIZES)
+    except ValueError as e:
+        parser.error(str(e))
+
+    workload = Workload(mix, sizes, seed=args.seed, cache_hits=args.cache_hits)
+    load = f"{args.rate:g} req/s" if args.rate > 0 else f"{args.concurrency} utilisateurs"
+    target = args.url or args.target
+    print(f"🚦 Charge sur {target} : {load}, {args.duration:g} s (+{args.warmup:g} s de chauffe), "
+          f"mix {args.mix}, tailles {args.sizes}")
+
+    server = None
+    try:
+        if args.url:
+            recorder = asyncio.run(run_against(args.url, workload, args))
+        elif args.target == "asgi":
+            recorder = asyncio.run(run_in_process(workload, args))
+        else:
+            server, url = launch_server(args.target, args.port, args.workers)
+            recorder = asyncio.run(run_against(url, workload, args))
+    finally:
+        if server is not None:
+            server.send_signal(signal.SIGTERM)
+            server.wait(timeout=60)
+
+    report = summarize(recorder)
+    report.update({
+        "target": target,
+        "loop": "serveur" if target == "asgi" else "client",
+        "concurrency": args.concurrency,
+        "rate": args.rate,
+        "mix": args.mix,
+        "sizes": args.sizes,
+        "cpus": os.cpu_count(),
+    })
+    print()
+    print_report(report)
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,254 @@
+"""
+Suite de micro-benchmarks avec baseline et détection des régressions
+
+Chronomètre, sur des images synthétiques déterministes (plusieurs résolutions,
+JPEG / PNG / WebP, RGB et RGBA) :
+  - les fonctions de bout en bout : analyze_image, detect_inappropriate_content,
+    BackgroundRemovalService.remove_background (fallback, et rembg s'il est installé)
+  - chaque étape séparément, sur des entrées préparées à l'avance : décodage
+    (complet et réduit), prétraitement, forward pass, statistiques de modération,
+    masque, agrandissement du masque, encodage de la sortie (PNG, WebP, masque)
+
+Les résultats (médiane, min, p95 par cas) sont écrits dans un fichier JSON
+qui sert de baseline. Avec --compare, la suite est relancée (ou un fichier
+--current est relu) et chaque cas est comparé à la baseline : une médiane
+(ou --metric min_ms) plus lente de plus de --threshold, et d'au moins
+--min-delta-ms, est une régression, et le code de sortie vaut 1.
+
+Usage :
+    python -m benchmarks.suite [--sizes 0.8MP,3MP] [--formats JPEG,PNG,WEBP] [--repeat 5]
+                               [--only analyze,stage.decode] [--output cache/bench_baseline.json]
+    python -m benchmarks.suite --compare cache/bench_baseline.json [--threshold 0.15]
+                               [--current results.json] [--metric min_ms]
+"""
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+import numpy as np
+import PIL
+import torch
+from benchmarks.common import IMAGE_SIZES, make_image_bytes, time_call, print_table
+from background_removal import BackgroundRemovalService, encode_output
+from content_moderation import ContentModerationError, detect_inappropriate_content, moderation_stats
+from image_context import ImageContext, TENSOR_SIZE, get_tensor_transform
+from mask_refinement import upsample_mask
+from config import DECODE_CONFIG
+from utils import analyze_image, get_model, run_model
+
+DEFAULT_OUTPUT = "cache/bench_baseline.json"
+
+# (format, mode) des images d'entrée : le JPEG n'a pas de canal alpha
+VARIANTS = {
+    "JPEG": ("RGB",),
+    "PNG": ("RGB", "RGBA"),
+    "WEBP": ("RGB", "RGBA"),
+}
+
+
+def make_service(rembg):
+    """Service de détourage forcé sur rembg (None s'il n'est pas installé) ou sur le fallback"""
+    service = BackgroundRemovalService(pool_size=1).load()
+    if rembg:
+        if not service.rembg_available:
+            return None
+        service.warmup()
+    else:
+        service._rembg_available = False
+        service.remove_func = None
+    return service
+
+
+def moderate(image_bytes):
+    """detect_inappropriate_content sans distinguer refus et acceptation (même coût)"""
+    try:
+        return detect_inappropriate_content(image_bytes)
+    except ContentModerationError:
+        return None
+
+
+def image_cases(label, fmt, mode, image_bytes, services, encode=True):
+    """
+    Cas (nom, fonction) pour une image d'entrée
+
+    Args:
+        encode: Inclure l'encodage de la sortie (ne dépend que de la résolution)
+    """
+    context = ImageContext(image_bytes)
+    rgb = context.rgb
+    reduced = context.reduced(*TENSOR_SIZE)
+    thumbnail = context.thumbnail(DECODE_CONFIG["moderation_max_side"])
+    fallback = services["fallback"]
+    small = context.thumbnail(fallback.mask_max_side)
+    small_mask = fallback._mask(small)
+    mask = upsample_mask(small_mask, small, rgb)
+    output_image = rgb.copy()
+    output_image.putalpha(mask)
+    transform = get_tensor_transform()
+
+    cases = [
+        ("analyze", lambda: analyze_image(image_bytes)),
+        ("moderation", lambda: moderate(image_bytes)),
+        ("remove_background.fallback", lambda: fallback.remove_background(image_bytes)),
+        ("stage.decode", lambda: ImageContext(image_bytes).rgb),
+        ("stage.decode_reduced", lambda: ImageContext(image_bytes).reduced(*TENSOR_SIZE)),
+        ("stage.preprocess", lambda: transform(reduced)),
+        ("stage.moderation_stats", lambda: moderation_stats(thumbnail)),
+        ("stage.mask.fallback", lambda: fallback._mask(small)),
+        ("stage.upsample_mask", lambda: upsample_mask(small_mask, small, rgb)),
+    ]
+    if encode:
+        cases += [
+            ("stage.encode.png", lambda: encode_output(output_image, "png")),
+            ("stage.encode.webp", lambda: encode_output(output_image, "webp")),
+            ("stage.encode.mask", lambda: encode_output(mask, "mask")),
+        ]
+    if services["rembg"] is not None:
+        rembg = services["rembg"]
+        cases += [
+            ("remove_background.rembg", lambda: rembg.remove_background(image_bytes)),
+            ("stage.mask.rembg", lambda: rembg._mask(small)),
+        ]
+    return [(f"{name}/{label}/{fmt}/{mode}", fn) for name, fn in cases]
+
+
+def selected(case_id, only):
+    return not only or any(case_id.startswith(prefix) for prefix in only)
+
+
+def environment():
+    """Machine et versions : une baseline n'est comparable que sur la même machine"""
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "processor": platform.processor() or platform.machine(),
+        "cpus": os.cpu_count(),
+        "torch_threads": torch.get_num_threads(),
+        "numpy": np.__version__,
+        "pillow": PIL.__version__,
+        "torch": torch.__version__,
+    }
+
+
+def run(sizes, formats, repeat, only=None):
+    services = {"fallback": make_service(rembg=False), "rembg": make_service(rembg=True)}
+    if services["rembg"] is None:
+        print("⚠️ rembg n'est pas installé : cas remove_background.rembg ignorés")
+
+    results = {}
+
+    def measure(case_id, fn):
+        timing = time_call(fn, repeat=repeat, warmup=1)
+        results[case_id] = timing
+        print(f"   {case_id:<55} {timing['median_ms']:9.2f} ms")
+
+    # Forward pass : indépendant de l'image d'entrée
+    batch = torch.zeros(1, 3, *TENSOR_SIZE)
+    if selected("stage.forward", only):
+        get_model()
+        measure("stage.forward/224x224", lambda: run_model(batch))
+
+    for label in sizes:
+        width, height = IMAGE_SIZES[label]
+        variants = [(fmt, mode) for fmt in formats for mode in VARIANTS[fmt]]
+        for index, (fmt, mode) in enumerate(variants):
+            image_bytes = make_image_bytes(width, height, fmt=fmt, mode=mode)
+            cases = image_cases(label, fmt, mode, image_bytes, services, encode=index == 0)
+            for case_id, fn in cases:
+                if selected(case_id, only):
+                    measure(case_id, fn)
+    return results
+
+
+def compare(baseline, current, threshold, min_delta_ms, metric="median_ms"):
+    """
+    Compare les temps cas par cas (médiane, ou minimum, moins sensible au bruit)
+
+    Returns:
+        tuple: (lignes du tableau, nombre de régressions)
+    """
+    rows = []
+    regressions = 0
+    for case_id in sorted(set(baseline) | set(current)):
+        if case_id not in current:
+            rows.append([case_id, f"{baseline[case_id][metric]:.2f}", "-", "-", "absent"])
+            continue
+        if case_id not in baseline:
+            rows.append([case_id, "-", f"{current[case_id][metric]:.2f}", "-", "nouveau"])
+            continue
+        before = baseline[case_id][metric]
+        after = current[case_id][metric]
+        change = (after - before) / before if before else 0.0
+        status = ""
+        if change > threshold and after - before >= min_delta_ms:
+            status = "⚠️ régression"
+            regressions += 1
+        elif change < -threshold and before - after >= min_delta_ms:
+            status = "✅ amélioration"
+        rows.append([case_id, f"{before:.2f}", f"{after:.2f}", f"{change:+.1%}", status])
+    return rows, regressions
+
+
+def load(path):
+    with open(path) as f:
+        return json.load(f)
+
+
+def save(path, report):
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(path, "w") as f:
+        json.dump(report, f, indent=2)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="0.8MP,3MP")
+    parser.add_argument("--formats", default="JPEG,PNG,WEBP")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--only", default="", help="Préfixes de cas à mesurer (ex: analyze,stage.decode)")
+    parser.add_argument("--output", default=None, help=f"Fichier des résultats (défaut: {DEFAULT_OUTPUT} sans --compare)")
+    parser.add_argument("--compare", metavar="BASELINE", help="Comparer à cette baseline")
+    parser.add_argument("--current", help="Avec --compare : résultats déjà mesurés au lieu d'une nouvelle mesure")
+    parser.add_argument("--threshold", type=float, default=0.15, help="Ralentissement relatif toléré")
+    parser.add_argument("--min-delta-ms", type=float, default=1.0, help="Écart absolu minimal d'une régression")
+    parser.add_argument("--metric", choices=["median_ms", "min_ms", "p95_ms"], default="median_ms")
+    args = parser.parse_args()
+
+    if args.current:
+        report = load(args.current)
+    else:
+        only = [prefix for prefix in args.only.split(",") if prefix]
+        print(f"⏱️ Suite de benchmarks : {args.sizes} x {args.formats}, {args.repeat} mesures par cas")
+        report = {
+            "measured_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "environment": environment(),
+            "repeat": args.repeat,
+            "results": run(args.sizes.split(","), args.formats.split(","), args.repeat, only),
+        }
+        output = args.output or (None if args.compare else DEFAULT_OUTPUT)
+        if output:
+            save(output, report)
+            print(f"💾 Résultats écrits dans {output}")
+
+    if not args.compare:
+        return
+
+    baseline = load(args.compare)
+    if baseline.get("environment") != report.get("environment"):
+        print("⚠️ Baseline mesurée dans un autre environnement : comparaison indicative")
+    rows, regressions = compare(baseline["results"], report["results"], args.threshold, args.min_delta_ms, args.metric)
+    print()
+    print_table(["cas", "baseline (ms)", "actuel (ms)", "écart", ""], rows)
+    print()
+    if regressions:
+        print(f"❌ {regressions} régression(s) au-delà de {args.threshold:.0%}")
+        sys.exit(1)
+    print(f"✅ Aucune régression au-delà de {args.threshold:.0%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -4,6 +4,8 @@ Synchronisé avec :
 - backend/src/api/clothing-item/content-types/clothing-item/schema.json
 - backend/scripts/seed-wardrobe.js
 """
+import json
+import os
 
 # Types de vêtements (enum du schema Strapi clothing-item)
 # Source: backend/src/api/clothing-item/content-types/clothing-item/schema.json
@@ -115,3 +117,211 @@ CONTENT_MODERATION_CONFIG = {
     "block_nsfw": True,  # Bloquer les images NSFW
     "block_violence": True,  # Bloquer les images violentes
 }
+
+# Pipeline combiné (/process) : un upload, un décodage, plusieurs étapes
+PIPELINE_CONFIG = {
+    "default_steps": ["moderation", "analysis", "background_removal"],  # Étapes sans paramètre steps
+    "require_moderation": True,  # Toujours modérer avant les modèles, même si steps ne l'inclut pas
+    "parallel": True,  # Analyse et suppression d'arrière-plan en parallèle
+    "response_format": "json",  # "json" (image en base64) ou "multipart" (multipart/mixed)
+}
+
+# Configuration du micro-batching de l'inférence (/analyze)
+BATCHING_CONFIG = {
+    "enabled": True,  # Regrouper les requêtes concurrentes en un seul forward pass
+    "max_batch_size": 8,  # Taille maximale d'un batch
+    "max_wait_ms": 10,  # Fenêtre d'attente maximale pour compléter un batch (ms)
+}
+
+# Backend d'inférence du classifieur (inference_backends.py)
+INFERENCE_CONFIG = {
+    "backend": "torch",  # "torch" (PyTorch eager) ou "onnxruntime" (export ONNX mis en cache)
+    "quantization": None,  # None (float32) ou "int8" : quantification statique, backend onnxruntime uniquement
+    "onnx_dir": "cache/models",  # Répertoire des modèles ONNX exportés
+    "onnx_opset": 17,
+    "graph_optimization": "all",  # Optimisations de graphe onnxruntime : disable, basic, extended, all
+}
+
+# Budgets de threads CPU par worker (cpu_threads.py), pour que N workers ne se
+# disputent pas les cœurs. None = cœurs disponibles (affinité, quota cgroup) / workers
+THREADING_CONFIG = {
+    "torch_intra_op_threads": None,  # torch.set_num_threads
+    "torch_inter_op_threads": 1,  # torch.set_num_interop_threads
+    "classifier_intra_op_threads": None,  # onnxruntime du classifieur (None = threads torch)
+    "classifier_inter_op_threads": 1,
+    "rembg_intra_op_threads": None,  # onnxruntime rembg, par session (None = cœurs du worker / sessions du pool)
+    "rembg_inter_op_threads": 1,
+}
+
+# Quantification INT8 post-entraînement (quantization.py)
+QUANTIZATION_CONFIG = {
+    "calibration_dir": None,  # Répertoire d'images de calibration (défaut: images synthétiques)
+    "calibration_size": 64,  # Nombre d'images de calibration
+    "eval_dir": None,  # Images d'évaluation de la dérive, distinctes de la calibration (défaut: synthétiques)
+    "per_channel": True,  # Échelles par canal pour les poids des convolutions
+    "calibrate_method": "minmax",  # minmax, entropy ou percentile
+}
+
+# Chargement des modèles (paresseux, préchargés en arrière-plan au démarrage)
+MODEL_LOADING_CONFIG = {
+    "load_on_startup": True,  # Charger et préchauffer les modèles dans une tâche de fond au démarrage
+    "warmup_inferences": 2,  # Inférences de préchauffage du classifieur après chargement
+}
+
+# Pools d'exécution pour le travail CPU (hors de la boucle d'événements), un par endpoint
+# kind: "thread" (torch/onnxruntime libèrent le GIL) ou "process" (étapes Python/NumPy pur,
+#       par exemple le fallback de suppression d'arrière-plan sans rembg)
+# max_queue: nombre de tâches en attente au-delà de max_workers avant refus (503)
+# start_method: méthode de démarrage des processus pour kind="process"
+EXECUTOR_CONFIG = {
+    "analyze": {"kind": "thread", "max_workers": 2, "max_queue": 32},
+    "remove_background": {"kind": "thread", "max_workers": 2, "max_queue": 16, "start_method": "spawn"},
+    "similarity": {"kind": "thread", "max_workers": 2, "max_queue": 64},
+}
+
+# Cache des résultats de /analyze (clé = hash du contenu uploadé + version du modèle/config)
+CACHE_CONFIG = {
+    "enabled": True,
+    "max_entries": 2048,  # Taille maximale du LRU en mémoire
+    "ttl_seconds": 24 * 3600,  # Durée de vie d'une entrée
+    "disk_enabled": False,  # Activer le niveau disque (SQLite, survit aux redémarrages)
+    "disk_path": "cache/analysis_cache.sqlite3",
+    "disk_max_entries": 100000,  # Taille maximale du niveau disque
+}
+
+# Configuration de la suppression d'arrière-plan (rembg / onnxruntime)
+BACKGROUND_REMOVAL_CONFIG = {
+    "model_name": "u2net",  # u2net, u2netp (léger), isnet-general-use, silueta...
+    "session_pool_size": None,  # Sessions réutilisables (None = workers du pool "remove_background")
+    "warmup_on_startup": True,  # Créer et préchauffer les sessions au démarrage
+    "mask_max_side": 640,  # Masque calculé sur une copie réduite puis agrandi (None = pleine résolution)
+    "guided_radius": 4,  # Rayon du filtre guidé d'agrandissement du masque (pixels réduits)
+    "guided_eps": 1e-3,  # Régularisation du filtre guidé (plus grand = bords plus lisses)
+    "output_format": "png",  # png, webp (RGBA) ou mask (canal alpha 8 bits seul, composité par le client)
+    "png_compress_level": 6,  # Compression zlib du PNG : 0 (rapide, lourd) à 9 (lent, léger)
+    "webp_lossless": True,  # WebP sans perte (alpha exact) ou avec perte
+    "webp_quality": 80,  # Qualité WebP avec perte, effort de compression sans perte (0-100)
+}
+
+# Décodage des images
+DECODE_CONFIG = {
+    "fast_decode": True,  # Décoder directement à la résolution utile (mise à l'échelle DCT JPEG)
+    "moderation_max_side": 512,  # Plus grand côté de l'image utilisée par la modération
+}
+
+# Index de similarité sur les embeddings (/similar)
+SIMILARITY_CONFIG = {
+    "index_dir": "data/similarity",  # Fichiers mappés en mémoire (partagés entre workers)
+    "dimensions": MODEL_CONFIG["embedding_dimensions"],
+    "default_k": 10,  # Nombre de résultats par défaut
+    "max_k": 100,  # Nombre maximum de résultats
+    "ivf_nlist": None,  # Nombre de listes IVF (None = ~sqrt(nombre de vecteurs))
+    "ivf_nprobe": 16,  # Listes explorées par requête approximative
+    "approximate_min_vectors": 20000,  # Mode "auto" : IVF à partir de ce nombre de vecteurs
+}
+
+# Métriques Prometheus (GET /metrics, metrics.py)
+METRICS_CONFIG = {
+    "enabled": True,
+    # Bornes des histogrammes de durée (secondes)
+    "latency_buckets": [0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0],
+    "server_timing": True,  # En-tête Server-Timing (durée par étape) sur chaque réponse
+}
+
+# Sérialisation des réponses (serialization.py)
+SERIALIZATION_CONFIG = {
+    "orjson": True,  # Utiliser orjson s'il est installé (pip install orjson)
+    # Encodage par défaut de l'embedding : json (liste), f32, f16 ou int8 (base64),
+    # modifiable par requête (?embedding_format= ou Accept: application/json; embedding=f16)
+    "embedding_format": "json",
+}
+
+# Profilage à la demande des requêtes lentes (profiling.py)
+PROFILING_CONFIG = {
+    "endpoints": ["/analyze", "/remove-background", "/process"],
+    "header": "X-Profile",  # En-tête qui déclenche le profilage d'une requête
+    "token": os.environ.get("PROFILE_TOKEN") or None,  # Valeur attendue de l'en-tête (None = en-tête ignoré)
+    "sample_rate": float(os.environ.get("PROFILE_SAMPLE_RATE", 0.0)),  # Part des requêtes profilées au hasard
+    "max_per_minute": 6,  # Profils enregistrés au plus par minute et par worker
+    "interval_ms": 5.0,  # Intervalle d'échantillonnage des piles
+    "max_duration_s": 30.0,  # Durée maximale d'un profil
+    "format": "speedscope",  # speedscope (JSON) ou collapsed (piles repliées, flamegraph.pl)
+    "output_dir": os.environ.get("PROFILE_DIR", "cache/profiles"),
+    "max_files": 200,  # Profils conservés (les plus anciens sont supprimés)
+}
+
+# Réception des uploads (limite unique pour tous les endpoints)
+UPLOAD_CONFIG = {
+    "max_bytes": 10 * 1024 * 1024,  # Taille maximale d'une image uploadée
+    "multipart_overhead_bytes": 64 * 1024,  # Marge pour l'enveloppe multipart (Content-Length)
+    "max_batch_bytes": 512 * 1024 * 1024,  # Taille maximale d'une requête /analyze/batch
+}
+
+# Analyse en lot (/analyze/batch)
+BATCH_CONFIG = {
+    "max_items": 500,  # Nombre maximum d'images par requête (fichiers ou entrées d'archive zip)
+    "concurrency": 16,  # Images traitées simultanément (alimente le micro-batcher)
+}
+
+# Jobs asynchrones de suppression d'arrière-plan (POST /jobs/remove-background, jobs.py)
+JOBS_CONFIG = {
+    "db_path": "cache/jobs.sqlite3",  # File et résultats (partagés par les workers, survivent aux redémarrages)
+    "concurrency": 1,  # Jobs traités simultanément par worker (dans le pool "remove_background")
+    "max_queued": 1000,  # Jobs en attente au-delà desquels la soumission est refusée (503)
+    "result_ttl_seconds": 3600,  # Conservation d'un job terminé et de son résultat
+    "max_result_bytes": 512 * 1024 * 1024,  # Taille totale des résultats conservés
+    "lease_seconds": 60,  # Bail d'un job en cours, renouvelé tant que son worker est vivant
+    "max_attempts": 3,  # Reprises après la perte du worker avant l'échec du job
+    "poll_interval": 0.5,  # Secondes entre deux consultations de la file par un worker inactif
+    "min_priority": -10,
+    "max_priority": 10,  # Les jobs les plus prioritaires sont traités en premier
+}
+
+# Contrôle d'admission des endpoints coûteux (admission.py), par worker.
+# Au-delà de concurrency requêtes en cours, les suivantes attendent dans une
+# file de max_queue places ; file pleine ou attente > max_wait_seconds :
+# 503 server_busy immédiat avec Retry-After. Les autres endpoints (/health,
+# /config, /metrics...) ne sont jamais mis en file.
+ADMISSION_CONFIG = {
+    "enabled": True,
+    "endpoints": {
+        "/analyze": {"concurrency": 8, "max_queue": 32, "max_wait_seconds": 10.0},
+        "/analyze/batch": {"concurrency": 1, "max_queue": 2, "max_wait_seconds": 30.0},
+        "/process": {"concurrency": 4, "max_queue": 16, "max_wait_seconds": 15.0},
+        "/remove-background": {"concurrency": 2, "max_queue": 8, "max_wait_seconds": 15.0},
+        "/jobs/remove-background": {"concurrency": 8, "max_queue": 32, "max_wait_seconds": 5.0},
+    },
+}
+
+# Serveur de production pré-forké (python prefork.py)
+PREFORK_CONFIG = {
+    "workers": None,  # Nombre de workers (défaut: nombre de cœurs)
+    "host": "0.0.0.0",
+    "port": 8000,
+    "max_requests": 10000,  # Recyclage d'un worker après N requêtes (0 = jamais)
+    "max_requests_jitter": 1000,  # Aléa ajouté pour ne pas recycler tous les workers ensemble
+    "heartbeat_interval": 2.0,  # Secondes entre deux battements de cœur d'un worker
+    "heartbeat_timeout": 30.0,  # Worker sans battement depuis ce délai : tué et remplacé
+    "graceful_timeout": 30.0,  # Délai laissé aux requêtes en cours à l'arrêt ou au recyclage
+}
+
+# Réglages mesurés sur la machine par `python -m benchmarks.autotune` : fichier
+# JSON {"THREADING_CONFIG": {...}, "PREFORK_CONFIG": {...}, ...} qui remplace les
+# valeurs correspondantes ci-dessus
+AUTOTUNE_PATH = os.environ.get("AUTOTUNE_PATH", "cache/autotune.json")
+
+
+def apply_overlay(path):
+    """Complète les dictionnaires *_CONFIG avec un fichier JSON s'il existe"""
+    if not path or not os.path.exists(path):
+        return False
+    with open(path) as f:
+        overlay = json.load(f)
+    for name, values in overlay.items():
+        target = globals().get(name)
+        if name.endswith("_CONFIG") and isinstance(target, dict) and isinstance(values, dict):
+            target.update({key: value for key, value in values.items() if key in target})
+    return True
+
+
+apply_overlay(AUTOTUNE_PATH)
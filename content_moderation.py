@@ -2,9 +2,9 @@
 Module de modération de contenu pour détecter les images inappropriées
 Détecte : nudité, contenu sexuel, violence, contenu gore
 """
-from PIL import Image
-import io
-from config import CONTENT_MODERATION_CONFIG
+from config import CONTENT_MODERATION_CONFIG, DECODE_CONFIG, UPLOAD_CONFIG
+from image_context import ImageContext
+from metrics import stage
 
 class ContentModerationError(Exception):
     """Exception levée quand du contenu inapproprié est détecté"""
@@ -14,49 +14,95 @@ class ContentModerationError(Exception):
         self.confidence = confidence
         super().__init__(self.message)
 
+# Lignes de miniature traitées par bande (une bande int16 tient dans le cache L2)
+BAND_ROWS = 64
+
+
+def _skin_mask(pixels):
+    """
+    Masque de peau d'un tableau (..., 3) en arithmétique signée
+    (r - g en uint8 reboucle : 10 - 20 vaut 246)
+    """
+    import numpy as np
+
+    pixels = np.asarray(pixels, dtype=np.int16)
+    r, g, b = pixels[..., 0], pixels[..., 1], pixels[..., 2]
+    # r - g > 15 implique r > g et |r - g| > 15
+    return (r > 95) & (g > 40) & (b > 20) & (r > b) & (r - g > 15)
+
+
+def moderation_stats(image, safe_below=None, unsafe_above=None):
+    """
+    Proportion de peau et luminosité moyenne en une seule passe sur l'image
+
+    L'image est parcourue par bandes de BAND_ROWS lignes : chaque bande est
+    convertie en int16 une fois, puis sert au masque de peau et à la somme des
+    canaux pendant qu'elle est en cache. Le parcours s'arrête dès que la
+    décision est certaine, quel que soit le contenu des lignes restantes.
+
+    Args:
+        image: Image PIL RGB ou tableau NumPy (H, W, 3)
+        safe_below: Arrêt dès que la proportion de peau ne peut plus dépasser ce seuil
+        unsafe_above: Arrêt dès que la proportion de peau dépasse ce seuil
+
+    Returns:
+        dict: skin_percentage et brightness (mesurés sur les lignes parcourues),
+              scanned (fraction des lignes parcourues)
+    """
+    import numpy as np
+
+    pixels = np.asarray(image)
+    height = pixels.shape[0]
+    total = pixels.shape[0] * pixels.shape[1]
+    if total == 0:
+        return {"skin_percentage": 0.0, "brightness": 0.0, "scanned": 1.0}
+
+    skin = 0
+    channel_sum = 0
+    rows = 0
+    while rows < height:
+        band = pixels[rows:rows + BAND_ROWS]
+        skin += int(np.count_nonzero(_skin_mask(band)))
+        channel_sum += int(band.sum(dtype=np.int64))
+        rows += band.shape[0]
+
+        if rows < height:
+            remaining = (height - rows) * pixels.shape[1]
+            if unsafe_above is not None and skin / total > unsafe_above:
+                break
+            if safe_below is not None and (skin + remaining) / total <= safe_below:
+                break
+
+    scanned = rows * pixels.shape[1]
+    return {
+        "skin_percentage": skin / scanned,
+        "brightness": channel_sum / (scanned * pixels.shape[2]),
+        "scanned": rows / height,
+    }
+
+
 def analyze_skin_percentage(image):
     """
     Analyse simple du pourcentage de peau visible dans l'image
     Utilise une détection de couleur de peau basique (heuristique)
+
+    Args:
+        image: Image PIL RGB ou tableau NumPy (H, W, 3)
     """
-    import numpy as np
-    
-    # Convertir en numpy array
-    img_array = np.array(image)
-    
-    # Détection basique de couleur de peau (gamme RGB)
-    # Cette méthode est simple mais efficace pour un MVP
-    r, g, b = img_array[:,:,0], img_array[:,:,1], img_array[:,:,2]
-    
-    # Conditions pour détecter la peau (heuristique simple)
-    skin_mask = (
-        (r > 95) & (g > 40) & (b > 20) &
-        (r > g) & (r > b) &
-        (abs(r - g) > 15) &
-        (r - g > 15)
-    )
-    
-    skin_percentage = np.sum(skin_mask) / skin_mask.size
-    return skin_percentage
+    return moderation_stats(image)["skin_percentage"]
 
 def check_image_brightness(image):
     """
     Vérifie si l'image est trop sombre ou trop claire (peut indiquer un contenu suspect)
     """
-    import numpy as np
-    from PIL import ImageStat
-    
-    stat = ImageStat.Stat(image)
-    mean_brightness = sum(stat.mean) / len(stat.mean)
-    
-    return mean_brightness
+    return moderation_stats(image)["brightness"]
 
-def detect_inappropriate_content(image_bytes):
+def detect_inappropriate_content(image_data):
     """
     Détecte si l'image contient du contenu inapproprié
     
     Args:
-        image_bytes: Bytes de l'image à analyser
+        image_data: Bytes de l'image à analyser ou ImageContext partagé
         
     Returns:
         dict: {
@@ -78,20 +124,32 @@ def detect_inappropriate_content(image_bytes):
             "moderation_disabled": True
         }
     
-    # Charger l'image
-    image = Image.open(io.BytesIO(image_bytes)).convert("RGB")
-    
-    # Analyser le pourcentage de peau
-    skin_percentage = analyze_skin_percentage(image)
+    nsfw_threshold = CONTENT_MODERATION_CONFIG["nsfw_threshold"]
     
-    # Vérifier la luminosité
-    brightness = check_image_brightness(image)
+    # Vérification gratuite d'abord : le format vient de l'en-tête
+    context = ImageContext.from_input(image_data)
+    width, height = context.size
+    portrait = (width / height) < 0.7
+    
+    # Statistiques de couleur sur une miniature bornée : coût fixe quelle que
+    # soit la résolution de l'upload (décodage à échelle réduite si fast_decode)
+    image = context.thumbnail(DECODE_CONFIG["moderation_max_side"])
+    
+    # Sous nsfw_threshold - 0.2 aucune règle ne s'applique, au-delà de
+    # nsfw_threshold l'image est refusée : inutile de parcourir le reste
+    with stage("moderation"):
+        stats = moderation_stats(
+            image,
+            safe_below=nsfw_threshold - 0.2,
+            unsafe_above=nsfw_threshold
+        )
+    skin_percentage = stats["skin_percentage"]
+    brightness = stats["brightness"]
     
     reasons = []
     is_safe = True
     
     # Règles de modération
-    nsfw_threshold = CONTENT_MODERATION_CONFIG["nsfw_threshold"]
     
     # 1. Vérifier le pourcentage de peau excessive (possible nudité)
     if skin_percentage > nsfw_threshold:
@@ -104,8 +162,7 @@ def detect_inappropriate_content(image_bytes):
         is_safe = False
     
     # 3. Vérifier dimensions et ratio (images de type "selfie" en sous-vêtements)
-    width, height = image.size
-    if skin_percentage > (nsfw_threshold - 0.1) and (width / height) < 0.7:
+    if portrait and skin_percentage > (nsfw_threshold - 0.1):
         reasons.append("format et contenu suspects")
         is_safe = False
     
@@ -114,7 +171,8 @@ def detect_inappropriate_content(image_bytes):
         "reasons": reasons,
         "skin_percentage": float(skin_percentage),
         "brightness": float(brightness),
-        "confidence": float(skin_percentage) if not is_safe else 0.0
+        "confidence": float(skin_percentage) if not is_safe else 0.0,
+        "scanned": stats["scanned"]
     }
     
     # Lever une exception si contenu inapproprié détecté
@@ -127,12 +185,12 @@ def detect_inappropriate_content(image_bytes):
     
     return result
 
-def validate_image_for_clothing(image_bytes):
+def validate_image_for_clothing(image_data):
     """
     Valide qu'une image est appropriée pour l'analyse de vêtements
     
     Args:
-        image_bytes: Bytes de l'image
+        image_data: Bytes de l'image ou ImageContext partagé
         
     Returns:
         dict: Résultat de la modération
@@ -142,20 +200,21 @@ def validate_image_for_clothing(image_bytes):
         ValueError: Si image invalide
     """
     try:
-        # Vérifier que c'est une image valide
-        image = Image.open(io.BytesIO(image_bytes))
+        # Vérifier que c'est une image valide (lecture de l'en-tête seulement)
+        context = ImageContext.from_input(image_data)
         
         # Vérifier les dimensions minimales
-        width, height = image.size
+        width, height = context.size
         if width < 50 or height < 50:
             raise ValueError("Image trop petite. Minimum 50x50 pixels requis.")
         
-        # Vérifier la taille du fichier (max 10MB)
-        if len(image_bytes) > 10 * 1024 * 1024:
-            raise ValueError("Image trop volumineuse. Maximum 10MB.")
+        # Vérifier la taille du fichier (limite commune des uploads)
+        max_bytes = UPLOAD_CONFIG["max_bytes"]
+        if len(context.image_bytes) > max_bytes:
+            raise ValueError(f"Image trop volumineuse. Maximum {max_bytes // (1024 * 1024)}MB.")
         
         # Analyser le contenu
-        moderation_result = detect_inappropriate_content(image_bytes)
+        moderation_result = detect_inappropriate_content(context)
         
         return moderation_result
         
@@ -0,0 +1,136 @@
+"""
+Budgets de threads CPU par worker (THREADING_CONFIG)
+Sans réglage, torch et onnxruntime dimensionnent leurs pools sur tous les cœurs
+de la machine dans chaque worker : avec N workers, N x cœurs threads se
+disputent les mêmes cœurs. Le budget par défaut partage les cœurs réellement
+disponibles (affinité CPU et quota cgroup du conteneur) entre les workers.
+"""
+import math
+import os
+import torch
+from config import THREADING_CONFIG, BACKGROUND_REMOVAL_CONFIG, EXECUTOR_CONFIG, PREFORK_CONFIG
+
+# Budget appliqué à ce processus (None tant que apply_thread_budget n'a pas été appelé)
+_applied = None
+
+
+def _cgroup_cpu_quota():
+    """Quota CPU du conteneur en nombre de cœurs (None si illimité ou inconnu)"""
+    try:
+        # cgroup v2 : "max 100000" ou "200000 100000"
+        with open("/sys/fs/cgroup/cpu.max") as f:
+            quota, period = f.read().split()[:2]
+        if quota != "max":
+            return int(quota) / int(period)
+        return None
+    except (OSError, ValueError):
+        pass
+    try:
+        # cgroup v1
+        with open("/sys/fs/cgroup/cpu/cpu.cfs_quota_us") as f:
+            quota = int(f.read())
+        with open("/sys/fs/cgroup/cpu/cpu.cfs_period_us") as f:
+            period = int(f.read())
+        if quota > 0:
+            return quota / period
+    except (OSError, ValueError):
+        pass
+    return None
+
+
+def available_cpus():
+    """Cœurs utilisables par le service (affinité CPU, quota cgroup)"""
+    try:
+        cpus = len(os.sched_getaffinity(0))
+    except AttributeError:
+        cpus = os.cpu_count() or 1
+    quota = _cgroup_cpu_quota()
+    if quota:
+        cpus = min(cpus, max(1, math.ceil(quota)))
+    return max(1, cpus)
+
+
+def default_workers():
+    """
+    Workers du serveur : WEB_CONCURRENCY (variable lue aussi par uvicorn
+    --workers), sinon PREFORK_CONFIG["workers"], sinon 1
+    """
+    try:
+        return max(1, int(os.environ.get("WEB_CONCURRENCY") or PREFORK_CONFIG["workers"] or 1))
+    except ValueError:
+        return 1
+
+
+def default_session_pool_size():
+    """Sessions rembg d'un worker (une par thread du pool "remove_background")"""
+    return max(1, int(
+        BACKGROUND_REMOVAL_CONFIG["session_pool_size"]
+        or EXECUTOR_CONFIG["remove_background"]["max_workers"]
+    ))
+
+
+def rembg_session_threads(per_worker, sessions):
+    """Threads intra-op d'une session rembg : cœurs du worker partagés entre les sessions"""
+    configured = THREADING_CONFIG["rembg_intra_op_threads"]
+    if configured:
+        return int(configured)
+    return max(1, per_worker // max(1, sessions))
+
+
+def thread_budget(workers=None, cpus=None):
+    """
+    Threads par bibliothèque pour un worker
+
+    Args:
+        workers: Nombre de workers qui se partagent la machine
+        cpus: Cœurs disponibles (défaut: available_cpus())
+    """
+    config = THREADING_CONFIG
+    workers = max(1, int(workers or default_workers()))
+    cpus = cpus or available_cpus()
+    per_worker = max(1, cpus // workers)
+    torch_threads = int(config["torch_intra_op_threads"] or per_worker)
+    return {
+        "workers": workers,
+        "cpus": cpus,
+        "per_worker_cpus": per_worker,
+        "torch_intra_op_threads": torch_threads,
+        "torch_inter_op_threads": int(config["torch_inter_op_threads"]),
+        "classifier_intra_op_threads": int(config["classifier_intra_op_threads"] or torch_threads),
+        "rembg_intra_op_threads": rembg_session_threads(per_worker, default_session_pool_size()),
+    }
+
+
+def apply_thread_budget(workers=None):
+    """
+    Applique le budget de threads au processus courant, avant toute inférence
+    Sans nombre de workers explicite, un budget déjà appliqué est conservé
+    (un worker pré-forké l'applique avant le démarrage de l'application).
+    """
+    global _applied
+    if workers is None and _applied is not None:
+        return _applied
+
+    budget = thread_budget(workers)
+    torch.set_num_threads(budget["torch_intra_op_threads"])
+    try:
+        torch.set_num_interop_threads(budget["torch_inter_op_threads"])
+    except RuntimeError:
+        # Fixable une seule fois, avant le premier travail parallèle inter-op
+        pass
+    _applied = budget
+    return budget
+
+
+def current_budget():
+    """Budget appliqué à ce processus, ou budget par défaut s'il n'a pas encore été appliqué"""
+    return _applied or thread_budget()
+
+
+def thread_stats():
+    """Budget appliqué et threads effectifs (exposé par /stats)"""
+    return {
+        "budget": _applied,
+        "torch_num_threads": torch.get_num_threads(),
+        "torch_num_interop_threads": torch.get_num_interop_threads(),
+    }
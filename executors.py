@@ -0,0 +1,147 @@
+"""
+Pools d'exécution bornés pour le travail CPU
+Sort l'inférence et le traitement d'image de la boucle d'événements uvicorn,
+avec une taille de pool et une file d'attente limitée par endpoint
+"""
+import asyncio
+import contextvars
+import functools
+import multiprocessing
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from config import EXECUTOR_CONFIG
+
+
+class ExecutorSaturatedError(Exception):
+    """Exception levée quand la file d'attente d'un pool est pleine"""
+    def __init__(self, message, pool):
+        self.message = message
+        self.pool = pool
+        super().__init__(self.message)
+
+
+class BoundedExecutor:
+    """Pool de threads ou de processus avec une file d'attente bornée"""
+
+    def __init__(self, name, kind="thread", max_workers=2, max_queue=16, start_method="spawn"):
+        if kind not in ("thread", "process"):
+            raise ValueError(f"Type de pool inconnu: {kind}")
+        self.name = name
+        self.kind = kind
+        self.max_workers = max(1, int(max_workers))
+        self.max_queue = max(0, int(max_queue))
+        self.start_method = start_method
+        self._pool = None
+
+        # Compteurs (modifiés uniquement depuis la boucle d'événements)
+        self._pending = 0
+        self._completed = 0
+        self._failed = 0
+        self._cancelled = 0
+        self._rejected = 0
+
+    def _get_pool(self):
+        """Crée le pool à la première utilisation"""
+        if self._pool is None:
+            if self.kind == "thread":
+                self._pool = ThreadPoolExecutor(
+                    max_workers=self.max_workers,
+                    thread_name_prefix=f"pool-{self.name}"
+                )
+            else:
+                self._pool = ProcessPoolExecutor(
+                    max_workers=self.max_workers,
+                    mp_context=multiprocessing.get_context(self.start_method)
+                )
+        return self._pool
+
+    async def run(self, fn, *args, **kwargs):
+        """
+        Exécute fn dans le pool et attend son résultat
+
+        Raises:
+            ExecutorSaturatedError: Si tous les workers et la file sont occupés
+        """
+        if self._pending >= self.max_workers + self.max_queue:
+            self._rejected += 1
+            raise ExecutorSaturatedError(
+                message=f"Service surchargé (pool '{self.name}' saturé), réessayez plus tard",
+                pool=self.name
+            )
+
+        loop = asyncio.get_running_loop()
+        if self.kind == "thread":
+            # Propager le contexte de la requête (contextvars) au thread
+            call = functools.partial(contextvars.copy_context().run, fn, *args, **kwargs)
+        else:
+            call = functools.partial(fn, *args, **kwargs)
+
+        future = self._get_pool().submit(call)
+        self._pending += 1
+        # La place est rendue quand la tâche se termine réellement, pas quand
+        # la coroutine qui l'attend est annulée (la tâche continue dans le pool)
+        future.add_done_callback(functools.partial(self._schedule_release, loop))
+        return await asyncio.wrap_future(future, loop=loop)
+
+    def _schedule_release(self, loop, future):
+        """Callback du futur (thread du pool) : libère la place dans la boucle"""
+        try:
+            loop.call_soon_threadsafe(self._release, future)
+        except RuntimeError:
+            pass  # boucle fermée : les compteurs ne servent plus
+
+    def _release(self, future):
+        self._pending -= 1
+        if future.cancelled():
+            self._cancelled += 1
+        elif future.exception() is not None:
+            self._failed += 1
+        else:
+            self._completed += 1
+
+    def stats(self):
+        """Statistiques d'occupation du pool"""
+        return {
+            "kind": self.kind,
+            "max_workers": self.max_workers,
+            "max_queue": self.max_queue,
+            "running": min(self._pending, self.max_workers),
+            "queued": max(0, self._pending - self.max_workers),
+            "completed": self._completed,
+            "failed": self._failed,
+            "cancelled": self._cancelled,
+            "rejected": self._rejected,
+        }
+
+    def shutdown(self, wait=True):
+        """Arrête le pool (il sera recréé à la prochaine utilisation)"""
+        if self._pool is not None:
+            self._pool.shutdown(wait=wait)
+            self._pool = None
+
+
+# Pools globaux, un par endpoint (voir EXECUTOR_CONFIG)
+executors = {
+    name: BoundedExecutor(name, **options)
+    for name, options in EXECUTOR_CONFIG.items()
+}
+
+
+def get_executor(name):
+    """Retourne le pool nommé (KeyError si inconnu)"""
+    return executors[name]
+
+
+async def run_in_executor(name, fn, *args, **kwargs):
+    """Raccourci : exécute fn dans le pool nommé"""
+    return await executors[name].run(fn, *args, **kwargs)
+
+
+def executors_stats():
+    """Statistiques de tous les pools"""
+    return {name: executor.stats() for name, executor in executors.items()}
+
+
+def shutdown_executors(wait=True):
+    """Arrête tous les pools (arrêt du serveur)"""
+    for executor in executors.values():
+        executor.shutdown(wait=wait)
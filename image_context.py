@@ -0,0 +1,218 @@
+"""
+Contexte d'image décodée partagé entre les étapes d'une requête
+L'upload est décodé une seule fois ; les représentations dérivées (RGB, RGBA,
+tableaux NumPy, tenseur 224x224, miniatures) sont calculées à la demande et
+mises en cache pour la modération, l'analyse et la suppression d'arrière-plan.
+
+En mode fast_decode, les étapes qui n'ont besoin que d'une petite résolution
+(tenseur, miniatures) décodent les JPEG directement à échelle réduite
+(mise à l'échelle dans le domaine DCT via Image.draft) au lieu de décoder
+l'image complète
+"""
+from PIL import Image
+import io
+import threading
+import numpy as np
+from config import DECODE_CONFIG
+from metrics import stage
+
+# Taille d'entrée du modèle de classification
+TENSOR_SIZE = (224, 224)
+
+_tensor_transform = None
+
+
+def get_tensor_transform():
+    """Transformation image -> tenseur du modèle (torchvision importé à la demande)"""
+    global _tensor_transform
+    if _tensor_transform is None:
+        from torchvision import transforms
+        _tensor_transform = transforms.Compose([
+            transforms.Resize(TENSOR_SIZE),
+            transforms.ToTensor()
+        ])
+    return _tensor_transform
+
+
+class BufferReader(io.RawIOBase):
+    """
+    Fichier en lecture seule sur un buffer (memoryview, bytearray) sans le copier
+    (io.BytesIO copierait tout buffer qui n'est pas un objet bytes)
+    """
+
+    def __init__(self, buffer):
+        self._view = memoryview(buffer).cast("B")
+        self._position = 0
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def readinto(self, target):
+        count = min(len(target), len(self._view) - self._position)
+        if count <= 0:
+            return 0
+        target[:count] = self._view[self._position:self._position + count]
+        self._position += count
+        return count
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_SET:
+            position = offset
+        elif whence == io.SEEK_CUR:
+            position = self._position + offset
+        else:
+            position = len(self._view) + offset
+        self._position = max(0, position)
+        return self._position
+
+    def tell(self):
+        return self._position
+
+
+def open_buffer(image_bytes):
+    """Flux lisible sur les bytes de l'upload (sans copie)"""
+    if isinstance(image_bytes, bytes):
+        return io.BytesIO(image_bytes)  # partage l'objet bytes tant qu'il n'est pas modifié
+    return BufferReader(image_bytes)
+
+
+class ImageContext:
+    """Image décodée une fois par requête, avec représentations dérivées paresseuses"""
+
+    def __init__(self, image_bytes, fast_decode=None):
+        """
+        Args:
+            image_bytes: Bytes de l'image uploadée (bytes ou memoryview)
+            fast_decode: Décodage à résolution réduite (défaut: DECODE_CONFIG)
+        """
+        self.image_bytes = image_bytes
+        self.fast_decode = DECODE_CONFIG["fast_decode"] if fast_decode is None else fast_decode
+        self._cache = {}
+        self._lock = threading.RLock()
+
+    @classmethod
+    def from_input(cls, image_data):
+        """Accepte des bytes ou un ImageContext existant"""
+        if isinstance(image_data, cls):
+            return image_data
+        return cls(image_data)
+
+    def _cached(self, key, compute):
+        """Calcule une représentation une seule fois (thread-safe)"""
+        try:
+            return self._cache[key]
+        except KeyError:
+            pass
+        with self._lock:
+            if key not in self._cache:
+                self._cache[key] = compute()
+            return self._cache[key]
+
+    def __getstate__(self):
+        # Seuls les bytes voyagent vers un pool de processus
+        return {"image_bytes": bytes(self.image_bytes), "fast_decode": self.fast_decode}
+
+    def __setstate__(self, state):
+        self.__init__(state["image_bytes"], state["fast_decode"])
+
+    @property
+    def header(self):
+        """Image ouverte sans décoder les pixels (format, dimensions, mode)"""
+        return self._cached("header", lambda: Image.open(open_buffer(self.image_bytes)))
+
+    def _decode(self):
+        image = self.header
+        with stage("decode"):
+            image.load()
+        return image
+
+    @property
+    def image(self):
+        """Image décodée dans son mode d'origine"""
+        return self._cached("image", self._decode)
+
+    @property
+    def format(self):
+        """Format de l'upload (JPEG, PNG, WEBP...)"""
+        return self.header.format
+
+    @property
+    def size(self):
+        """Dimensions (largeur, hauteur)"""
+        return self.header.size
+
+    @property
+    def rgb(self):
+        """Image convertie en RGB"""
+        return self._cached("rgb", lambda: self._convert("RGB"))
+
+    @property
+    def rgba(self):
+        """Image convertie en RGBA"""
+        return self._cached("rgba", lambda: self._convert("RGBA"))
+
+    def _convert(self, mode):
+        image = self.image
+        return image if image.mode == mode else image.convert(mode)
+
+    @property
+    def rgb_array(self):
+        """Tableau NumPy (H, W, 3) uint8, en lecture seule"""
+        return self._cached("rgb_array", lambda: np.asarray(self.rgb))
+
+    @property
+    def rgba_array(self):
+        """Tableau NumPy (H, W, 4) uint8, en lecture seule"""
+        return self._cached("rgba_array", lambda: np.asarray(self.rgba))
+
+    def _use_draft(self):
+        """La mise à l'échelle DCT n'a d'intérêt que pour un JPEG pas encore décodé"""
+        return self.fast_decode and self.format == "JPEG" and "image" not in self._cache
+
+    def reduced(self, min_width, min_height):
+        """
+        Image RGB à résolution réduite dont chaque côté reste supérieur ou égal
+        à (min_width, min_height) ; l'image d'origine si elle est plus petite
+        """
+        def compute():
+            if not self.fast_decode:
+                return self.rgb
+            if self._use_draft():
+                # Décodage JPEG directement à 1/2, 1/4 ou 1/8 de la résolution
+                with stage("decode"):
+                    image = Image.open(open_buffer(self.image_bytes))
+                    image.draft("RGB", (min_width, min_height))
+                    image = image.convert("RGB")
+            else:
+                image = self.rgb
+            factor = min(image.width // min_width, image.height // min_height)
+            if factor >= 2:
+                image = image.reduce(factor)
+            return image
+        return self._cached(("reduced", min_width, min_height), compute)
+
+    @property
+    def tensor(self):
+        """Tenseur (3, 224, 224) prêt pour le modèle"""
+        return self._cached("tensor", self._to_tensor)
+
+    def _to_tensor(self):
+        image = self.reduced(*TENSOR_SIZE)
+        with stage("preprocess"):
+            return get_tensor_transform()(image)
+
+    def thumbnail(self, max_side=256):
+        """Miniature RGB dont le plus grand côté vaut au plus max_side"""
+        def compute():
+            width, height = self.size
+            scale = min(1.0, max_side / max(width, height))
+            target = (max(1, round(width * scale)), max(1, round(height * scale)))
+            # reduced() décode à échelle réduite (fast_decode) ou retourne l'image RGB complète
+            image = self.reduced(*target)
+            if image.size == target:
+                return image
+            return image.resize(target, Image.BILINEAR, reducing_gap=2.0)
+        return self._cached(("thumbnail", max_side), compute)
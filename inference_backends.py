@@ -0,0 +1,188 @@
+"""
+Backends d'inférence du classifieur de vêtements (INFERENCE_CONFIG["backend"])
+- torch : PyTorch eager (référence)
+- onnxruntime : modèle exporté une fois en ONNX (fichier mis en cache sur disque),
+  exécuté par onnxruntime avec les optimisations de graphe, en float32 ou
+  quantifié en INT8 (quantization.py)
+
+Tous les backends prennent un tenseur (N, 3, 224, 224) et retournent les
+logits (N, 1000) sous forme de tenseur torch.
+"""
+import os
+import tempfile
+import threading
+import torch
+from config import INFERENCE_CONFIG, THREADING_CONFIG
+from image_context import TENSOR_SIZE
+
+BACKENDS = ("torch", "onnxruntime")
+QUANTIZATIONS = (None, "int8")
+
+
+class TorchBackend:
+    """Inférence PyTorch eager"""
+    name = "torch"
+
+    def __init__(self, model):
+        self.model = model
+
+    def run(self, batch_tensor):
+        with torch.no_grad():
+            return self.model(batch_tensor)
+
+
+class OnnxRuntimeBackend:
+    """Inférence onnxruntime sur un modèle ONNX exporté"""
+    name = "onnxruntime"
+
+    GRAPH_OPTIMIZATIONS = ("disable", "basic", "extended", "all")
+
+    def __init__(self, onnx_path, graph_optimization="all", intra_op_threads=None, inter_op_threads=1):
+        """
+        Args:
+            onnx_path: Chemin du modèle ONNX
+            graph_optimization: Niveau d'optimisation du graphe (disable, basic, extended, all)
+            intra_op_threads: Threads par opérateur (défaut: threads torch du processus)
+            inter_op_threads: Threads entre opérateurs
+        """
+        if graph_optimization not in self.GRAPH_OPTIMIZATIONS:
+            raise ValueError(f"Niveau d'optimisation inconnu: {graph_optimization}")
+        self.onnx_path = onnx_path
+        self.graph_optimization = graph_optimization
+        self.intra_op_threads = intra_op_threads
+        self.inter_op_threads = inter_op_threads
+        # Session créée au premier appel : ses threads ne survivraient pas à un fork
+        self._session = None
+        self._lock = threading.Lock()
+
+    def session(self):
+        if self._session is None:
+            with self._lock:
+                if self._session is None:
+                    self._session = self._create_session()
+        return self._session
+
+    def _create_session(self):
+        import onnxruntime as ort
+
+        levels = {
+            "disable": ort.GraphOptimizationLevel.ORT_DISABLE_ALL,
+            "basic": ort.GraphOptimizationLevel.ORT_ENABLE_BASIC,
+            "extended": ort.GraphOptimizationLevel.ORT_ENABLE_EXTENDED,
+            "all": ort.GraphOptimizationLevel.ORT_ENABLE_ALL,
+        }
+        sess_opts = ort.SessionOptions()
+        sess_opts.graph_optimization_level = levels[self.graph_optimization]
+        sess_opts.intra_op_num_threads = int(self.intra_op_threads or torch.get_num_threads())
+        sess_opts.inter_op_num_threads = int(self.inter_op_threads)
+        session = ort.InferenceSession(self.onnx_path, sess_options=sess_opts, providers=["CPUExecutionProvider"])
+        self._input_name = session.get_inputs()[0].name
+        return session
+
+    def run(self, batch_tensor):
+        session = self.session()
+        inputs = batch_tensor.detach().contiguous().numpy()
+        outputs = session.run(None, {self._input_name: inputs})[0]
+        return torch.from_numpy(outputs)
+
+
+def build_mobilenet():
+    """MobileNetV2 pré-entraîné (poids torchvision)"""
+    from torchvision import models
+
+    model = models.mobilenet_v2(weights=models.MobileNet_V2_Weights.DEFAULT)
+    model.eval()  # mode évaluation
+    return model
+
+
+def weights_id():
+    """Identifiant des poids (nom du fichier torchvision) pour nommer l'export"""
+    from torchvision import models
+
+    url = models.MobileNet_V2_Weights.DEFAULT.url
+    return os.path.splitext(os.path.basename(url))[0]
+
+
+def export_onnx(model, path, opset=None):
+    """
+    Exporte le modèle en ONNX avec une dimension de batch dynamique
+    (écriture atomique : plusieurs workers peuvent exporter en même temps)
+    """
+    directory = os.path.dirname(path) or "."
+    os.makedirs(directory, exist_ok=True)
+    sample = torch.zeros(1, 3, *TENSOR_SIZE)
+    options = dict(
+        input_names=["input"],
+        output_names=["logits"],
+        dynamic_axes={"input": {0: "batch"}, "logits": {0: "batch"}},
+        opset_version=opset or INFERENCE_CONFIG["onnx_opset"],
+    )
+
+    fd, tmp_path = tempfile.mkstemp(suffix=".onnx", dir=directory)
+    os.close(fd)
+    try:
+        with torch.no_grad():
+            try:
+                # Exporteur TorchScript : pas de dépendance à onnxscript
+                torch.onnx.export(model, (sample,), tmp_path, dynamo=False, **options)
+            except TypeError:
+                # torch < 2.5 : pas d'option dynamo
+                torch.onnx.export(model, (sample,), tmp_path, **options)
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    return path
+
+
+def onnx_model_path():
+    return os.path.join(INFERENCE_CONFIG["onnx_dir"], f"{weights_id()}.onnx")
+
+
+def int8_model_path():
+    return os.path.join(INFERENCE_CONFIG["onnx_dir"], f"{weights_id()}-int8.onnx")
+
+
+def create_backend(name=None, quantization=None):
+    """
+    Construit un backend d'inférence
+
+    Args:
+        name: torch ou onnxruntime (défaut: backend et quantification de INFERENCE_CONFIG)
+        quantization: None (float32) ou "int8" (onnxruntime uniquement)
+
+    Raises:
+        ValueError: Si le backend ou la quantification est invalide
+    """
+    if name is None:
+        name = INFERENCE_CONFIG["backend"]
+        quantization = INFERENCE_CONFIG["quantization"]
+    if name not in BACKENDS:
+        raise ValueError(f"Backend d'inférence inconnu: {name} (attendu: {', '.join(BACKENDS)})")
+    if quantization not in QUANTIZATIONS:
+        raise ValueError(f"Quantification inconnue: {quantization}")
+    if quantization and name != "onnxruntime":
+        raise ValueError("La quantification INT8 nécessite le backend onnxruntime")
+
+    if name == "torch":
+        return TorchBackend(build_mobilenet())
+
+    path = onnx_model_path()
+    if not os.path.exists(path):
+        print(f"📦 Export ONNX du classifieur vers {path}")
+        export_onnx(build_mobilenet(), path)
+
+    if quantization == "int8":
+        float_path, path = path, int8_model_path()
+        if not os.path.exists(path):
+            from quantization import quantize_model
+
+            print(f"📦 Quantification INT8 du classifieur vers {path}")
+            quantize_model(float_path, path)
+
+    return OnnxRuntimeBackend(
+        path,
+        graph_optimization=INFERENCE_CONFIG["graph_optimization"],
+        intra_op_threads=THREADING_CONFIG["classifier_intra_op_threads"],
+        inter_op_threads=THREADING_CONFIG["classifier_inter_op_threads"]
+    )
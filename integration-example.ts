@@ -34,6 +34,27 @@ interface ContentBlockedError {
   help: string;
 }
 
+interface ProcessResult {
+  steps: string[];
+  moderation: { is_safe: boolean; reasons: string[] };
+  analysis?: AnalysisResult;
+  background_removal?: {
+    media_type: string;
+    image_base64: string;
+    metadata: Record<string, unknown>;
+  };
+  timings_ms: Record<string, number>;
+}
+
+interface RemoveBackgroundJob {
+  job_id: string;
+  status: "queued" | "running" | "done" | "failed";
+  queue_position?: number;
+  status_url: string;
+  result_url: string;
+  error?: { error: string; message: string };
+}
+
 interface InvalidImageError {
   error: "invalid_image";
   message: string;
@@ -129,6 +150,107 @@ class AIClothingService {
     );
   }
 
+  /**
+   * Modère, analyse et détoure une image en un seul upload (POST /process)
+   * @param imageUri URI de l'image (local ou distant)
+   * @returns Analyse et PNG détouré (base64), ou null si erreur
+   */
+  static async processClothingImage(
+    imageUri: string
+  ): Promise<ProcessResult | null> {
+    try {
+      const formData = new FormData();
+      formData.append("file", {
+        uri: imageUri,
+        type: "image/jpeg",
+        name: "clothing.jpg",
+      } as any);
+      formData.append("steps", "moderation,analysis,background_removal");
+
+      const response = await fetch(`${AI_SERVICE_URL}/process`, {
+        method: "POST",
+        body: formData,
+      });
+
+      // La modération refuse l'image avant tout modèle
+      if (response.status === 451) {
+        const { detail } = await response.json();
+        this.handleContentBlocked(detail as ContentBlockedError);
+        return null;
+      }
+
+      if (response.status === 400) {
+        const { detail } = await response.json();
+        this.handleInvalidImage(detail as InvalidImageError);
+        return null;
+      }
+
+      if (!response.ok) {
+        throw new Error(`Erreur ${response.status}: ${response.statusText}`);
+      }
+
+      return (await response.json()) as ProcessResult;
+    } catch (error) {
+      console.error("Erreur lors du traitement:", error);
+      Alert.alert(
+        "Erreur",
+        "Impossible de traiter l'image. Veuillez réessayer.",
+        [{ text: "OK" }]
+      );
+      return null;
+    }
+  }
+
+  /**
+   * Détoure une image via un job asynchrone (POST /jobs/remove-background) :
+   * la connexion n'est pas tenue pendant le traitement, et un nouvel envoi
+   * avec la même clé d'idempotence (réseau instable) retrouve le même job
+   * @param imageUri URI de l'image (local ou distant)
+   * @param idempotencyKey Clé unique par image (ex: identifiant de la photo)
+   * @returns URL du PNG détouré, ou null si erreur
+   */
+  static async removeBackgroundAsync(
+    imageUri: string,
+    idempotencyKey: string
+  ): Promise<string | null> {
+    try {
+      const formData = new FormData();
+      formData.append("file", {
+        uri: imageUri,
+        type: "image/jpeg",
+        name: "clothing.jpg",
+      } as any);
+
+      const response = await fetch(`${AI_SERVICE_URL}/jobs/remove-background`, {
+        method: "POST",
+        body: formData,
+        headers: { "Idempotency-Key": idempotencyKey },
+      });
+      if (response.status === 400) {
+        const { detail } = await response.json();
+        this.handleInvalidImage(detail as InvalidImageError);
+        return null;
+      }
+      if (!response.ok) {
+        throw new Error(`Erreur ${response.status}: ${response.statusText}`);
+      }
+
+      // Suivre le job jusqu'à la fin du traitement
+      let job = (await response.json()) as RemoveBackgroundJob;
+      while (job.status === "queued" || job.status === "running") {
+        await new Promise((resolve) => setTimeout(resolve, 1000));
+        job = await (await fetch(`${AI_SERVICE_URL}${job.status_url}`)).json();
+      }
+      if (job.status === "failed") {
+        throw new Error(job.error?.message ?? "Job en échec");
+      }
+      return `${AI_SERVICE_URL}${job.result_url}`;
+    } catch (error) {
+      console.error("Erreur lors du détourage:", error);
+      return null;
+    }
+  }
+
   /**
    * Vérifie la santé du service
    */
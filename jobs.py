@@ -0,0 +1,398 @@
+"""
+Jobs asynchrones de suppression d'arrière-plan (POST /jobs/remove-background)
+
+Le client reçoit immédiatement un identifiant puis interroge GET /jobs/{id}
+et récupère le résultat avec GET /jobs/{id}/result : la connexion HTTP n'est
+plus tenue pendant tout le traitement, et un client qui renvoie sa requête
+avec le même en-tête Idempotency-Key retrouve le job existant au lieu d'en
+créer un second.
+
+La file et les résultats sont stockés dans une base SQLite locale
+(JOBS_CONFIG["db_path"]) partagée par tous les workers du serveur :
+- chaque worker exécute un JobRunner qui réserve le job en attente le plus
+  prioritaire (puis le plus ancien) et le traite dans le pool "remove_background"
+- un job réservé porte un bail renouvelé tant que son worker est vivant ; après
+  un redémarrage ou la mort du worker, le bail expire et le job est remis en
+  file (au plus max_attempts fois)
+- les résultats terminés expirent après result_ttl_seconds, et les plus anciens
+  sont supprimés au-delà de max_result_bytes
+"""
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from starlette.concurrency import run_in_threadpool
+from config import JOBS_CONFIG
+from background_removal import remove_background
+from executors import run_in_executor, ExecutorSaturatedError
+from image_context import ImageContext
+from metrics import record_error
+
+QUEUED, RUNNING, DONE, FAILED = "queued", "running", "done", "failed"
+
+# Colonnes renvoyées par GET /jobs/{id} (sans les données binaires)
+_COLUMNS = (
+    "id", "kind", "status", "priority", "filename", "options", "media_type", "metadata",
+    "error", "attempts", "created_at", "started_at", "finished_at", "expires_at",
+)
+
+
+class JobQueueFullError(Exception):
+    """Exception levée quand la file des jobs en attente est pleine"""
+    def __init__(self, message):
+        self.message = message
+        super().__init__(self.message)
+
+
+class JobStore:
+    """File de jobs et résultats persistés dans SQLite"""
+
+    def __init__(self, path, max_queued=1000, result_ttl_seconds=3600, max_result_bytes=512 * 1024 * 1024,
+                 lease_seconds=60, max_attempts=3):
+        self.path = path
+        self.max_queued = int(max_queued)
+        self.ttl = float(result_ttl_seconds)
+        self.max_result_bytes = int(max_result_bytes)
+        self.lease_seconds = float(lease_seconds)
+        self.max_attempts = int(max_attempts)
+        self._db = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def _connection(self):
+        """Connexion ouverte au premier usage dans chaque processus (fork-safe)"""
+        if self._db is None or self._pid != os.getpid():
+            self._lock = threading.Lock()
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            db = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None, timeout=30)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS jobs ("
+                "id TEXT PRIMARY KEY, kind TEXT NOT NULL, status TEXT NOT NULL, "
+                "priority INTEGER NOT NULL, idempotency_key TEXT UNIQUE, filename TEXT, "
+                "options TEXT NOT NULL, input BLOB, result BLOB, media_type TEXT, metadata TEXT, "
+                "error TEXT, attempts INTEGER NOT NULL DEFAULT 0, owner TEXT, lease_until REAL, "
+                "created_at REAL NOT NULL, started_at REAL, finished_at REAL, expires_at REAL)"
+            )
+            db.execute("CREATE INDEX IF NOT EXISTS idx_jobs_queue ON jobs(status, priority DESC, created_at)")
+            self._db, self._pid = db, os.getpid()
+        return self._db
+
+    def _row(self, row):
+        job = dict(zip(_COLUMNS, row))
+        for field in ("options", "metadata", "error"):
+            if job[field] is not None:
+                job[field] = json.loads(job[field])
+        return job
+
+    def submit(self, kind, input_bytes, options, priority=0, filename=None, idempotency_key=None):
+        """
+        Crée un job en attente (ou retourne celui de la même clé d'idempotence)
+
+        Raises:
+            JobQueueFullError: Si max_queued jobs sont déjà en attente
+        """
+        now = time.time()
+        with self._lock:
+            db = self._connection()
+            db.execute("BEGIN IMMEDIATE")
+            try:
+                if idempotency_key:
+                    row = db.execute(
+                        f"SELECT {', '.join(_COLUMNS)} FROM jobs WHERE idempotency_key = ?",
+                        (idempotency_key,)
+                    ).fetchone()
+                    if row is not None:
+                        db.execute("COMMIT")
+                        return self._row(row)
+                queued = db.execute("SELECT COUNT(*) FROM jobs WHERE status = ?", (QUEUED,)).fetchone()[0]
+                if queued >= self.max_queued:
+                    raise JobQueueFullError(f"File des jobs pleine ({queued} en attente), réessayez plus tard")
+                job_id = uuid.uuid4().hex
+                db.execute(
+                    "INSERT INTO jobs (id, kind, status, priority, idempotency_key, filename, options, "
+                    "input, created_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (job_id, kind, QUEUED, int(priority), idempotency_key, filename,
+                     json.dumps(options), bytes(input_bytes), now)
+                )
+                db.execute("COMMIT")
+            except BaseException:
+                db.execute("ROLLBACK")
+                raise
+        return self.get(job_id)
+
+    def claim(self, owner):
+        """
+        Réserve le job en attente le plus prioritaire ; les jobs dont le bail a
+        expiré (worker mort ou redémarré) sont d'abord remis en file
+
+        Returns:
+            tuple: (job, bytes de l'image) ou None si la file est vide
+        """
+        now = time.time()
+        with self._lock:
+            db = self._connection()
+            db.execute("BEGIN IMMEDIATE")
+            try:
+                self._recover(db, now)
+                row = db.execute(
+                    "SELECT id, input FROM jobs WHERE status = ? ORDER BY priority DESC, created_at LIMIT 1",
+                    (QUEUED,)
+                ).fetchone()
+                if row is None:
+                    db.execute("COMMIT")
+                    return None
+                job_id, input_bytes = row
+                db.execute(
+                    "UPDATE jobs SET status = ?, owner = ?, lease_until = ?, started_at = ?, "
+                    "attempts = attempts + 1 WHERE id = ?",
+                    (RUNNING, owner, now + self.lease_seconds, now, job_id)
+                )
+                db.execute("COMMIT")
+            except BaseException:
+                db.execute("ROLLBACK")
+                raise
+        return self.get(job_id), input_bytes
+
+    def _recover(self, db, now):
+        """Remet en file les jobs au bail expiré (échec après max_attempts)"""
+        error = json.dumps({"error": "worker_lost",
+                            "message": "Le worker chargé du job s'est arrêté trop de fois"})
+        db.execute(
+            "UPDATE jobs SET status = ?, input = NULL, error = ?, finished_at = ?, expires_at = ?, owner = NULL "
+            "WHERE status = ? AND lease_until < ? AND attempts >= ?",
+            (FAILED, error, now, now + self.ttl, RUNNING, now, self.max_attempts)
+        )
+        db.execute(
+            "UPDATE jobs SET status = ?, owner = NULL, lease_until = NULL WHERE status = ? AND lease_until < ?",
+            (QUEUED, RUNNING, now)
+        )
+
+    def renew(self, owner):
+        """Prolonge le bail des jobs en cours d'un worker"""
+        with self._lock:
+            self._connection().execute(
+                "UPDATE jobs SET lease_until = ? WHERE owner = ? AND status = ?",
+                (time.time() + self.lease_seconds, owner, RUNNING)
+            )
+
+    def release(self, job_id, owner):
+        """Remet un job réservé en file sans compter de tentative (pool saturé, arrêt)"""
+        with self._lock:
+            self._connection().execute(
+                "UPDATE jobs SET status = ?, owner = NULL, lease_until = NULL, started_at = NULL, "
+                "attempts = attempts - 1 WHERE id = ? AND owner = ? AND status = ?",
+                (QUEUED, job_id, owner, RUNNING)
+            )
+
+    def complete(self, job_id, owner, result, media_type, metadata):
+        """
+        Enregistre le résultat d'un job encore réservé par owner
+
+        Returns:
+            bool: False si le bail a expiré et que le job a été repris (résultat ignoré)
+        """
+        now = time.time()
+        with self._lock:
+            db = self._connection()
+            updated = db.execute(
+                "UPDATE jobs SET status = ?, input = NULL, result = ?, media_type = ?, metadata = ?, "
+                "owner = NULL, finished_at = ?, expires_at = ? WHERE id = ? AND owner = ? AND status = ?",
+                (DONE, bytes(result), media_type, json.dumps(metadata), now, now + self.ttl, job_id, owner, RUNNING)
+            ).rowcount
+            if updated:
+                self._prune(db, now)
+            return updated > 0
+
+    def fail(self, job_id, owner, error, message):
+        """
+        Marque en échec un job encore réservé par owner
+
+        Returns:
+            bool: False si le bail a expiré et que le job a été repris
+        """
+        now = time.time()
+        with self._lock:
+            db = self._connection()
+            updated = db.execute(
+                "UPDATE jobs SET status = ?, input = NULL, error = ?, owner = NULL, "
+                "finished_at = ?, expires_at = ? WHERE id = ? AND owner = ? AND status = ?",
+                (FAILED, json.dumps({"error": error, "message": message}), now, now + self.ttl, job_id, owner, RUNNING)
+            ).rowcount
+            if updated:
+                self._prune(db, now)
+            return updated > 0
+
+    def _prune(self, db, now):
+        """Supprime les jobs terminés expirés puis les plus anciens résultats au-delà de max_result_bytes"""
+        db.execute("DELETE FROM jobs WHERE expires_at <= ?", (now,))
+        total = db.execute("SELECT COALESCE(SUM(LENGTH(result)), 0) FROM jobs WHERE status = ?", (DONE,)).fetchone()[0]
+        if total <= self.max_result_bytes:
+            return
+        for job_id, size in db.execute(
+            "SELECT id, LENGTH(result) FROM jobs WHERE status = ? ORDER BY finished_at", (DONE,)
+        ).fetchall():
+            db.execute("DELETE FROM jobs WHERE id = ?", (job_id,))
+            total -= size
+            if total <= self.max_result_bytes:
+                break
+
+    def get(self, job_id):
+        """État d'un job (None s'il n'existe pas ou a expiré)"""
+        now = time.time()
+        with self._lock:
+            db = self._connection()
+            row = db.execute(f"SELECT {', '.join(_COLUMNS)} FROM jobs WHERE id = ?", (job_id,)).fetchone()
+            if row is None:
+                return None
+            job = self._row(row)
+            if job["expires_at"] is not None and job["expires_at"] <= now:
+                return None
+            if job["status"] == QUEUED:
+                # Jobs servis avant celui-ci : plus prioritaires, ou aussi prioritaires et plus anciens
+                job["queue_position"] = db.execute(
+                    "SELECT COUNT(*) FROM jobs WHERE status = ? AND "
+                    "(priority > ? OR (priority = ? AND created_at < ?))",
+                    (QUEUED, job["priority"], job["priority"], job["created_at"])
+                ).fetchone()[0]
+        return job
+
+    def result(self, job_id):
+        """Bytes du résultat d'un job terminé (None sinon)"""
+        with self._lock:
+            row = self._connection().execute(
+                "SELECT result FROM jobs WHERE id = ? AND status = ? AND expires_at > ?",
+                (job_id, DONE, time.time())
+            ).fetchone()
+        return row[0] if row is not None else None
+
+    def stats(self):
+        with self._lock:
+            db = self._connection()
+            counts = dict(db.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall())
+            result_bytes = db.execute("SELECT COALESCE(SUM(LENGTH(result)), 0) FROM jobs").fetchone()[0]
+        return {
+            "queued": counts.get(QUEUED, 0),
+            "running": counts.get(RUNNING, 0),
+            "done": counts.get(DONE, 0),
+            "failed": counts.get(FAILED, 0),
+            "result_bytes": result_bytes,
+            "max_result_bytes": self.max_result_bytes,
+        }
+
+
+class JobRunner:
+    """Exécute les jobs de la base dans ce worker (plusieurs à la fois)"""
+
+    def __init__(self, store, concurrency=1, poll_interval=0.5):
+        self.store = store
+        self.concurrency = max(1, int(concurrency))
+        self.poll_interval = float(poll_interval)
+        self.owner = None
+        self._tasks = []
+        self._wakeup = None
+        self._running = set()
+
+    @property
+    def started(self):
+        return bool(self._tasks)
+
+    def start(self):
+        """Démarre les boucles de traitement sur la boucle d'événements courante"""
+        if self._tasks:
+            return
+        self.owner = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        self._wakeup = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        self._tasks = [loop.create_task(self._work()) for _ in range(self.concurrency)]
+        self._tasks.append(loop.create_task(self._heartbeat()))
+
+    async def stop(self):
+        """Arrête les boucles ; les jobs en cours sont remis en file"""
+        tasks, self._tasks = self._tasks, []
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        for job_id in list(self._running):
+            await run_in_threadpool(self.store.release, job_id)
+        self._running.clear()
+
+    def notify(self):
+        """Réveille un worker en attente (nouveau job soumis dans ce processus)"""
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    async def _work(self):
+        while True:
+            claimed = await run_in_threadpool(self.store.claim, self.owner)
+            if claimed is None:
+                # Les jobs soumis aux autres workers sont vus au plus tard après poll_interval
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+                self._wakeup.clear()
+                continue
+            job, input_bytes = claimed
+            self._running.add(job["id"])
+            try:
+                await self._process(job, input_bytes)
+            finally:
+                self._running.discard(job["id"])
+
+    async def _process(self, job, input_bytes):
+        try:
+            output_bytes, metadata = await run_in_executor(
+                "remove_background", remove_background, ImageContext(input_bytes), **job["options"]
+            )
+        except ExecutorSaturatedError:
+            # Pool occupé par les requêtes synchrones : rendre le job et patienter
+            await run_in_threadpool(self.store.release, job["id"], self.owner)
+            await asyncio.sleep(self.poll_interval)
+            return
+        except ValueError as e:
+            record_error("invalid_image")
+            await self._finish(self.store.fail, job, "invalid_image", str(e))
+            return
+        except Exception as e:
+            record_error("background_removal_failed")
+            await self._finish(
+                self.store.fail, job, "background_removal_failed",
+                f"Erreur lors de la suppression d'arrière-plan: {str(e)}"
+            )
+            return
+        await self._finish(self.store.complete, job, output_bytes, metadata["media_type"], metadata)
+
+    async def _finish(self, update, job, *args):
+        """Enregistre l'issue du job, sauf s'il a été repris par un autre worker entre-temps"""
+        if not await run_in_threadpool(update, job["id"], self.owner, *args):
+            print(f"⚠️ Job {job['id']} repris par un autre worker (bail expiré) : issue ignorée")
+
+    async def _heartbeat(self):
+        """Renouvelle le bail des jobs en cours (un tiers de la durée du bail)"""
+        while True:
+            await asyncio.sleep(self.store.lease_seconds / 3)
+            if self._running:
+                await run_in_threadpool(self.store.renew, self.owner)
+
+
+# Instances globales (base ouverte au premier usage dans chaque worker)
+job_store = JobStore(
+    JOBS_CONFIG["db_path"],
+    max_queued=JOBS_CONFIG["max_queued"],
+    result_ttl_seconds=JOBS_CONFIG["result_ttl_seconds"],
+    max_result_bytes=JOBS_CONFIG["max_result_bytes"],
+    lease_seconds=JOBS_CONFIG["lease_seconds"],
+    max_attempts=JOBS_CONFIG["max_attempts"]
+)
+job_runner = JobRunner(
+    job_store,
+    concurrency=JOBS_CONFIG["concurrency"],
+    poll_interval=JOBS_CONFIG["poll_interval"]
+)
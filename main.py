@@ -1,26 +1,113 @@
-from fastapi import FastAPI, File, UploadFile, HTTPException
+from fastapi import FastAPI, File, Form, Header, UploadFile, HTTPException
+from fastapi.exception_handlers import http_exception_handler
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import StreamingResponse
+from fastapi.responses import JSONResponse, PlainTextResponse, Response, StreamingResponse
 from fastapi.staticfiles import StaticFiles
-from utils import analyze_image
-from background_removal import background_removal_service
-from config import CLOTHING_TYPES, STYLES, COLORS, MODEL_CONFIG
-import io
+from starlette.concurrency import run_in_threadpool
+from PIL import UnidentifiedImageError
+from pydantic import BaseModel
+from typing import List, Optional, Union
+from utils import analyze_image_batched, analysis_batcher
+from background_removal import background_removal_service, output_options, remove_background as remove_background_bytes
+from executors import run_in_executor, executors_stats, shutdown_executors, ExecutorSaturatedError
+from image_context import ImageContext
+from result_cache import analysis_cache, cached_analysis
+from jobs import job_store, job_runner, JobQueueFullError, DONE as JOB_DONE, FAILED as JOB_FAILED
+from batch_analysis import collect_batch_items, stream_batch_analysis
+from content_moderation import ContentModerationError
+from pipeline import parse_steps, run_pipeline, build_json_response, build_multipart_response, RESPONSE_FORMATS
+from similarity_index import get_similarity_index, similarity_stats
+from uploads import UploadLimitMiddleware, UploadTooLargeError, read_upload
+from model_registry import model_registry, preload_models, FAILED
+from cpu_threads import apply_thread_budget, thread_stats
+import metrics
+from metrics import MetricsMiddleware, record_error, stage
+from profiling import ProfilingMiddleware
+from serialization import decode_embedding, dumps, negotiate_embedding_format, with_embedding_format
+from admission import AdmissionMiddleware, admission_stats
+from config import CLOTHING_TYPES, STYLES, COLORS, MODEL_CONFIG, MODEL_LOADING_CONFIG, PIPELINE_CONFIG, SIMILARITY_CONFIG, JOBS_CONFIG
+import asyncio
+import os
+
+class TimedJSONResponse(JSONResponse):
+    """Réponse JSON dont la sérialisation est mesurée (étape "serialization"), via orjson s'il est installé"""
+
+    def render(self, content):
+        with stage("serialization"):
+            return dumps(content)
+
+def requested_embedding_format(embedding_format, accept):
+    """Format d'embedding négocié (paramètre de requête ou en-tête Accept), 400 s'il est inconnu"""
+    try:
+        return negotiate_embedding_format(embedding_format, accept)
+    except ValueError as e:
+        raise HTTPException(
+            status_code=400,
+            detail={
+                "error": "invalid_embedding_format",
+                "message": str(e)
+            }
+        )
 
 app = FastAPI(
     title="AI Clothing Service - Serahly",
     description="Service d'analyse d'images de vêtements pour le projet Serahly",
-    version="1.0.0"
+    version="1.0.0",
+    default_response_class=TimedJSONResponse
 )
 
-# Autoriser toutes les origines pour le MVP
+# Middlewares, du plus interne au plus externe (add_middleware ajoute à l'extérieur)
+
+# Limiter la concurrence des endpoints coûteux (503 immédiat si la file est pleine)
+app.add_middleware(AdmissionMiddleware)
+
+# Refuser les uploads trop volumineux avant de lire tout le corps (et avant l'admission)
+app.add_middleware(UploadLimitMiddleware)
+
+# Profiler à la demande les requêtes sélectionnées (en-tête X-Profile ou tirage)
+app.add_middleware(ProfilingMiddleware)
+
+# Compter et chronométrer toutes les requêtes, refus compris
+app.add_middleware(MetricsMiddleware)
+
+# Autoriser toutes les origines pour le MVP (middleware le plus externe : les
+# refus des middlewares ci-dessus portent aussi les en-têtes CORS)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
     allow_methods=["*"],
-    allow_headers=["*"]
+    allow_headers=["*"],
+    expose_headers=["Retry-After", "Server-Timing", "X-Profile-Id"]
 )
 
+@app.exception_handler(HTTPException)
+async def count_http_errors(request, exc):
+    """Compte les réponses d'erreur par code "error" avant la réponse par défaut"""
+    if isinstance(exc.detail, dict) and "error" in exc.detail:
+        record_error(exc.detail["error"])
+    elif exc.status_code >= 400:
+        record_error("other")
+    return await http_exception_handler(request, exc)
+
+@app.on_event("startup")
+async def startup():
+    """
+    Charge et préchauffe les modèles dans une tâche de fond : le serveur répond
+    immédiatement et /ready indique quand il peut recevoir du trafic
+    """
+    # Part des cœurs de ce worker, avant toute inférence (déjà fait si pré-forké)
+    apply_thread_budget()
+    if MODEL_LOADING_CONFIG["load_on_startup"]:
+        app.state.model_loading = asyncio.create_task(preload_models())
+    # Traiter les jobs asynchrones (y compris ceux laissés par un worker précédent)
+    job_runner.start()
+
+@app.on_event("shutdown")
+async def shutdown():
+    """Remet en file les jobs en cours et libère les pools d'exécution à l'arrêt du serveur"""
+    await job_runner.stop()
+    shutdown_executors(wait=False)
+
 @app.get("/")
 def root():
     """Page d'accueil de l'API"""
@@ -29,22 +116,58 @@ def root():
         "version": "1.0.0",
         "endpoints": {
             "analyze": "POST /analyze",
+            "analyze-batch": "POST /analyze/batch",
             "remove-background": "POST /remove-background",
+            "jobs": "POST /jobs/remove-background, GET /jobs/{id}, GET /jobs/{id}/result",
+            "process": "POST /process",
             "health": "GET /health",
-            "config": "GET /config"
+            "ready": "GET /ready",
+            "config": "GET /config",
+            "stats": "GET /stats",
+            "metrics": "GET /metrics",
+            "similar": "POST /similar",
+            "similar-items": "POST /similar/items, DELETE /similar/items/{id}",
+            "similar-index": "POST /similar/index"
         }
     }
 
 @app.get("/health")
 def health_check():
-    """Vérification de l'état du service"""
+    """
+    Vérification de l'état du service (liveness : répond aussi pendant le
+    chargement des modèles)
+    """
+    models = model_registry.status()
+    if any(m["state"] == FAILED for m in models.values()):
+        status = "degraded"
+    elif model_registry.is_ready():
+        status = "healthy"
+    else:
+        status = "starting"
     return {
-        "status": "healthy",
+        "status": status,
         "service": "ai-clothing-service",
-        "model": "MobileNetV2",
+        "model": models["classifier"]["model"],
+        "models": {name: m["state"] for name, m in models.items()},
+        "worker": getattr(app.state, "worker", None),  # Worker pré-forké qui répond
         "features": ["analysis", "background_removal"]
     }
 
+@app.get("/ready")
+def readiness_check():
+    """
+    Readiness : 200 quand les modèles préchargés sont chargés et préchauffés,
+    503 sinon (l'orchestrateur n'envoie du trafic qu'aux instances prêtes)
+    """
+    ready = model_registry.is_ready()
+    return JSONResponse(
+        status_code=200 if ready else 503,
+        content={
+            "ready": ready,
+            "models": model_registry.status()
+        }
+    )
+
 @app.get("/config")
 def get_config():
     """Retourne la configuration du service"""
@@ -55,10 +178,37 @@ def get_config():
         "model_config": MODEL_CONFIG
     }
 
+@app.get("/stats")
+def get_stats():
+    """Statistiques d'exécution (batchs d'inférence, pools d'exécution, files d'admission)"""
+    return {
+        "batching": analysis_batcher.stats(),
+        "executors": executors_stats(),
+        "admission": admission_stats(),
+        "cache": analysis_cache.stats() if analysis_cache is not None else None,
+        "background_removal": background_removal_service.stats(),
+        "similarity": similarity_stats(),
+        "jobs": job_store.stats(),
+        "threads": thread_stats()
+    }
+
+@app.get("/metrics")
+def get_metrics():
+    """Métriques au format d'exposition Prometheus (tous les workers additionnés)"""
+    return PlainTextResponse(metrics.registry.expose(), media_type=metrics.CONTENT_TYPE)
+
 @app.post("/analyze")
-async def analyze(file: UploadFile = File(...)):
+async def analyze(
+    file: UploadFile = File(...),
+    embedding_format: Optional[str] = None,
+    accept: Optional[str] = Header(None)
+):
     """
     Analyse une image de vêtement et retourne les métadonnées
+
+    Args:
+        embedding_format: Encodage de l'embedding (json, f32, f16 ou int8), aussi
+            accepté dans l'en-tête Accept (application/json; embedding=f16)
     
     Returns:
         - name: Nom descriptif généré
@@ -69,13 +219,16 @@ async def analyze(file: UploadFile = File(...)):
         - pattern: Motif détecté
         - styles: Liste de 1 à 3 styles compatibles
         - embedding: Vecteur de 128 dimensions pour recherche de similarité
+          (liste, ou {"encoding", "dims", "data"[, "scale"]} en base64)
         - brand: null (à remplir par l'utilisateur)
         - confidence: Score de confiance (0-1)
         
     Raises:
-        400: Fichier invalide ou trop volumineux
+        400: Fichier invalide ou trop volumineux, format d'embedding inconnu
         500: Erreur serveur lors de l'analyse
+        503: Service surchargé
     """
+    embedding_format = requested_embedding_format(embedding_format, accept)
     try:
         # Vérifier le type de fichier
         if not file.content_type.startswith("image/"):
@@ -84,12 +237,40 @@ async def analyze(file: UploadFile = File(...)):
                 detail="Le fichier doit être une image (JPEG, PNG, etc.)"
             )
         
-        # Lire et analyser l'image
-        image_bytes = await file.read()
-        result = analyze_image(image_bytes)
-        
-        return result
+        # Lire et analyser l'image (forward pass regroupé par le micro-batcher)
+        image_bytes = await read_upload(file)
+
+        context = ImageContext(image_bytes)  # décodé une seule fois pour toutes les étapes
+        # Upload déjà analysé : ni décodage ni inférence
+        result = await cached_analysis(image_bytes, lambda: analyze_image_batched(context))
+
+        # Réponse construite directement : pas de passage par jsonable_encoder
+        return TimedJSONResponse(with_embedding_format(result, embedding_format))
+
+    except HTTPException:
+        raise
     
+    except ExecutorSaturatedError as e:
+        # Erreur 503 : Pool d'exécution saturé
+        raise HTTPException(
+            status_code=503,
+            detail={
+                "error": "server_busy",
+                "message": e.message
+            },
+            headers={"Retry-After": "1"}
+        )
+
+    except UploadTooLargeError as e:
+        # Erreur 400 : Fichier trop volumineux
+        raise HTTPException(
+            status_code=400,
+            detail={
+                "error": "file_too_large",
+                "message": e.message
+            }
+        )
+
     except ValueError as e:
         # Erreur 400 : Image invalide
         raise HTTPException(
@@ -110,20 +291,85 @@ async def analyze(file: UploadFile = File(...)):
             }
         )
 
+@app.post("/analyze/batch")
+async def analyze_batch(
+    files: List[UploadFile] = File(...),
+    embedding_format: Optional[str] = None,
+    accept: Optional[str] = Header(None)
+):
+    """
+    Analyse un lot d'images (plusieurs fichiers ou une archive zip)
+
+    La réponse est un flux NDJSON : une ligne par image dès qu'elle est analysée
+    ({"index", "filename", "status": "ok", "result"} ou {"status": "error", "error",
+    "message"}), puis une ligne {"summary": {...}}. Une image invalide ou bloquée
+    par la modération n'interrompt pas le lot.
+
+    Args:
+        embedding_format: Encodage des embeddings (json, f32, f16 ou int8), comme /analyze
+
+    Raises:
+        400: Archive invalide, lot trop volumineux ou format d'embedding inconnu
+    """
+    embedding_format = requested_embedding_format(embedding_format, accept)
+    try:
+        items, owned_files = collect_batch_items(files)
+    except ValueError as e:
+        raise HTTPException(
+            status_code=400,
+            detail={
+                "error": "invalid_batch",
+                "message": str(e)
+            }
+        )
+
+    return StreamingResponse(
+        stream_batch_analysis(items, owned_files, embedding_format),
+        media_type="application/x-ndjson"
+    )
+
+def background_removal_headers(metadata, filename):
+    """En-têtes de la réponse de suppression d'arrière-plan (nom de fichier, encodage)"""
+    stem = os.path.splitext(filename or "image")[0]
+    extension = "webp" if metadata["output_format"] == "webp" else "png"
+    suffix = "_mask" if metadata["output_format"] == "mask" else ""
+    return {
+        "Content-Disposition": f"attachment; filename=processed_{stem}{suffix}.{extension}",
+        "X-Original-Size": f"{metadata['original_size'][0]}x{metadata['original_size'][1]}",
+        "X-Processed-Size": f"{metadata['processed_size'][0]}x{metadata['processed_size'][1]}",
+        "X-Has-Transparency": str(metadata['has_transparency']).lower(),
+        "X-Output-Format": metadata["output_format"],
+        "X-Encode-Time-Ms": f"{metadata['encode_ms']:.1f}",
+        "X-Output-Bytes": str(metadata["output_bytes"])
+    }
+
 @app.post("/remove-background")
-async def remove_background(file: UploadFile = File(...)):
+async def remove_background(
+    file: UploadFile = File(...),
+    output_format: Optional[str] = Form(None),
+    compression_level: Optional[int] = Form(None),
+    lossless: Optional[bool] = Form(None),
+    quality: Optional[int] = Form(None)
+):
     """
     Supprime l'arrière-plan d'une image de vêtement
 
     Utilise rembg (basé sur U²-Net) pour une suppression d'arrière-plan de haute qualité.
-    L'image de sortie sera au format PNG avec transparence.
+
+    Args:
+        output_format: png (RGBA), webp (RGBA) ou mask (canal alpha 8 bits seul, en PNG)
+        compression_level: Compression PNG, de 0 (rapide) à 9 (léger)
+        lossless: WebP sans perte
+        quality: Qualité WebP (0-100)
 
     Returns:
-        Image PNG avec arrière-plan supprimé
+        Image avec arrière-plan supprimé (ou masque). Les en-têtes X-Output-Format,
+        X-Encode-Time-Ms et X-Output-Bytes décrivent l'encodage
 
     Raises:
-        400: Fichier invalide ou trop volumineux
+        400: Fichier, format de sortie invalide ou trop volumineux
         500: Erreur lors du traitement
+        503: Service surchargé
     """
     try:
         # Vérifier le type de fichier
@@ -133,36 +379,54 @@ async def remove_background(file: UploadFile = File(...)):
                 detail="Le fichier doit être une image (JPEG, PNG, etc.)"
             )
 
-        # Vérifier la taille du fichier (max 10MB)
-        file_size = 0
-        content = b""
-        chunk_size = 1024 * 1024  # 1MB chunks
-
-        while True:
-            chunk = await file.read(chunk_size)
-            if not chunk:
-                break
-            content += chunk
-            file_size += len(chunk)
+        # Vérifier les options d'encodage avant tout traitement
+        try:
+            output = output_options(output_format, compression_level, lossless, quality)
+        except ValueError as e:
+            raise HTTPException(
+                status_code=400,
+                detail={
+                    "error": "invalid_output_format",
+                    "message": str(e)
+                }
+            )
 
-            if file_size > 10 * 1024 * 1024:  # 10MB limit
-                raise HTTPException(
-                    status_code=400,
-                    detail="Le fichier est trop volumineux (max 10MB)"
-                )
+        # Lire le fichier en respectant la limite de taille (UPLOAD_CONFIG)
+        content = await read_upload(file)
 
-        # Traiter l'image
-        processed_image_bytes, metadata = background_removal_service.remove_background(content)
+        # Traiter l'image dans le pool dédié (hors de la boucle d'événements)
+        processed_image_bytes, metadata = await run_in_executor(
+            "remove_background", remove_background_bytes, ImageContext(content), **output
+        )
 
         # Retourner l'image traitée
-        return StreamingResponse(
-            io.BytesIO(processed_image_bytes),
-            media_type="image/png",
-            headers={
-                "Content-Disposition": f"attachment; filename=processed_{file.filename}",
-                "X-Original-Size": f"{metadata['original_size'][0]}x{metadata['original_size'][1]}",
-                "X-Processed-Size": f"{metadata['processed_size'][0]}x{metadata['processed_size'][1]}",
-                "X-Has-Transparency": str(metadata['has_transparency']).lower()
+        return Response(
+            content=processed_image_bytes,
+            media_type=metadata["media_type"],
+            headers=background_removal_headers(metadata, file.filename)
+        )
+
+    except HTTPException:
+        raise
+
+    except ExecutorSaturatedError as e:
+        # Erreur 503 : Pool d'exécution saturé
+        raise HTTPException(
+            status_code=503,
+            detail={
+                "error": "server_busy",
+                "message": e.message
+            },
+            headers={"Retry-After": "1"}
+        )
+
+    except UploadTooLargeError as e:
+        # Erreur 400 : Fichier trop volumineux
+        raise HTTPException(
+            status_code=400,
+            detail={
+                "error": "file_too_large",
+                "message": e.message
             }
         )
 
@@ -186,6 +450,435 @@ async def remove_background(file: UploadFile = File(...)):
             }
         )
 
+@app.post("/jobs/remove-background", status_code=202)
+async def submit_remove_background_job(
+    file: UploadFile = File(...),
+    output_format: Optional[str] = Form(None),
+    compression_level: Optional[int] = Form(None),
+    lossless: Optional[bool] = Form(None),
+    quality: Optional[int] = Form(None),
+    priority: int = Form(0),
+    idempotency_key: Optional[str] = Header(None)
+):
+    """
+    Suppression d'arrière-plan asynchrone : retourne immédiatement un job
+
+    Mêmes options que /remove-background. Le job est traité en arrière-plan par
+    ordre de priorité (la plus haute d'abord) ; suivre son état avec
+    GET /jobs/{id} et récupérer l'image avec GET /jobs/{id}/result.
+    Une requête renvoyée avec le même en-tête Idempotency-Key retourne le
+    job déjà créé.
+
+    Args:
+        priority: Priorité du job (JOBS_CONFIG["min_priority"] à ["max_priority"])
+
+    Returns:
+        202: {"job_id", "status", "status_url", "result_url", ...}
+
+    Raises:
+        400: Fichier, format de sortie, priorité invalide ou fichier trop volumineux
+        503: File des jobs pleine
+    """
+    if not file.content_type.startswith("image/"):
+        raise HTTPException(
+            status_code=400,
+            detail={
+                "error": "invalid_image",
+                "message": "Le fichier doit être une image (JPEG, PNG, etc.)"
+            }
+        )
+    if not JOBS_CONFIG["min_priority"] <= priority <= JOBS_CONFIG["max_priority"]:
+        raise HTTPException(
+            status_code=400,
+            detail={
+                "error": "invalid_priority",
+                "message": f"La priorité doit être comprise entre {JOBS_CONFIG['min_priority']} "
+                           f"et {JOBS_CONFIG['max_priority']}"
+            }
+        )
+    try:
+        output = output_options(output_format, compression_level, lossless, quality)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail={"error": "invalid_output_format", "message": str(e)})
+
+    try:
+        content = await read_upload(file)
+        # Refuser tout de suite un fichier illisible plutôt qu'un job en échec
+        ImageContext(content).header
+    except UploadTooLargeError as e:
+        raise HTTPException(status_code=400, detail={"error": "file_too_large", "message": e.message})
+    except (ValueError, UnidentifiedImageError) as e:
+        raise HTTPException(status_code=400, detail={"error": "invalid_image", "message": str(e)})
+
+    try:
+        job = await run_in_threadpool(
+            job_store.submit, "remove_background", content, output,
+            priority=priority, filename=file.filename, idempotency_key=idempotency_key
+        )
+    except JobQueueFullError as e:
+        raise HTTPException(
+            status_code=503,
+            detail={"error": "server_busy", "message": e.message},
+            headers={"Retry-After": "5"}
+        )
+    job_runner.notify()
+    return JSONResponse(status_code=202, content=job_response(job), headers={"Location": f"/jobs/{job['id']}"})
+
+def job_response(job):
+    """Représentation publique d'un job"""
+    response = {
+        "job_id": job["id"],
+        "status": job["status"],
+        "priority": job["priority"],
+        "created_at": job["created_at"],
+        "started_at": job["started_at"],
+        "finished_at": job["finished_at"],
+        "expires_at": job["expires_at"],
+        "status_url": f"/jobs/{job['id']}",
+        "result_url": f"/jobs/{job['id']}/result",
+    }
+    if "queue_position" in job:
+        response["queue_position"] = job["queue_position"]
+    if job["status"] == JOB_DONE:
+        response["metadata"] = job["metadata"]
+    if job["status"] == JOB_FAILED:
+        response["error"] = job["error"]
+    return response
+
+async def get_job_or_404(job_id):
+    job = await run_in_threadpool(job_store.get, job_id)
+    if job is None:
+        raise HTTPException(
+            status_code=404,
+            detail={
+                "error": "not_found",
+                "message": f"Job inconnu ou expiré: {job_id}"
+            }
+        )
+    return job
+
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str):
+    """
+    État d'un job : queued (avec queue_position), running, done (avec les
+    métadonnées du résultat) ou failed (avec l'erreur)
+
+    Raises:
+        404: Job inconnu ou expiré
+    """
+    return job_response(await get_job_or_404(job_id))
+
+@app.get("/jobs/{job_id}/result")
+async def get_job_result(job_id: str):
+    """
+    Image produite par un job terminé (mêmes en-têtes que /remove-background)
+
+    Raises:
+        404: Job inconnu ou expiré
+        409: Job pas encore terminé (job_not_ready, avec Retry-After) ou en échec (job_failed)
+    """
+    job = await get_job_or_404(job_id)
+    if job["status"] == JOB_FAILED:
+        raise HTTPException(
+            status_code=409,
+            detail={
+                "error": "job_failed",
+                "message": job["error"]["message"],
+                "cause": job["error"]["error"]
+            }
+        )
+    if job["status"] != JOB_DONE:
+        raise HTTPException(
+            status_code=409,
+            detail={
+                "error": "job_not_ready",
+                "message": f"Job {job['status']}, réessayez plus tard"
+            },
+            headers={"Retry-After": "1"}
+        )
+    content = await run_in_threadpool(job_store.result, job_id)
+    if content is None:
+        # Expiré entre les deux lectures
+        raise HTTPException(status_code=404, detail={"error": "not_found", "message": f"Job inconnu ou expiré: {job_id}"})
+    return Response(
+        content=content,
+        media_type=job["media_type"],
+        headers=background_removal_headers(job["metadata"], job["filename"])
+    )
+
+@app.post("/process")
+async def process(
+    file: UploadFile = File(...),
+    steps: Optional[str] = Form(None),
+    response_format: Optional[str] = Form(None),
+    output_format: Optional[str] = Form(None),
+    embedding_format: Optional[str] = None,
+    accept: Optional[str] = Header(None)
+):
+    """
+    Pipeline combiné : un seul upload pour la modération, l'analyse et la
+    suppression d'arrière-plan
+
+    La modération s'exécute en premier et refuse l'image avant tout modèle ;
+    l'analyse et la suppression d'arrière-plan partagent ensuite le même
+    décodage et s'exécutent en parallèle (PIPELINE_CONFIG).
+
+    Args:
+        steps: Étapes séparées par des virgules (moderation, analysis, background_removal)
+        response_format: "json" (image en base64) ou "multipart" (multipart/mixed : JSON puis image)
+        output_format: Encodage de la suppression d'arrière-plan (png, webp ou mask)
+        embedding_format: Encodage de l'embedding de l'analyse (json, f32, f16 ou int8)
+
+    Returns:
+        - steps: Étapes exécutées
+        - moderation: Résultat de la modération
+        - analysis: Même contenu que /analyze
+        - background_removal: Image (base64 ou partie binaire) et métadonnées, dont
+          encode_ms et output_bytes
+        - timings_ms: Durée de chaque étape
+
+    Raises:
+        400: Fichier, étapes ou formats invalides
+        451: Contenu inapproprié
+        500: Erreur lors du traitement
+        503: Service surchargé
+    """
+    response_format = response_format or PIPELINE_CONFIG["response_format"]
+    try:
+        if not file.content_type.startswith("image/"):
+            raise HTTPException(
+                status_code=400,
+                detail="Le fichier doit être une image (JPEG, PNG, etc.)"
+            )
+        if response_format not in RESPONSE_FORMATS:
+            raise HTTPException(
+                status_code=400,
+                detail={
+                    "error": "invalid_pipeline",
+                    "message": f"Format de réponse inconnu: {response_format} (attendu: {', '.join(RESPONSE_FORMATS)})"
+                }
+            )
+        try:
+            steps = parse_steps(steps)
+        except ValueError as e:
+            raise HTTPException(
+                status_code=400,
+                detail={
+                    "error": "invalid_pipeline",
+                    "message": str(e)
+                }
+            )
+        try:
+            output = output_options(output_format)
+        except ValueError as e:
+            raise HTTPException(
+                status_code=400,
+                detail={
+                    "error": "invalid_output_format",
+                    "message": str(e)
+                }
+            )
+
+        embedding_format = requested_embedding_format(embedding_format, accept)
+
+        image_bytes = await read_upload(file)
+        result = await run_pipeline(ImageContext(image_bytes), steps, output=output)
+        if "analysis" in result:
+            result["analysis"] = with_embedding_format(result["analysis"], embedding_format)
+
+        if response_format == "multipart":
+            body, content_type = build_multipart_response(result)
+            return Response(content=body, media_type=content_type)
+        return TimedJSONResponse(build_json_response(result))
+
+    except HTTPException:
+        raise
+
+    except ContentModerationError as e:
+        # Erreur 451 : Contenu inapproprié (aucun modèle n'a été exécuté)
+        raise HTTPException(
+            status_code=451,
+            detail={
+                "error": "content_blocked",
+                "message": e.message,
+                "reason": e.reason,
+                "confidence": e.confidence,
+                "help": "Veuillez uploader une image de vêtement appropriée."
+            }
+        )
+
+    except ExecutorSaturatedError as e:
+        # Erreur 503 : Pool d'exécution saturé
+        raise HTTPException(
+            status_code=503,
+            detail={
+                "error": "server_busy",
+                "message": e.message
+            },
+            headers={"Retry-After": "1"}
+        )
+
+    except UploadTooLargeError as e:
+        # Erreur 400 : Fichier trop volumineux
+        raise HTTPException(
+            status_code=400,
+            detail={
+                "error": "file_too_large",
+                "message": e.message
+            }
+        )
+
+    except ValueError as e:
+        # Erreur 400 : Image invalide
+        raise HTTPException(
+            status_code=400,
+            detail={
+                "error": "invalid_image",
+                "message": str(e)
+            }
+        )
+
+    except Exception as e:
+        # Erreur 500 : Erreur serveur
+        raise HTTPException(
+            status_code=500,
+            detail={
+                "error": "processing_failed",
+                "message": f"Erreur lors du traitement: {str(e)}"
+            }
+        )
+
+class EncodedEmbedding(BaseModel):
+    """Embedding compact tel que retourné par /analyze?embedding_format=f32|f16|int8"""
+    encoding: str
+    data: str
+    dims: Optional[int] = None
+    scale: Optional[float] = None
+
+class SimilarItem(BaseModel):
+    """Vêtement à indexer (embedding retourné par /analyze, liste ou forme compacte)"""
+    id: str
+    embedding: Union[List[float], EncodedEmbedding]
+
+class SimilarItemsRequest(BaseModel):
+    items: List[SimilarItem]
+
+class SimilarQuery(BaseModel):
+    embedding: Union[List[float], EncodedEmbedding]
+    k: int = SIMILARITY_CONFIG["default_k"]
+    mode: str = "auto"  # exact, approximate ou auto
+    nprobe: Optional[int] = None
+
+class SimilarIndexRequest(BaseModel):
+    nlist: Optional[int] = None
+
+def embedding_values(embedding):
+    """
+    Liste de flottants d'un embedding reçu (liste ou forme compacte base64)
+
+    Raises:
+        ValueError: Encodage inconnu ou données invalides
+    """
+    if isinstance(embedding, EncodedEmbedding):
+        return decode_embedding(embedding.model_dump(exclude_none=True))
+    return embedding
+
+def invalid_embedding(e):
+    """Erreur 400 commune aux endpoints de similarité"""
+    return HTTPException(
+        status_code=400,
+        detail={
+            "error": "invalid_embedding",
+            "message": str(e)
+        }
+    )
+
+@app.post("/similar")
+async def search_similar(query: SimilarQuery):
+    """
+    Recherche les vêtements les plus proches d'un embedding
+
+    Returns:
+        - results: Liste de {id, score} triée par similarité cosinus décroissante
+        - mode: Mode de recherche utilisé (exact ou approximate)
+
+    Raises:
+        400: Embedding ou paramètres invalides
+        503: Service surchargé
+    """
+    if not 1 <= query.k <= SIMILARITY_CONFIG["max_k"]:
+        raise invalid_embedding(f"k doit être compris entre 1 et {SIMILARITY_CONFIG['max_k']}")
+    index = get_similarity_index()
+    try:
+        results, mode = await run_in_executor(
+            "similarity", index.search, embedding_values(query.embedding), query.k, query.mode, query.nprobe
+        )
+    except ExecutorSaturatedError as e:
+        raise HTTPException(status_code=503, detail={"error": "server_busy", "message": e.message}, headers={"Retry-After": "1"})
+    except ValueError as e:
+        raise invalid_embedding(e)
+    return {"results": results, "mode": mode, "k": query.k}
+
+@app.post("/similar/items")
+async def add_similar_items(request: SimilarItemsRequest):
+    """
+    Ajoute ou remplace des vêtements dans l'index de similarité
+
+    Raises:
+        400: Identifiant ou embedding invalide
+        503: Service surchargé
+    """
+    index = get_similarity_index()
+    ids = [item.id for item in request.items]
+    try:
+        embeddings = [embedding_values(item.embedding) for item in request.items]
+        inserted = await run_in_executor("similarity", index.add, ids, embeddings)
+    except ExecutorSaturatedError as e:
+        raise HTTPException(status_code=503, detail={"error": "server_busy", "message": e.message}, headers={"Retry-After": "1"})
+    except ValueError as e:
+        raise invalid_embedding(e)
+    return {"inserted": inserted, "index": index.stats()}
+
+@app.delete("/similar/items/{item_id}")
+async def delete_similar_item(item_id: str):
+    """
+    Retire un vêtement de l'index de similarité
+
+    Raises:
+        404: Identifiant inconnu
+    """
+    index = get_similarity_index()
+    try:
+        deleted = await run_in_executor("similarity", index.delete, item_id)
+    except ExecutorSaturatedError as e:
+        raise HTTPException(status_code=503, detail={"error": "server_busy", "message": e.message}, headers={"Retry-After": "1"})
+    if not deleted:
+        raise HTTPException(
+            status_code=404,
+            detail={
+                "error": "not_found",
+                "message": f"Vêtement inconnu dans l'index: {item_id}"
+            }
+        )
+    return {"deleted": item_id}
+
+@app.post("/similar/index")
+async def build_similar_index(request: SimilarIndexRequest = SimilarIndexRequest()):
+    """
+    (Re)construit l'index approximatif (IVF) sur les vecteurs actuels
+
+    Raises:
+        400: Index vide
+    """
+    index = get_similarity_index()
+    try:
+        result = await run_in_executor("similarity", index.build_ivf, request.nlist)
+    except ExecutorSaturatedError as e:
+        raise HTTPException(status_code=503, detail={"error": "server_busy", "message": e.message}, headers={"Retry-After": "1"})
+    except ValueError as e:
+        raise invalid_embedding(e)
+    return {**result, "index": index.stats()}
+
 # Servir les fichiers statiques après les routes API
 app.mount("/", StaticFiles(directory=".", html=True), name="static")
 
@@ -0,0 +1,409 @@
+"""
+Métriques au format d'exposition Prometheus (GET /metrics), sans dépendance
+
+Toutes les séries sont déclarées ici, avec leurs valeurs d'étiquettes : chaque
+série occupe une case fixe d'un tableau de float64. Une mesure coûte un verrou
+et une addition. En mode pré-forké, le maître partage le tableau (mmap anonyme)
+avant le fork : chaque worker écrit sa propre ligne et /metrics additionne les
+lignes, quel que soit le worker qui répond. Les compteurs d'un worker recyclé
+reprennent là où le précédent s'était arrêté.
+
+Les durées d'étape sont aussi rattachées à la requête en cours (contextvars,
+propagées aux pools d'exécution) pour l'en-tête Server-Timing de la réponse.
+"""
+import contextvars
+import mmap
+import threading
+import time
+from contextlib import contextmanager
+import numpy as np
+from config import METRICS_CONFIG
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Étapes chronométrées d'une requête
+STAGES = (
+    "upload_receive",  # réception du corps de la requête (réseau)
+    "upload_read",     # copie de l'upload reçu dans un buffer
+    "decode",          # décodage de l'image (complet ou à échelle réduite)
+    "moderation",      # statistiques de couleur de la modération (miniature déjà décodée)
+    "preprocess",      # transformation en tenseur 224x224
+    "forward",         # forward pass du classifieur (par batch)
+    "segmentation",    # masque de détourage (rembg ou fallback)
+    "encode",          # encodage de l'image de sortie (PNG, WebP, masque)
+    "serialization",   # sérialisation de la réponse JSON
+)
+
+# Codes "error" des réponses d'erreur (content_blocked : refus de la modération)
+ERROR_CODES = (
+    "invalid_image", "file_too_large", "content_blocked", "server_busy",
+    "analysis_failed", "background_removal_failed", "processing_failed",
+    "invalid_pipeline", "invalid_output_format", "invalid_batch",
+    "invalid_embedding", "invalid_embedding_format", "invalid_priority", "not_found", "job_not_ready", "job_failed", "other",
+)
+
+# Endpoints suivis individuellement (les autres chemins sont regroupés)
+ENDPOINTS = (
+    "/analyze", "/analyze/batch", "/remove-background", "/jobs/remove-background", "/process",
+    "/similar", "/similar/items", "/similar/index",
+    "/health", "/ready", "/stats", "/metrics", "other",
+)
+
+STATUS_CLASSES = ("2xx", "3xx", "4xx", "5xx")
+
+# Motifs de refus du contrôle d'admission (admission.py)
+ADMISSION_REASONS = ("queue_full", "timeout")
+
+
+class _Metric:
+    """Famille de séries : nom, aide, étiquettes et valeurs autorisées"""
+    kind = None
+
+    def __init__(self, registry, name, help_text, labels=()):
+        self.registry = registry
+        self.name = name
+        self.help = help_text
+        self.label_names = tuple(name for name, _ in labels)
+        self.label_values = tuple(tuple(values) for _, values in labels)
+        self.series = 1
+        for values in self.label_values:
+            self.series *= len(values)
+        self.offset = registry._allocate(self.series * self.width)
+        self._index = {}
+
+    width = 1
+
+    def _slot(self, labels):
+        """Case de la série (valeurs inconnues -> "other" si déclaré, sinon dernière valeur)"""
+        try:
+            return self._index[labels]
+        except KeyError:
+            pass
+        position = 0
+        for value, allowed in zip(labels, self.label_values):
+            if value not in allowed:
+                value = "other" if "other" in allowed else allowed[-1]
+            position = position * len(allowed) + allowed.index(value)
+        slot = self.offset + position * self.width
+        self._index[labels] = slot
+        return slot
+
+    def _label_sets(self):
+        """Toutes les combinaisons de valeurs, dans l'ordre des cases"""
+        combos = [()]
+        for values in self.label_values:
+            combos = [combo + (value,) for combo in combos for value in values]
+        return combos
+
+    @staticmethod
+    def _format_labels(names, values, extra=None):
+        pairs = list(zip(names, values))
+        if extra:
+            pairs.append(extra)
+        if not pairs:
+            return ""
+        return "{" + ",".join(f'{name}="{value}"' for name, value in pairs) + "}"
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, *labels, amount=1.0):
+        self.registry._add(self._slot(labels), amount)
+
+    def value(self, *labels):
+        return float(self.registry.totals()[self._slot(labels)])
+
+    def expose(self, totals):
+        lines = []
+        for position, labels in enumerate(self._label_sets()):
+            value = totals[self.offset + position]
+            if value:
+                lines.append(f"{self.name}{self._format_labels(self.label_names, labels)} {value:g}")
+        return lines
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def dec(self, *labels, amount=1.0):
+        self.registry._add(self._slot(labels), -amount)
+
+    @contextmanager
+    def track(self, *labels):
+        """Incrémente pendant la durée du bloc (requêtes en cours)"""
+        slot = self._slot(labels)
+        self.registry._add(slot, 1.0)
+        try:
+            yield
+        finally:
+            self.registry._add(slot, -1.0)
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, registry, name, help_text, labels=(), buckets=None):
+        self.buckets = tuple(buckets or METRICS_CONFIG["latency_buckets"])
+        # Par série : un compteur par bucket (+Inf compris) puis la somme
+        self.width = len(self.buckets) + 2
+        super().__init__(registry, name, help_text, labels)
+        self._bounds = np.asarray(self.buckets)
+
+    def observe(self, value, *labels):
+        slot = self._slot(labels)
+        bucket = int(np.searchsorted(self._bounds, value, side="left"))
+        self.registry._observe(slot + bucket, slot + self.width - 1, value)
+
+    @contextmanager
+    def time(self, *labels):
+        """Chronomètre le bloc (secondes)"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, *labels)
+
+    def snapshot(self, *labels):
+        """Nombre d'observations et somme (tests, /stats)"""
+        totals = self.registry.totals()
+        slot = self._slot(labels)
+        return {
+            "count": float(totals[slot:slot + self.width - 1].sum()),
+            "sum": float(totals[slot + self.width - 1]),
+        }
+
+    def expose(self, totals):
+        lines = []
+        bounds = [f"{bound:g}" for bound in self.buckets] + ["+Inf"]
+        for position, labels in enumerate(self._label_sets()):
+            slot = self.offset + position * self.width
+            counts = np.cumsum(totals[slot:slot + self.width - 1])
+            if not counts[-1]:
+                continue
+            for bound, count in zip(bounds, counts):
+                label_text = self._format_labels(self.label_names, labels, ("le", bound))
+                lines.append(f"{self.name}_bucket{label_text} {count:g}")
+            label_text = self._format_labels(self.label_names, labels)
+            lines.append(f"{self.name}_sum{label_text} {totals[slot + self.width - 1]:.6f}")
+            lines.append(f"{self.name}_count{label_text} {counts[-1]:g}")
+        return lines
+
+
+class MetricsRegistry:
+    """Séries déclarées et tableau de valeurs (une ligne par worker)"""
+
+    def __init__(self):
+        self.metrics = []
+        self.size = 0
+        self._values = None
+        self._row = 0
+        self._lock = threading.Lock()
+        self._buffer = None
+
+    def _allocate(self, width):
+        if self._values is not None:
+            raise RuntimeError("Les métriques doivent être déclarées avant la première mesure")
+        offset = self.size
+        self.size += width
+        return offset
+
+    def _register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def counter(self, name, help_text, labels=()):
+        return self._register(Counter(self, name, help_text, labels))
+
+    def gauge(self, name, help_text, labels=()):
+        return self._register(Gauge(self, name, help_text, labels))
+
+    def histogram(self, name, help_text, labels=(), buckets=None):
+        return self._register(Histogram(self, name, help_text, labels, buckets))
+
+    @property
+    def values(self):
+        if self._values is None:
+            self._values = np.zeros((1, self.size), dtype=np.float64)
+        return self._values
+
+    def _add(self, slot, amount):
+        if not METRICS_CONFIG["enabled"]:
+            return
+        values = self.values
+        with self._lock:
+            values[self._row, slot] += amount
+
+    def _observe(self, bucket_slot, sum_slot, value):
+        if not METRICS_CONFIG["enabled"]:
+            return
+        values = self.values
+        with self._lock:
+            row = values[self._row]
+            row[bucket_slot] += 1.0
+            row[sum_slot] += value
+
+    def share(self, workers):
+        """
+        Place les valeurs dans une mémoire partagée avec une ligne par worker
+        (à appeler dans le maître, avant le fork)
+        """
+        self._buffer = mmap.mmap(-1, max(1, workers) * self.size * 8)
+        self._values = np.frombuffer(self._buffer, dtype=np.float64).reshape(max(1, workers), self.size)
+        self._row = 0
+
+    def bind_worker(self, row):
+        """
+        Le worker forké écrit dans sa ligne ; les jauges du worker qu'il
+        remplace sont remises à zéro (requêtes en cours interrompues)
+        """
+        self._row = row
+        # Verrou neuf : celui du maître a pu être copié verrouillé
+        self._lock = threading.Lock()
+        for metric in self.metrics:
+            if metric.kind == "gauge":
+                self.values[row, metric.offset:metric.offset + metric.series] = 0.0
+
+    def totals(self):
+        """Valeurs additionnées sur tous les workers"""
+        return self.values.sum(axis=0)
+
+    def expose(self):
+        """Texte au format d'exposition Prometheus 0.0.4"""
+        totals = self.totals()
+        lines = []
+        for metric in self.metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.expose(totals))
+        return "\n".join(lines) + "\n"
+
+
+# Registre global et séries du service
+registry = MetricsRegistry()
+
+requests_total = registry.counter(
+    "ai_service_requests_total", "Requêtes HTTP terminées",
+    labels=[("endpoint", ENDPOINTS), ("status", STATUS_CLASSES)]
+)
+request_duration = registry.histogram(
+    "ai_service_request_duration_seconds", "Durée des requêtes HTTP",
+    labels=[("endpoint", ENDPOINTS)]
+)
+requests_in_flight = registry.gauge(
+    "ai_service_requests_in_flight", "Requêtes HTTP en cours",
+    labels=[("endpoint", ENDPOINTS)]
+)
+errors_total = registry.counter(
+    "ai_service_errors_total", "Réponses d'erreur par code (champ error)",
+    labels=[("error", ERROR_CODES)]
+)
+stage_duration = registry.histogram(
+    "ai_service_stage_duration_seconds", "Durée de chaque étape du traitement",
+    labels=[("stage", STAGES)]
+)
+admission_wait = registry.histogram(
+    "ai_service_admission_wait_seconds", "Attente dans la file d'admission avant traitement",
+    labels=[("endpoint", ENDPOINTS)]
+)
+admission_queue_depth = registry.gauge(
+    "ai_service_admission_queue_depth", "Requêtes en attente dans la file d'admission",
+    labels=[("endpoint", ENDPOINTS)]
+)
+admission_rejected = registry.counter(
+    "ai_service_admission_rejected_total", "Requêtes refusées par le contrôle d'admission (503)",
+    labels=[("endpoint", ENDPOINTS), ("reason", ADMISSION_REASONS)]
+)
+
+
+# Durées des étapes de la requête en cours (None hors requête)
+_request_timings = contextvars.ContextVar("request_timings", default=None)
+
+
+def _record_timing(name, seconds):
+    timings = _request_timings.get()
+    if timings is not None:
+        timings.append((name, seconds))
+
+
+def observe_stage(name, seconds):
+    """Enregistre la durée d'une étape (histogramme et Server-Timing)"""
+    stage_duration.observe(seconds, name)
+    _record_timing(name, seconds)
+
+
+@contextmanager
+def stage(name):
+    """Chronomètre une étape : with stage("decode"): ..."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe_stage(name, time.perf_counter() - start)
+
+
+@contextmanager
+def timed(name):
+    """Chronomètre un bloc pour Server-Timing uniquement (pas d'histogramme)"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        _record_timing(name, time.perf_counter() - start)
+
+
+def server_timing_header(timings, total):
+    """Valeur de l'en-tête Server-Timing : durées cumulées par étape, puis total"""
+    durations = {}
+    for name, seconds in timings:
+        durations[name] = durations.get(name, 0.0) + seconds
+    entries = [f"{name};dur={seconds * 1000.0:.1f}" for name, seconds in durations.items()]
+    entries.append(f"total;dur={total * 1000.0:.1f}")
+    return ", ".join(entries)
+
+
+def record_error(code):
+    """Compte une réponse d'erreur (HTTP ou ligne d'un lot NDJSON)"""
+    errors_total.inc(code)
+
+
+def endpoint_label(path):
+    return path if path in ENDPOINTS else "other"
+
+
+class MetricsMiddleware:
+    """
+    Middleware ASGI : nombre de requêtes par endpoint et classe de statut,
+    requêtes en cours et durée totale, en-tête Server-Timing
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        endpoint = endpoint_label(scope.get("path", ""))
+        status = [500]
+        timings = []
+        start = time.perf_counter()
+
+        async def record_status(message):
+            if message["type"] == "http.response.start":
+                status[0] = message["status"]
+                if METRICS_CONFIG["server_timing"]:
+                    value = server_timing_header(timings, time.perf_counter() - start)
+                    headers = list(message.get("headers", []))
+                    headers.append((b"server-timing", value.encode("latin-1")))
+                    message = {**message, "headers": headers}
+            await send(message)
+
+        token = _request_timings.set(timings)
+        try:
+            with requests_in_flight.track(endpoint):
+                await self.app(scope, receive, record_status)
+        finally:
+            _request_timings.reset(token)
+            request_duration.observe(time.perf_counter() - start, endpoint)
+            requests_total.inc(endpoint, f"{min(max(status[0] // 100, 2), 5)}xx")
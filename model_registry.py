@@ -0,0 +1,172 @@
+"""
+Registre des modèles chargés paresseusement
+Chaque modèle est chargé une seule fois (au premier usage ou par la tâche de
+démarrage), puis préchauffé. L'état de chargement, la durée de chargement et la
+latence du dernier préchauffage alimentent /health et /ready.
+"""
+import asyncio
+import threading
+import time
+from collections import OrderedDict
+from executors import get_executor, run_in_executor
+
+# États d'un modèle
+NOT_LOADED = "not_loaded"
+LOADING = "loading"
+LOADED = "loaded"  # Poids chargés, pas encore préchauffés
+READY = "ready"
+FAILED = "failed"
+
+
+class ModelEntry:
+    """Un modèle enregistré et son état de chargement"""
+
+    def __init__(self, name, loader, warmup=None, model_name=None, executor=None, preload=True):
+        self.name = name
+        self.loader = loader
+        self.warmup = warmup
+        self.model_name = model_name or name
+        self.executor = executor  # Pool d'exécution utilisé pour le préchargement
+        self.preload = preload  # Chargé au démarrage et requis par /ready
+
+        self.lock = threading.Lock()
+        self.model = None
+        self.state = NOT_LOADED
+        self.error = None
+        self.load_time = None
+        self.warmup_time = None
+        self.loaded_at = None
+
+    def status(self):
+        return {
+            "model": self.model_name,
+            "state": self.state,
+            "preload": self.preload,
+            "load_ms": self.load_time * 1000.0 if self.load_time is not None else None,
+            "last_warmup_ms": self.warmup_time * 1000.0 if self.warmup_time is not None else None,
+            "loaded_at": self.loaded_at,
+            "error": self.error,
+        }
+
+
+class ModelRegistry:
+    """Modèles du service, chargés à la demande et préchauffés"""
+
+    def __init__(self):
+        self._entries = OrderedDict()
+
+    def register(self, name, loader, warmup=None, model_name=None, executor=None, preload=True):
+        """
+        Enregistre un modèle sans le charger
+
+        Args:
+            name: Identifiant du modèle dans le registre
+            loader: Fonction sans argument qui construit le modèle
+            warmup: Fonction appelée avec le modèle chargé (inférences de préchauffage)
+            model_name: Nom affiché dans /health et /ready
+            executor: Pool d'exécution pour le préchargement au démarrage
+            preload: Charger au démarrage ; /ready attend ce modèle
+        """
+        self._entries[name] = ModelEntry(name, loader, warmup, model_name, executor, preload)
+
+    def entries(self):
+        return list(self._entries.values())
+
+    def get(self, name):
+        """
+        Retourne le modèle, en le chargeant au premier appel
+        Les appels concurrents attendent le même chargement.
+
+        Raises:
+            KeyError: Si le modèle n'est pas enregistré
+            RuntimeError: Si le chargement échoue
+        """
+        entry = self._entries[name]
+        if entry.state == READY:
+            return entry.model
+        self.load(name)
+        return entry.model
+
+    def load(self, name, warmup=True):
+        """
+        Charge puis préchauffe un modèle (sans effet s'il est déjà prêt)
+
+        Args:
+            name: Identifiant du modèle
+            warmup: False pour charger uniquement les poids (processus maître
+                    pré-forké) ; le préchauffage a lieu au prochain load()
+        """
+        entry = self._entries[name]
+        with entry.lock:
+            if entry.state == READY or (entry.state == LOADED and not warmup):
+                return entry.model
+
+            entry.state = LOADING
+            entry.error = None
+            try:
+                if entry.model is None:
+                    start = time.perf_counter()
+                    entry.model = entry.loader()
+                    entry.load_time = time.perf_counter() - start
+                    entry.loaded_at = time.time()
+                    print(f"✅ Modèle {name} chargé ({entry.load_time * 1000.0:.0f} ms)")
+
+                if warmup and entry.warmup is not None:
+                    start = time.perf_counter()
+                    entry.warmup(entry.model)
+                    entry.warmup_time = time.perf_counter() - start
+            except Exception as e:
+                # Nouvel essai au prochain appel
+                entry.state = FAILED
+                entry.error = str(e)
+                print(f"❌ Échec du chargement du modèle {name}: {e}")
+                raise RuntimeError(f"Modèle {name} indisponible: {e}") from e
+
+            entry.state = READY if warmup else LOADED
+            return entry.model
+
+    def warmup(self, name):
+        """Relance le préchauffage d'un modèle déjà chargé"""
+        entry = self._entries[name]
+        model = self.get(name)
+        if entry.warmup is not None:
+            start = time.perf_counter()
+            entry.warmup(model)
+            entry.warmup_time = time.perf_counter() - start
+        return entry.warmup_time
+
+    def is_ready(self):
+        """Vrai quand tous les modèles préchargés sont prêts"""
+        return all(entry.state == READY for entry in self._entries.values() if entry.preload)
+
+    def status(self):
+        """État de chaque modèle"""
+        return {name: entry.status() for name, entry in self._entries.items()}
+
+
+# Registre global du service
+model_registry = ModelRegistry()
+
+
+async def preload_models(registry=None):
+    """
+    Charge et préchauffe les modèles préchargés, chacun dans son pool
+    d'exécution (tâche de fond lancée au démarrage du serveur)
+    """
+    registry = registry or model_registry
+
+    def load(name):
+        registry.load(name)  # le modèle reste dans le registre, rien n'est retourné
+
+    calls = []
+    for entry in registry.entries():
+        if not entry.preload:
+            continue
+        if entry.executor is None or get_executor(entry.executor).kind == "process":
+            # Les processus enfants chargent leur propre copie au premier appel
+            calls.append(asyncio.to_thread(load, entry.name))
+        else:
+            calls.append(run_in_executor(entry.executor, load, entry.name))
+
+    # Les échecs sont déjà enregistrés dans l'état du modèle (visible dans /ready)
+    return await asyncio.gather(*calls, return_exceptions=True)
@@ -0,0 +1,171 @@
+"""
+Pipeline combiné de /process : un seul upload, un seul décodage
+La modération passe en premier sur la miniature et refuse l'image avant tout
+modèle coûteux ; l'analyse et la suppression d'arrière-plan partagent ensuite
+le même ImageContext et peuvent s'exécuter en parallèle dans leurs pools
+"""
+import asyncio
+import base64
+import json
+import time
+import uuid
+from background_removal import check_input_format, remove_background
+from config import PIPELINE_CONFIG
+from content_moderation import validate_image_for_clothing
+from executors import run_in_executor
+from image_context import ImageContext
+from result_cache import cached_analysis
+from utils import analyze_image_batched
+
+STEPS = ("moderation", "analysis", "background_removal")
+RESPONSE_FORMATS = ("json", "multipart")
+
+
+def parse_steps(value=None):
+    """
+    Étapes demandées, dans l'ordre d'exécution du pipeline
+
+    Args:
+        value: Liste ou chaîne séparée par des virgules (défaut: PIPELINE_CONFIG)
+
+    Raises:
+        ValueError: Si une étape est inconnue ou si aucune étape n'est demandée
+    """
+    if value is None or value == "":
+        value = PIPELINE_CONFIG["default_steps"]
+    if isinstance(value, str):
+        value = value.split(",")
+    requested = {step.strip() for step in value if step.strip()}
+
+    unknown = requested - set(STEPS)
+    if unknown:
+        raise ValueError(f"Étape(s) inconnue(s): {', '.join(sorted(unknown))} (attendu: {', '.join(STEPS)})")
+    if not requested:
+        raise ValueError("Aucune étape demandée")
+    if PIPELINE_CONFIG["require_moderation"]:
+        requested.add("moderation")
+    return [step for step in STEPS if step in requested]
+
+
+async def _timed(timings, name, coro):
+    start = time.perf_counter()
+    try:
+        return await coro
+    finally:
+        timings[name] = (time.perf_counter() - start) * 1000.0
+
+
+async def _analyze(context):
+    """Analyse avec le cache de résultats de /analyze"""
+    return await cached_analysis(context.image_bytes, lambda: analyze_image_batched(context))
+
+
+async def _gather(coros):
+    """Comme asyncio.gather, mais annule les autres étapes dès qu'une échoue"""
+    tasks = [asyncio.ensure_future(coro) for coro in coros]
+    try:
+        return await asyncio.gather(*tasks)
+    except BaseException:
+        for task in tasks:
+            task.cancel()
+        raise
+
+
+async def run_pipeline(image_data, steps=None, parallel=None, output=None):
+    """
+    Exécute les étapes demandées sur une image
+
+    Args:
+        image_data: Bytes de l'image ou ImageContext partagé
+        steps: Étapes (voir parse_steps)
+        parallel: Analyse et suppression d'arrière-plan en parallèle (défaut: PIPELINE_CONFIG)
+        output: Options d'encodage de la suppression d'arrière-plan (voir output_options)
+
+    Returns:
+        dict: steps, moderation, analysis, background_removal (bytes, metadata), timings_ms
+
+    Raises:
+        ContentModerationError: Si la modération refuse l'image (aucun modèle n'est exécuté)
+        ValueError: Si l'image ou les étapes sont invalides
+        ExecutorSaturatedError: Si un pool est saturé
+    """
+    steps = parse_steps(steps)
+    parallel = PIPELINE_CONFIG["parallel"] if parallel is None else parallel
+    context = ImageContext.from_input(image_data)
+    if "background_removal" in steps:
+        # Format non pris en charge : refus avant la modération et l'analyse
+        check_input_format(context)
+    timings = {}
+    result = {"steps": steps, "timings_ms": timings}
+
+    if "moderation" in steps:
+        result["moderation"] = await _timed(
+            timings, "moderation", run_in_executor("analyze", validate_image_for_clothing, context)
+        )
+
+    stages = {}
+    if "analysis" in steps:
+        stages["analysis"] = lambda: _timed(timings, "analysis", _analyze(context))
+    if "background_removal" in steps:
+        stages["background_removal"] = lambda: _timed(
+            timings, "background_removal", run_in_executor("remove_background", remove_background, context, **(output or {}))
+        )
+
+    if parallel and len(stages) > 1:
+        outputs = await _gather([stage() for stage in stages.values()])
+        result.update(zip(stages, outputs))
+    else:
+        for name, stage in stages.items():
+            result[name] = await stage()
+    return result
+
+
+def _json_metadata(metadata):
+    """Métadonnées de suppression d'arrière-plan sérialisables (tuples -> listes)"""
+    return {key: list(value) if isinstance(value, tuple) else value for key, value in metadata.items()}
+
+
+def build_json_response(result):
+    """Corps JSON : l'image détourée (ou le masque) est encodée en base64"""
+    body = {key: result[key] for key in ("steps", "moderation", "analysis") if key in result}
+    if "background_removal" in result:
+        image_bytes, metadata = result["background_removal"]
+        body["background_removal"] = {
+            "media_type": metadata["media_type"],
+            "image_base64": base64.b64encode(image_bytes).decode("ascii"),
+            "metadata": _json_metadata(metadata),
+        }
+    body["timings_ms"] = result["timings_ms"]
+    return body
+
+
+def build_multipart_response(result):
+    """
+    Corps multipart/mixed : une partie JSON (résultats), puis l'image
+    détourée (ou le masque) en binaire (pas de surcoût base64)
+
+    Returns:
+        tuple: (corps en bytes, type de contenu avec boundary)
+    """
+    boundary = uuid.uuid4().hex
+    body = {key: result[key] for key in ("steps", "moderation", "analysis") if key in result}
+    parts = []
+    if "background_removal" in result:
+        image_bytes, metadata = result["background_removal"]
+        body["background_removal"] = {"media_type": metadata["media_type"], "metadata": _json_metadata(metadata)}
+        parts.append(("image", metadata["media_type"], image_bytes))
+    body["timings_ms"] = result["timings_ms"]
+    parts.insert(0, ("result", "application/json", json.dumps(body, ensure_ascii=False).encode("utf-8")))
+
+    chunks = []
+    for name, content_type, content in parts:
+        chunks.append(
+            f"--{boundary}\r\n"
+            f"Content-Type: {content_type}\r\n"
+            f"Content-Disposition: inline; name=\"{name}\"\r\n"
+            f"Content-Length: {len(content)}\r\n\r\n".encode("ascii")
+        )
+        chunks.append(content)
+        chunks.append(b"\r\n")
+    chunks.append(f"--{boundary}--\r\n".encode("ascii"))
+    return b"".join(chunks), f"multipart/mixed; boundary={boundary}"
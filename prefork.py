@@ -0,0 +1,297 @@
+#!/usr/bin/env python3
+"""
+Serveur de production multi-workers pré-forké
+
+Le processus maître charge les poids des modèles une seule fois, gèle le tas
+Python (gc.freeze) puis forke N workers uvicorn qui partagent le socket d'écoute
+et les pages des poids en copie-sur-écriture. Chaque worker préchauffe ses
+modèles après le fork (pools de threads torch/onnxruntime non partageables)
+avec sa part des cœurs (THREADING_CONFIG, cpu_threads.py).
+
+Le maître supervise les workers :
+  - battement de cœur par worker (boucle d'événements bloquée -> worker remplacé)
+  - recyclage après max_requests requêtes (avec aléa) et remplacement des workers morts
+  - SIGHUP : recyclage progressif de tous les workers
+  - SIGTERM / SIGINT : arrêt gracieux (requêtes en cours terminées)
+
+Usage :
+    python prefork.py [--workers 4] [--host 0.0.0.0] [--port 8000]
+"""
+import argparse
+import asyncio
+import gc
+import mmap
+import os
+import random
+import signal
+import socket
+import struct
+import time
+import traceback
+from config import PREFORK_CONFIG
+from cpu_threads import available_cpus, apply_thread_budget, thread_budget
+import metrics
+
+_HEARTBEAT = struct.Struct("d")
+
+
+class WorkerProcess:
+    """Un worker forké et son emplacement de battement de cœur"""
+
+    def __init__(self, slot, pid):
+        self.slot = slot
+        self.pid = pid
+        self.started_at = time.monotonic()
+        self.terminating = False
+
+
+class PreforkServer:
+    """Processus maître : charge les modèles, forke et supervise les workers"""
+
+    def __init__(self, workers=None, host=None, port=None, max_requests=None,
+                 max_requests_jitter=None, heartbeat_interval=None, heartbeat_timeout=None,
+                 graceful_timeout=None, log_level="info", access_log=True):
+        config = PREFORK_CONFIG
+        self.workers = max(1, int(workers or config["workers"] or available_cpus()))
+        self.host = host or config["host"]
+        self.port = int(port or config["port"])
+        self.max_requests = int(max_requests if max_requests is not None else config["max_requests"])
+        self.max_requests_jitter = int(
+            max_requests_jitter if max_requests_jitter is not None else config["max_requests_jitter"]
+        )
+        self.heartbeat_interval = float(heartbeat_interval or config["heartbeat_interval"])
+        self.heartbeat_timeout = float(heartbeat_timeout or config["heartbeat_timeout"])
+        self.graceful_timeout = float(graceful_timeout or config["graceful_timeout"])
+        self.log_level = log_level
+        self.access_log = access_log
+
+        self.app = None
+        self.socket = None
+        self._children = {}  # pid -> WorkerProcess
+        self._heartbeats = None
+        self._stopping = False
+        self._recycle_pending = []
+
+    # --- Processus maître -------------------------------------------------
+
+    def load_models(self):
+        """Charge les poids dans le maître (le préchauffage se fait dans chaque worker)"""
+        import torch
+
+        # Pas de pool de threads torch dans le maître : il ne survivrait pas au fork
+        torch.set_num_threads(1)
+
+        from main import app
+        from model_registry import model_registry
+
+        self.app = app
+        for entry in model_registry.entries():
+            if entry.preload:
+                model_registry.load(entry.name, warmup=False)
+
+        # Objets du maître hors du ramasse-miettes : les workers ne réécrivent
+        # pas leurs en-têtes GC, les pages restent partagées
+        gc.collect()
+        gc.freeze()
+
+    def bind(self):
+        sock = socket.socket(socket.AF_INET6 if ":" in self.host else socket.AF_INET, socket.SOCK_STREAM)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        sock.bind((self.host, self.port))
+        sock.listen(2048)
+        sock.set_inheritable(True)
+        self.socket = sock
+        self.port = sock.getsockname()[1]
+        return sock
+
+    def run(self):
+        """Démarre le maître et bloque jusqu'à l'arrêt"""
+        if not hasattr(os, "fork"):
+            raise RuntimeError("Le mode pré-forké nécessite os.fork (Linux/macOS)")
+
+        print(f"🚀 Maître {os.getpid()} : chargement des modèles...")
+        start = time.perf_counter()
+        self.load_models()
+        print(f"✅ Modèles chargés en {time.perf_counter() - start:.1f}s")
+
+        self.bind()
+        self._heartbeats = mmap.mmap(-1, _HEARTBEAT.size * self.workers)
+        # Une ligne de métriques par worker, additionnées par /metrics
+        metrics.registry.share(self.workers)
+
+        signal.signal(signal.SIGTERM, self._handle_stop)
+        signal.signal(signal.SIGINT, self._handle_stop)
+        signal.signal(signal.SIGHUP, self._handle_reload)
+
+        budget = thread_budget(self.workers)
+        print(f"📍 Écoute sur http://{self.host}:{self.port} avec {self.workers} workers "
+              f"({budget['torch_intra_op_threads']} thread(s) torch chacun)")
+        for slot in range(self.workers):
+            self._spawn(slot)
+
+        try:
+            while not self._stopping:
+                self._reap()
+                self._check_heartbeats()
+                self._recycle_next()
+                time.sleep(min(1.0, self.heartbeat_interval))
+        finally:
+            self._stop_workers()
+            self.socket.close()
+            print("👋 Serveur arrêté")
+
+    def _handle_stop(self, signum, frame):
+        self._stopping = True
+
+    def _handle_reload(self, signum, frame):
+        print("🔄 Recyclage progressif des workers")
+        self._recycle_pending = list(self._children)
+
+    def _spawn(self, slot):
+        _HEARTBEAT.pack_into(self._heartbeats, slot * _HEARTBEAT.size, 0.0)
+        pid = os.fork()
+        if pid == 0:
+            code = 1
+            try:
+                self._run_worker(slot)
+                code = 0
+            except BaseException:
+                traceback.print_exc()
+            finally:
+                os._exit(code)
+        self._children[pid] = WorkerProcess(slot, pid)
+        print(f"👷 Worker {slot} démarré (pid {pid})")
+
+    def _reap(self):
+        """Récupère les workers terminés et les remplace"""
+        while True:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                return
+            if pid == 0:
+                return
+            worker = self._children.pop(pid, None)
+            if worker is None:
+                continue
+            code = os.waitstatus_to_exitcode(status)
+            if not self._stopping:
+                if code != 0 and time.monotonic() - worker.started_at < 1.0:
+                    # Échec au démarrage : éviter une boucle de fork trop rapide
+                    time.sleep(1.0)
+                print(f"♻️ Worker {worker.slot} (pid {pid}) terminé (code {code}), remplacement")
+                self._spawn(worker.slot)
+
+    def _last_heartbeat(self, worker):
+        beat = _HEARTBEAT.unpack_from(self._heartbeats, worker.slot * _HEARTBEAT.size)[0]
+        return max(beat, worker.started_at)
+
+    def _check_heartbeats(self):
+        """Tue un worker dont la boucle d'événements ne répond plus"""
+        now = time.monotonic()
+        for worker in list(self._children.values()):
+            if now - self._last_heartbeat(worker) > self.heartbeat_timeout:
+                print(f"⚠️ Worker {worker.slot} (pid {worker.pid}) sans battement de cœur, arrêt forcé")
+                self._kill(worker.pid, signal.SIGKILL)
+
+    def _recycle_next(self):
+        """Recycle un worker à la fois, quand tous les autres répondent"""
+        if not self._recycle_pending:
+            return
+        if len(self._children) < self.workers or any(w.terminating for w in self._children.values()):
+            return
+        if any(self._last_heartbeat(w) <= w.started_at for w in self._children.values()):
+            return  # un remplaçant n'a pas encore démarré
+        pid = self._recycle_pending.pop(0)
+        worker = self._children.get(pid)
+        if worker is not None:
+            worker.terminating = True
+            self._kill(pid, signal.SIGTERM)
+
+    def _kill(self, pid, sig):
+        try:
+            os.kill(pid, sig)
+        except ProcessLookupError:
+            pass
+
+    def _stop_workers(self):
+        """Arrêt gracieux, puis forcé après graceful_timeout"""
+        for pid in self._children:
+            self._kill(pid, signal.SIGTERM)
+        deadline = time.monotonic() + self.graceful_timeout
+        while self._children and time.monotonic() < deadline:
+            self._reap()
+            time.sleep(0.1)
+        for pid in list(self._children):
+            self._kill(pid, signal.SIGKILL)
+            try:
+                os.waitpid(pid, 0)
+            except ChildProcessError:
+                pass
+        self._children.clear()
+
+    # --- Worker -----------------------------------------------------------
+
+    def _run_worker(self, slot):
+        """Point d'entrée d'un worker forké : sert l'application jusqu'au recyclage"""
+        import uvicorn
+        from result_cache import analysis_cache
+
+        for sig in (signal.SIGTERM, signal.SIGINT, signal.SIGHUP):
+            signal.signal(sig, signal.SIG_DFL)
+
+        # Exposé par /health pour identifier le worker qui répond
+        self.app.state.worker = {"id": slot, "pid": os.getpid(), "started_at": time.time()}
+        apply_thread_budget(self.workers)
+        metrics.registry.bind_worker(slot)
+        if analysis_cache is not None:
+            analysis_cache.after_fork()
+
+        heartbeats = self._heartbeats
+        offset = slot * _HEARTBEAT.size
+        interval = self.heartbeat_interval
+
+        async def heartbeat():
+            while True:
+                _HEARTBEAT.pack_into(heartbeats, offset, time.monotonic())
+                await asyncio.sleep(interval)
+
+        async def start_heartbeat():
+            self.app.state.heartbeat = asyncio.create_task(heartbeat())
+
+        self.app.add_event_handler("startup", start_heartbeat)
+
+        limit = None
+        if self.max_requests > 0:
+            limit = self.max_requests + random.randint(0, max(0, self.max_requests_jitter))
+
+        config = uvicorn.Config(
+            self.app,
+            log_level=self.log_level,
+            access_log=self.access_log,
+            limit_max_requests=limit,
+            timeout_graceful_shutdown=self.graceful_timeout,
+        )
+        uvicorn.Server(config).run(sockets=[self.socket])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, default=None, help="Nombre de workers (défaut: cœurs)")
+    parser.add_argument("--host", default=None)
+    parser.add_argument("--port", type=int, default=None)
+    parser.add_argument("--max-requests", type=int, default=None, help="Recyclage après N requêtes (0 = jamais)")
+    parser.add_argument("--log-level", default="info")
+    args = parser.parse_args()
+
+    PreforkServer(
+        workers=args.workers,
+        host=args.host,
+        port=args.port,
+        max_requests=args.max_requests,
+        log_level=args.log_level,
+    ).run()
+
+
+if __name__ == "__main__":
+    main()
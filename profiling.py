@@ -0,0 +1,275 @@
+"""
+Profilage à la demande des requêtes lentes (PROFILING_CONFIG)
+
+Une requête est profilée si elle porte l'en-tête X-Profile avec le jeton
+configuré (PROFILE_TOKEN), ou au hasard selon PROFILE_SAMPLE_RATE. Un thread
+échantillonne alors les piles Python de tous les threads du worker (boucle
+d'événements, pools d'exécution, micro-batcher) toutes les interval_ms, et le
+profil est écrit dans output_dir au format speedscope (https://speedscope.app)
+ou en piles repliées (flamegraph.pl). La réponse indique le fichier dans
+l'en-tête X-Profile-Id.
+
+Le nombre de profils est limité par minute et par worker, et un seul profil
+s'exécute à la fois : les threads échantillonnés peuvent aussi travailler pour
+d'autres requêtes concurrentes.
+"""
+import collections
+import json
+import os
+import random
+import sys
+import threading
+import time
+from starlette.concurrency import run_in_threadpool
+from config import PROFILING_CONFIG
+
+FORMATS = ("speedscope", "collapsed")
+
+# Feuilles de pile d'un thread en attente (non échantillonné)
+IDLE_FRAMES = {
+    ("threading.py", "wait"),
+    ("selectors.py", "select"),
+    ("thread.py", "_worker"),
+}
+
+
+class SamplingProfiler:
+    """Échantillonneur des piles de tous les threads du processus"""
+
+    def __init__(self, interval=0.005, max_duration=30.0):
+        """
+        Args:
+            interval: Intervalle entre deux échantillons (secondes)
+            max_duration: Arrêt automatique après cette durée (secondes)
+        """
+        self.interval = interval
+        self.max_duration = max_duration
+        self.frames = {}  # (fonction, fichier, ligne) -> index
+        self.samples = {}  # ident du thread -> [(pile, poids en ms)]
+        self.thread_names = {}
+        self.duration = 0.0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._started = time.perf_counter()
+        self._thread = threading.Thread(target=self._run, name="profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        self.duration = time.perf_counter() - self._started
+
+    def _name_thread(self, ident):
+        for thread in threading.enumerate():
+            if thread.ident == ident:
+                self.thread_names[ident] = thread.name
+
+    def _run(self):
+        own = threading.get_ident()
+        last = self._started
+        deadline = last + self.max_duration
+        while not self._stop.wait(self.interval):
+            now = time.perf_counter()
+            weight = (now - last) * 1000.0
+            last = now
+            for ident, frame in sys._current_frames().items():
+                if ident == own:
+                    continue
+                stack = self._stack(frame)
+                if stack is None:
+                    continue
+                if ident not in self.samples:
+                    self.samples[ident] = []
+                    self._name_thread(ident)
+                self.samples[ident].append((stack, weight))
+            if now >= deadline:
+                break
+
+    def _stack(self, frame):
+        """Indices des frames de la racine vers la feuille (None si le thread attend)"""
+        code = frame.f_code
+        if (os.path.basename(code.co_filename), code.co_name) in IDLE_FRAMES:
+            return None
+        stack = []
+        while frame is not None:
+            code = frame.f_code
+            key = (code.co_name, code.co_filename, code.co_firstlineno)
+            index = self.frames.get(key)
+            if index is None:
+                index = self.frames[key] = len(self.frames)
+            stack.append(index)
+            frame = frame.f_back
+        stack.reverse()
+        return stack
+
+    def _threads(self):
+        """Threads échantillonnés, le plus actif en premier"""
+        return sorted(self.samples.items(), key=lambda item: -len(item[1]))
+
+    def to_speedscope(self, name):
+        """Profil au format de fichier speedscope (un profil "sampled" par thread)"""
+        frames = [{"name": function, "file": filename, "line": line}
+                  for function, filename, line in self.frames]
+        profiles = []
+        for ident, samples in self._threads():
+            weights = [weight for _, weight in samples]
+            profiles.append({
+                "type": "sampled",
+                "name": self.thread_names.get(ident, f"thread-{ident}"),
+                "unit": "milliseconds",
+                "startValue": 0,
+                "endValue": sum(weights),
+                "samples": [stack for stack, _ in samples],
+                "weights": weights,
+            })
+        return {
+            "$schema": "https://www.speedscope.app/file-format-schema.json",
+            "name": name,
+            "exporter": "ai-service profiling.py",
+            "activeProfileIndex": 0,
+            "shared": {"frames": frames},
+            "profiles": profiles,
+        }
+
+    def to_collapsed(self):
+        """Piles repliées "thread;f1;f2 poids" (flamegraph.pl, speedscope)"""
+        names = [f"{function} ({os.path.basename(filename)}:{line})"
+                 for function, filename, line in self.frames]
+        counts = collections.Counter()
+        for ident, samples in self._threads():
+            thread = self.thread_names.get(ident, f"thread-{ident}")
+            for stack, weight in samples:
+                counts[";".join([thread] + [names[index] for index in stack])] += weight
+        return "".join(f"{stack} {round(weight)}\n" for stack, weight in counts.items())
+
+
+class ProfileGate:
+    """Décide quelles requêtes profiler (en-tête ou tirage) et limite le débit"""
+
+    def __init__(self, config=None):
+        self.config = config or PROFILING_CONFIG
+        self._lock = threading.Lock()
+        self._recent = collections.deque()
+        self._active = False
+
+    def wanted(self, headers):
+        header = self.config["header"].lower().encode("latin-1")
+        token = self.config["token"]
+        if token:
+            for name, value in headers:
+                if name == header and value.decode("latin-1") == token:
+                    return True
+        rate = self.config["sample_rate"]
+        return rate > 0 and random.random() < rate
+
+    def acquire(self):
+        """Réserve le profileur (False si un profil est en cours ou le quota atteint)"""
+        now = time.monotonic()
+        with self._lock:
+            if self._active:
+                return False
+            while self._recent and now - self._recent[0] > 60.0:
+                self._recent.popleft()
+            if len(self._recent) >= self.config["max_per_minute"]:
+                return False
+            self._recent.append(now)
+            self._active = True
+            return True
+
+    def release(self):
+        with self._lock:
+            self._active = False
+
+
+def check_format(output_format):
+    """
+    Vérifie le format des profils (PROFILING_CONFIG["format"])
+
+    Raises:
+        ValueError: Format de profil inconnu
+    """
+    if output_format not in FORMATS:
+        raise ValueError(f"Format de profil inconnu: {output_format} (attendu: {', '.join(FORMATS)})")
+
+
+def profile_filename(method, path, output_format):
+    slug = path.strip("/").replace("/", "-") or "root"
+    suffix = "speedscope.json" if output_format == "speedscope" else "collapsed.txt"
+    timestamp = time.strftime("%Y%m%d-%H%M%S")
+    return f"{timestamp}-{method.lower()}-{slug}-{os.getpid()}-{random.randrange(16 ** 6):06x}.{suffix}"
+
+
+def write_profile(profiler, directory, filename, title, output_format, max_files):
+    """Écrit le profil puis supprime les plus anciens au-delà de max_files"""
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, filename)
+    with open(path, "w") as f:
+        if output_format == "speedscope":
+            json.dump(profiler.to_speedscope(title), f)
+        else:
+            f.write(profiler.to_collapsed())
+
+    profiles = sorted(
+        (entry for entry in os.scandir(directory) if entry.is_file()),
+        key=lambda entry: entry.stat().st_mtime
+    )
+    for entry in profiles[:max(0, len(profiles) - max_files)]:
+        try:
+            os.remove(entry.path)
+        except OSError:
+            pass
+    return path
+
+
+# Limiteur partagé par les requêtes du worker
+profile_gate = ProfileGate()
+
+
+class ProfilingMiddleware:
+    """Middleware ASGI : profile les requêtes sélectionnées par profile_gate"""
+
+    def __init__(self, app, gate=None):
+        self.app = app
+        self.gate = gate or profile_gate
+        check_format(self.gate.config["format"])
+
+    async def __call__(self, scope, receive, send):
+        config = self.gate.config
+        output_format = config["format"]
+        if (scope["type"] != "http"
+                or scope.get("path") not in config["endpoints"]
+                or output_format not in FORMATS
+                or not self.gate.wanted(scope.get("headers", []))
+                or not self.gate.acquire()):
+            return await self.app(scope, receive, send)
+
+        # Place acquise : tout ce qui suit est dans le try qui la libère
+        try:
+            filename = profile_filename(scope["method"], scope["path"], output_format)
+
+            async def send_with_id(message):
+                if message["type"] == "http.response.start":
+                    headers = list(message.get("headers", []))
+                    headers.append((b"x-profile-id", filename.encode("latin-1")))
+                    message = {**message, "headers": headers}
+                await send(message)
+
+            profiler = SamplingProfiler(config["interval_ms"] / 1000.0, config["max_duration_s"])
+            profiler.start()
+            try:
+                await self.app(scope, receive, send_with_id)
+            finally:
+                profiler.stop()
+                try:
+                    path = await run_in_threadpool(
+                        write_profile, profiler, config["output_dir"], filename,
+                        f"{scope['method']} {scope['path']}", output_format, config["max_files"]
+                    )
+                    print(f"🔬 Profil de {scope['method']} {scope['path']} "
+                          f"({profiler.duration * 1000.0:.0f} ms) : {path}")
+                except OSError as e:
+                    print(f"⚠️ Profil non enregistré: {e}")
+        finally:
+            self.gate.release()
@@ -0,0 +1,227 @@
+#!/usr/bin/env python3
+"""
+Quantification INT8 du classifieur (INFERENCE_CONFIG["quantization"] = "int8")
+
+Quantification statique post-entraînement onnxruntime : le modèle ONNX float32
+est calibré sur un petit jeu d'images passées par le même prétraitement que
+/analyze (ImageContext.tensor), puis ses poids et activations sont convertis en
+INT8 (format QDQ). Le rapport de dérive compare le modèle quantifié au modèle
+float sur d'autres images : taux d'accord du top-1 et similarité cosinus des
+embeddings retournés par /analyze.
+
+Usage :
+    python quantization.py [--calibration-dir photos/ --eval-dir validation/] [--calibration-size 64] [--eval-size 64]
+"""
+import argparse
+import io
+import os
+import tempfile
+import numpy as np
+import torch
+from PIL import Image, ImageDraw
+from onnxruntime.quantization import (
+    CalibrationDataReader,
+    CalibrationMethod,
+    QuantFormat,
+    QuantType,
+    quantize_static,
+)
+from config import QUANTIZATION_CONFIG, MODEL_CONFIG
+from image_context import ImageContext
+
+CALIBRATION_METHODS = {
+    "minmax": CalibrationMethod.MinMax,
+    "entropy": CalibrationMethod.Entropy,
+    "percentile": CalibrationMethod.Percentile,
+}
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".webp")
+
+
+def synthetic_images(count, seed=0):
+    """
+    Photos synthétiques de vêtements (formes colorées sur fond clair, bruit
+    de capteur), encodées en JPEG comme un upload
+    """
+    rng = np.random.RandomState(seed)
+    for _ in range(count):
+        width, height = int(rng.randint(320, 960)), int(rng.randint(320, 960))
+        background = tuple(int(c) for c in rng.randint(170, 256, size=3))
+        image = Image.new("RGB", (width, height), background)
+        draw = ImageDraw.Draw(image)
+        for _ in range(rng.randint(1, 4)):
+            x0, x1 = sorted(rng.randint(0, width, size=2))
+            y0, y1 = sorted(rng.randint(0, height, size=2))
+            color = tuple(int(c) for c in rng.randint(0, 256, size=3))
+            if rng.rand() < 0.5:
+                draw.rectangle([x0, y0, x1, y1], fill=color)
+            else:
+                draw.ellipse([x0, y0, x1, y1], fill=color)
+
+        data = np.asarray(image, dtype=np.float32) + rng.normal(0, 8, size=(height, width, 3))
+        image = Image.fromarray(np.clip(data, 0, 255).astype(np.uint8), "RGB")
+        buffer = io.BytesIO()
+        image.save(buffer, format="JPEG", quality=90)
+        yield buffer.getvalue()
+
+
+def directory_images(directory, count):
+    """Images d'un répertoire (ordre alphabétique, au plus count)"""
+    names = sorted(n for n in os.listdir(directory) if n.lower().endswith(IMAGE_EXTENSIONS))
+    for name in names[:count]:
+        with open(os.path.join(directory, name), "rb") as f:
+            yield f.read()
+
+
+def calibration_tensors(count=None, directory=None, seed=0):
+    """
+    Tenseurs (3, 224, 224) prétraités comme /analyze, depuis un répertoire
+    d'images ou des images synthétiques
+    """
+    count = count or QUANTIZATION_CONFIG["calibration_size"]
+    directory = directory or QUANTIZATION_CONFIG["calibration_dir"]
+    images = directory_images(directory, count) if directory else synthetic_images(count, seed)
+    return [ImageContext(image_bytes).tensor for image_bytes in images]
+
+
+def evaluation_tensors(count, directory=None):
+    """
+    Tenseurs d'évaluation de la dérive : QUANTIZATION_CONFIG["eval_dir"], jamais
+    le répertoire de calibration, sinon images synthétiques d'une autre graine
+
+    Raises:
+        ValueError: Répertoire d'évaluation identique au répertoire de calibration
+    """
+    directory = directory or QUANTIZATION_CONFIG["eval_dir"]
+    calibration_dir = QUANTIZATION_CONFIG["calibration_dir"]
+    if directory and calibration_dir and os.path.realpath(directory) == os.path.realpath(calibration_dir):
+        raise ValueError("Les images d'évaluation doivent être différentes des images de calibration")
+    images = directory_images(directory, count) if directory else synthetic_images(count, seed=1)
+    return [ImageContext(image_bytes).tensor for image_bytes in images]
+
+
+class TensorCalibrationReader(CalibrationDataReader):
+    """Fournit les tenseurs de calibration à onnxruntime, un par un"""
+
+    def __init__(self, tensors, input_name="input"):
+        self.input_name = input_name
+        self._tensors = iter(tensors)
+
+    def get_next(self):
+        tensor = next(self._tensors, None)
+        if tensor is None:
+            return None
+        return {self.input_name: tensor.unsqueeze(0).contiguous().numpy()}
+
+
+def quantize_model(float_path, int8_path, tensors=None, per_channel=None, calibrate_method=None):
+    """
+    Quantifie statiquement un modèle ONNX float32 en INT8 (QDQ)
+
+    Args:
+        float_path: Modèle ONNX float32 (export de inference_backends)
+        int8_path: Chemin du modèle quantifié
+        tensors: Tenseurs de calibration (défaut: calibration_tensors())
+        per_channel: Échelles par canal pour les poids des convolutions
+        calibrate_method: minmax, entropy ou percentile
+    """
+    from onnxruntime.quantization.shape_inference import quant_pre_process
+
+    tensors = tensors if tensors is not None else calibration_tensors()
+    per_channel = QUANTIZATION_CONFIG["per_channel"] if per_channel is None else per_channel
+    method = calibrate_method or QUANTIZATION_CONFIG["calibrate_method"]
+    if method not in CALIBRATION_METHODS:
+        raise ValueError(f"Méthode de calibration inconnue: {method}")
+
+    directory = os.path.dirname(int8_path) or "."
+    os.makedirs(directory, exist_ok=True)
+    # Fichiers intermédiaires uniques : plusieurs workers (ou la CLI) peuvent quantifier en même temps
+    prefix = f"{os.path.basename(int8_path)}.{os.getpid()}."
+    fd, prepared_path = tempfile.mkstemp(suffix=".prep.onnx", prefix=prefix, dir=directory)
+    os.close(fd)
+    fd, tmp_path = tempfile.mkstemp(suffix=".tmp", prefix=prefix, dir=directory)
+    os.close(fd)
+    try:
+        # Inférence des formes et fusion (Conv+BN...) avant insertion des QDQ
+        quant_pre_process(float_path, prepared_path, skip_symbolic_shape=True)
+        quantize_static(
+            prepared_path,
+            tmp_path,
+            TensorCalibrationReader(tensors),
+            quant_format=QuantFormat.QDQ,
+            per_channel=per_channel,
+            activation_type=QuantType.QUInt8,
+            weight_type=QuantType.QInt8,
+            calibrate_method=CALIBRATION_METHODS[method],
+        )
+        os.replace(tmp_path, int8_path)
+    finally:
+        for path in (prepared_path, tmp_path):
+            if os.path.exists(path):
+                os.remove(path)
+    return int8_path
+
+
+def drift_report(float_backend, int8_backend, tensors, embedding_dimensions=None):
+    """
+    Compare le modèle quantifié au modèle float
+
+    Returns:
+        dict: top1_agreement, similarité cosinus des embeddings (moyenne, min)
+              et écart absolu max des logits
+    """
+    dims = embedding_dimensions or MODEL_CONFIG["embedding_dimensions"]
+    batch = torch.stack(list(tensors))
+    expected = float_backend.run(batch)
+    outputs = int8_backend.run(batch)
+
+    cosine = torch.nn.functional.cosine_similarity(outputs[:, :dims], expected[:, :dims], dim=1)
+    return {
+        "images": len(batch),
+        "top1_agreement": (outputs.argmax(1) == expected.argmax(1)).float().mean().item(),
+        "embedding_cosine_mean": cosine.mean().item(),
+        "embedding_cosine_min": cosine.min().item(),
+        "max_abs_logit_diff": (outputs - expected).abs().max().item(),
+    }
+
+
+def main():
+    from inference_backends import OnnxRuntimeBackend, build_mobilenet, export_onnx, onnx_model_path, int8_model_path
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--calibration-dir", default=None, help="Images de calibration (défaut: synthétiques)")
+    parser.add_argument("--calibration-size", type=int, default=None)
+    parser.add_argument("--eval-dir", default=None,
+                        help="Images d'évaluation de la dérive (défaut: QUANTIZATION_CONFIG[\"eval_dir\"], "
+                             "obligatoire avec un répertoire de calibration)")
+    parser.add_argument("--eval-size", type=int, default=64)
+    parser.add_argument("--method", default=None, choices=sorted(CALIBRATION_METHODS))
+    args = parser.parse_args()
+    calibration_dir = args.calibration_dir or QUANTIZATION_CONFIG["calibration_dir"]
+    eval_dir = args.eval_dir or QUANTIZATION_CONFIG["eval_dir"]
+    if calibration_dir and not eval_dir:
+        # Évaluer sur les images de calibration masquerait l'erreur de quantification
+        parser.error("--eval-dir est obligatoire avec un répertoire de calibration")
+    if eval_dir and calibration_dir and os.path.realpath(eval_dir) == os.path.realpath(calibration_dir):
+        parser.error("--eval-dir doit être différent du répertoire de calibration")
+
+    float_path = onnx_model_path()
+    if not os.path.exists(float_path):
+        export_onnx(build_mobilenet(), float_path)
+
+    print("🧪 Calibration...")
+    tensors = calibration_tensors(args.calibration_size, calibration_dir)
+    int8_path = quantize_model(float_path, int8_model_path(), tensors, calibrate_method=args.method)
+    print(f"✅ Modèle INT8 : {int8_path} ({os.path.getsize(int8_path) / 1e6:.1f} Mo, "
+          f"float32 : {os.path.getsize(float_path) / 1e6:.1f} Mo)")
+
+    # Évaluation sur des images différentes de la calibration
+    eval_tensors = evaluation_tensors(args.eval_size, eval_dir)
+    report = drift_report(OnnxRuntimeBackend(float_path), OnnxRuntimeBackend(int8_path), eval_tensors)
+    print(f"📊 Top-1 identique : {report['top1_agreement']:.1%} sur {report['images']} images")
+    print(f"📊 Cosinus des embeddings : moyenne {report['embedding_cosine_mean']:.4f}, "
+          f"min {report['embedding_cosine_min']:.4f}")
+
+
+if __name__ == "__main__":
+    main()
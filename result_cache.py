@@ -0,0 +1,250 @@
+"""
+Cache des résultats d'analyse adressé par contenu
+Clé = hash SHA-256 des bytes uploadés + version du modèle et de la configuration.
+Niveau mémoire (LRU borné avec TTL) et niveau disque optionnel (SQLite)
+qui survit aux redémarrages
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from config import (
+    CLOTHING_TYPES,
+    STYLES,
+    COLORS,
+    SIZES,
+    MATERIALS,
+    PATTERNS,
+    MODEL_CONFIG,
+    INFERENCE_CONFIG,
+    DECODE_CONFIG,
+    CACHE_CONFIG
+)
+from executors import run_in_executor, ExecutorSaturatedError
+
+# Identifiant du modèle de classification (à changer si les poids changent)
+MODEL_NAME = "MobileNetV2"
+
+
+def config_version():
+    """Empreinte du modèle et de la configuration qui influencent le résultat"""
+    payload = json.dumps(
+        {
+            "model": MODEL_NAME,
+            "backend": INFERENCE_CONFIG["backend"],
+            "quantization": INFERENCE_CONFIG["quantization"],
+            "model_config": MODEL_CONFIG,
+            "decode": DECODE_CONFIG,  # le décodage réduit change les pixels, donc le résultat
+            "vocabulary": [CLOTHING_TYPES, STYLES, COLORS, SIZES, MATERIALS, PATTERNS],
+        },
+        sort_keys=True,
+        ensure_ascii=False
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:16]
+
+
+class ResultCache:
+    """Cache LRU en mémoire avec TTL et niveau SQLite optionnel"""
+
+    def __init__(self, max_entries=2048, ttl_seconds=3600, disk_path=None,
+                 disk_max_entries=100000, version=None):
+        self.max_entries = max(1, int(max_entries))
+        self.ttl = float(ttl_seconds)
+        self.disk_path = disk_path
+        self.disk_max_entries = int(disk_max_entries)
+        self.version = version or config_version()
+
+        self._memory = OrderedDict()  # clé -> (expire_à, valeur)
+        self._lock = threading.Lock()
+        self._db = None
+        self._writes_since_prune = 0
+
+        # Compteurs
+        self._hits = 0
+        self._memory_hits = 0
+        self._disk_hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self._expirations = 0
+
+        if disk_path:
+            self._open_disk(disk_path)
+
+    def _open_disk(self, path):
+        """Ouvre (ou crée) la base SQLite du niveau disque"""
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS results ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, "
+            "expires_at REAL NOT NULL, created_at REAL NOT NULL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS idx_results_created ON results(created_at)")
+
+    def after_fork(self):
+        """
+        Rouvre le niveau disque dans un worker forké : une connexion SQLite ne
+        doit pas être partagée entre processus
+        """
+        self._lock = threading.Lock()
+        if self._db is not None:
+            self._inherited_db = self._db  # ne pas fermer la connexion du maître
+            self._open_disk(self.disk_path)
+
+    def make_key(self, image_bytes):
+        """Clé de cache pour un upload (le hash lit le buffer sans le copier)"""
+        digest = hashlib.sha256(image_bytes).hexdigest()
+        return f"{self.version}:{digest}"
+
+    def get(self, key):
+        """Retourne le résultat mis en cache ou None"""
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                expires_at, value = entry
+                if expires_at > now:
+                    self._memory.move_to_end(key)
+                    self._hits += 1
+                    self._memory_hits += 1
+                    return dict(value)
+                del self._memory[key]
+                self._expirations += 1
+
+            if self._db is not None:
+                row = self._db.execute(
+                    "SELECT value, expires_at FROM results WHERE key = ?", (key,)
+                ).fetchone()
+                if row is not None:
+                    value, expires_at = json.loads(row[0]), row[1]
+                    if expires_at > now:
+                        self._store_memory(key, value, expires_at)
+                        self._hits += 1
+                        self._disk_hits += 1
+                        return dict(value)
+                    self._db.execute("DELETE FROM results WHERE key = ?", (key,))
+                    self._expirations += 1
+
+            self._misses += 1
+            return None
+
+    def set(self, key, value):
+        """Enregistre un résultat dans les deux niveaux"""
+        now = time.time()
+        expires_at = now + self.ttl
+        with self._lock:
+            self._store_memory(key, dict(value), expires_at)
+            if self._db is not None:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO results (key, value, expires_at, created_at) "
+                    "VALUES (?, ?, ?, ?)",
+                    (key, json.dumps(value, ensure_ascii=False), expires_at, now)
+                )
+                self._writes_since_prune += 1
+                if self._writes_since_prune >= 256:
+                    self._prune_disk(now)
+
+    def _store_memory(self, key, value, expires_at):
+        """Insère dans le LRU mémoire en évinçant les entrées les plus anciennes"""
+        self._memory[key] = (expires_at, value)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+            self._evictions += 1
+
+    def _prune_disk(self, now):
+        """Supprime les entrées expirées et borne la taille du niveau disque"""
+        self._writes_since_prune = 0
+        self._db.execute("DELETE FROM results WHERE expires_at <= ?", (now,))
+        count = self._db.execute("SELECT COUNT(*) FROM results").fetchone()[0]
+        excess = count - self.disk_max_entries
+        if excess > 0:
+            self._db.execute(
+                "DELETE FROM results WHERE key IN "
+                "(SELECT key FROM results ORDER BY created_at LIMIT ?)",
+                (excess,)
+            )
+            self._evictions += excess
+
+    def clear(self):
+        """Vide les deux niveaux"""
+        with self._lock:
+            self._memory.clear()
+            if self._db is not None:
+                self._db.execute("DELETE FROM results")
+
+    def stats(self):
+        """Compteurs de hits/misses/évictions"""
+        with self._lock:
+            lookups = self._hits + self._misses
+            disk_entries = None
+            if self._db is not None:
+                disk_entries = self._db.execute("SELECT COUNT(*) FROM results").fetchone()[0]
+            return {
+                "version": self.version,
+                "entries": len(self._memory),
+                "max_entries": self.max_entries,
+                "disk_entries": disk_entries,
+                "hits": self._hits,
+                "memory_hits": self._memory_hits,
+                "disk_hits": self._disk_hits,
+                "misses": self._misses,
+                "hit_rate": self._hits / lookups if lookups else 0.0,
+                "evictions": self._evictions,
+                "expirations": self._expirations,
+            }
+
+
+# Instance globale du cache de /analyze (None si désactivé)
+analysis_cache = ResultCache(
+    max_entries=CACHE_CONFIG["max_entries"],
+    ttl_seconds=CACHE_CONFIG["ttl_seconds"],
+    disk_path=CACHE_CONFIG["disk_path"] if CACHE_CONFIG["disk_enabled"] else None,
+    disk_max_entries=CACHE_CONFIG["disk_max_entries"]
+) if CACHE_CONFIG["enabled"] else None
+
+
+def _lookup(cache, image_bytes):
+    key = cache.make_key(image_bytes)
+    return key, cache.get(key)
+
+
+async def cached_analysis(image_bytes, compute):
+    """
+    Résultat d'analyse de l'upload, depuis le cache ou calculé par compute()
+    puis mis en cache
+
+    Le hash de l'upload (jusqu'à 10 Mo) et le niveau SQLite s'exécutent dans le
+    pool "analyze" : la boucle d'événements n'est jamais bloquée.
+
+    Args:
+        image_bytes: Bytes (ou memoryview) de l'upload
+        compute: Fonction asynchrone sans argument qui calcule le résultat
+
+    Raises:
+        ExecutorSaturatedError: Si le pool "analyze" est saturé pour la recherche
+    """
+    cache = analysis_cache
+    if cache is None:
+        return await compute()
+
+    key, cached = await run_in_executor("analyze", _lookup, cache, image_bytes)
+    if cached is not None:
+        return cached
+
+    result = await compute()
+    if cache.disk_path is None:
+        cache.set(key, result)  # niveau mémoire seul : insertion immédiate
+    else:
+        try:
+            await run_in_executor("analyze", cache.set, key, result)
+        except ExecutorSaturatedError:
+            pass  # résultat calculé : le renvoyer même s'il n'est pas mis en cache
+    return result
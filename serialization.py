@@ -0,0 +1,118 @@
+"""
+Sérialisation des réponses JSON et encodages compacts de l'embedding
+
+- dumps() : orjson s'il est installé (dépendance optionnelle, ~30x plus rapide
+  que json sur le résultat d'analyse), sinon json avec les options de Starlette
+- Encodages de l'embedding (SERIALIZATION_CONFIG), au choix du client par le
+  paramètre ?embedding_format= ou l'en-tête Accept: application/json; embedding=f16 :
+    json  liste de nombres (défaut, compatible Strapi)
+    f32   {"encoding": "f32", "dims", "data"} : float32 little-endian en base64
+    f16   idem en float16 (précision ~1e-3 relative)
+    int8  {"encoding": "int8", "dims", "scale", "data"} : valeur ≈ entier * scale
+"""
+import base64
+import json
+import numpy as np
+from config import SERIALIZATION_CONFIG
+
+try:
+    import orjson
+except ImportError:  # dépendance optionnelle : sérialisation standard
+    orjson = None
+
+EMBEDDING_FORMATS = ("json", "f32", "f16", "int8")
+
+_DTYPES = {"f32": "<f4", "f16": "<f2", "int8": "i1"}
+
+_ORJSON_OPTIONS = orjson.OPT_SERIALIZE_NUMPY if orjson is not None else 0
+
+
+def dumps(content):
+    """Sérialise en JSON UTF-8 (bytes), avec orjson quand il est disponible"""
+    if orjson is not None and SERIALIZATION_CONFIG["orjson"]:
+        try:
+            return orjson.dumps(content, option=_ORJSON_OPTIONS)
+        except TypeError:
+            pass  # type non géré par orjson (clés non textuelles...) : json standard
+    return json.dumps(
+        content,
+        ensure_ascii=False,
+        allow_nan=False,
+        indent=None,
+        separators=(",", ":"),
+    ).encode("utf-8")
+
+
+def encode_embedding(values, embedding_format):
+    """
+    Encode un embedding (liste ou tableau de flottants) dans le format demandé
+
+    Raises:
+        ValueError: Format inconnu
+    """
+    if embedding_format == "json":
+        return values if isinstance(values, list) else np.asarray(values, dtype=np.float64).tolist()
+    if embedding_format not in _DTYPES:
+        raise ValueError(f"Format d'embedding inconnu: {embedding_format} (attendu: {', '.join(EMBEDDING_FORMATS)})")
+
+    vector = np.asarray(values, dtype=np.float32)
+    encoded = {"encoding": embedding_format, "dims": int(vector.size)}
+    if embedding_format == "int8":
+        peak = float(np.abs(vector).max()) if vector.size else 0.0
+        scale = peak / 127.0 if peak > 0 else 1.0
+        vector = np.clip(np.rint(vector / scale), -127, 127)
+        encoded["scale"] = scale
+    encoded["data"] = base64.b64encode(vector.astype(_DTYPES[embedding_format]).tobytes()).decode("ascii")
+    return encoded
+
+
+def decode_embedding(encoded):
+    """
+    Décode un embedding produit par encode_embedding (liste de flottants)
+
+    Raises:
+        ValueError: Encodage inconnu ou données de mauvaise taille
+    """
+    if isinstance(encoded, list):
+        return [float(value) for value in encoded]
+    embedding_format = encoded.get("encoding")
+    if embedding_format not in _DTYPES:
+        raise ValueError(f"Encodage d'embedding inconnu: {embedding_format}")
+    vector = np.frombuffer(base64.b64decode(encoded["data"]), dtype=_DTYPES[embedding_format])
+    if vector.size != encoded.get("dims", vector.size):
+        raise ValueError(f"Embedding de {vector.size} dimensions (annoncé: {encoded['dims']})")
+    vector = vector.astype(np.float64)
+    if embedding_format == "int8":
+        vector *= encoded["scale"]
+    return vector.tolist()
+
+
+def negotiate_embedding_format(query_format=None, accept=None):
+    """
+    Format d'embedding demandé : paramètre de requête, sinon paramètre
+    "embedding" de l'en-tête Accept, sinon SERIALIZATION_CONFIG
+
+    Raises:
+        ValueError: Format inconnu
+    """
+    embedding_format = query_format
+    if not embedding_format and accept:
+        for media_range in accept.split(","):
+            for parameter in media_range.split(";")[1:]:
+                name, _, value = parameter.partition("=")
+                if name.strip().lower() == "embedding":
+                    embedding_format = value.strip().strip('"')
+                    break
+            if embedding_format:
+                break
+    embedding_format = (embedding_format or SERIALIZATION_CONFIG["embedding_format"]).lower()
+    if embedding_format not in EMBEDDING_FORMATS:
+        raise ValueError(f"Format d'embedding inconnu: {embedding_format} (attendu: {', '.join(EMBEDDING_FORMATS)})")
+    return embedding_format
+
+
+def with_embedding_format(analysis, embedding_format):
+    """Copie du résultat d'analyse avec l'embedding encodé (le résultat en cache n'est pas modifié)"""
+    if embedding_format == "json" or "embedding" not in analysis:
+        return analysis
+    return {**analysis, "embedding": encode_embedding(analysis["embedding"], embedding_format)}
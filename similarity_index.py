@@ -0,0 +1,451 @@
+"""
+Index de similarité sur les embeddings d'analyse
+Vecteurs normalisés stockés dans des fichiers mappés en mémoire (chargement
+instantané, pages partagées entre workers). Recherche exacte (produit
+matriciel NumPy + top-k) ou approximative (IVF : k-means puis exploration
+des nprobe listes les plus proches)
+
+Fichiers du répertoire de l'index :
+    meta.json        compteur, capacité, dimensions, génération, état IVF
+    vectors.f32      matrice (capacité, dimensions) float32
+    ids.bin          identifiants (capacité,) bytes de longueur fixe
+    valid.u8         1 si la ligne est vivante, 0 si supprimée
+    ivf_*.npy        centroïdes, lignes triées par liste, offsets des listes
+"""
+import json
+import os
+import threading
+from contextlib import contextmanager
+import numpy as np
+from config import SIMILARITY_CONFIG
+
+try:
+    import fcntl
+except ImportError:  # Windows : verrou inter-processus indisponible
+    fcntl = None
+
+# Longueur maximale d'un identifiant (octets UTF-8)
+ID_MAX_BYTES = 64
+
+
+class SimilarityIndex:
+    """Index de vecteurs persistant, exact ou approximatif (IVF)"""
+
+    def __init__(self, index_dir, dimensions, nlist=None, nprobe=8, approximate_min_vectors=20000):
+        """
+        Args:
+            index_dir: Répertoire des fichiers de l'index
+            dimensions: Dimension des embeddings
+            nlist: Nombre de listes IVF (None = ~sqrt(n))
+            nprobe: Listes explorées par requête approximative
+            approximate_min_vectors: Seuil du mode "auto" pour passer en IVF
+        """
+        self.index_dir = index_dir
+        self.dimensions = int(dimensions)
+        self.nlist = nlist
+        self.nprobe = int(nprobe)
+        self.approximate_min_vectors = int(approximate_min_vectors)
+
+        self._lock = threading.RLock()
+        self._meta_signature_seen = None
+        self._id_map = None
+        os.makedirs(index_dir, exist_ok=True)
+        self._load()
+
+    # ------------------------------------------------------------------
+    # Fichiers
+    # ------------------------------------------------------------------
+
+    def _path(self, name):
+        return os.path.join(self.index_dir, name)
+
+    @contextmanager
+    def _write_lock(self):
+        """Verrou d'écriture : threads du processus et autres workers"""
+        with self._lock:
+            if fcntl is None:
+                yield
+                return
+            with open(self._path("lock"), "w") as lock_file:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _load(self):
+        """(Re)mappe les fichiers de l'index d'après meta.json"""
+        meta_path = self._path("meta.json")
+        if os.path.exists(meta_path):
+            with open(meta_path) as f:
+                meta = json.load(f)
+            if meta["dimensions"] != self.dimensions:
+                raise ValueError(
+                    f"Index de dimension {meta['dimensions']}, {self.dimensions} attendue"
+                )
+            self._meta_signature_seen = self._meta_signature()
+        else:
+            meta = {"dimensions": self.dimensions, "count": 0, "capacity": 0,
+                    "deleted": 0, "generation": 0, "ivf": None}
+            self._meta_signature_seen = None
+
+        self.meta = meta
+        self._map_arrays()
+        self._load_ivf()
+        self._id_map = None
+
+    def _map_arrays(self):
+        capacity = self.meta["capacity"]
+        if capacity == 0:
+            self._vectors = np.zeros((0, self.dimensions), dtype=np.float32)
+            self._ids = np.zeros(0, dtype=f"S{ID_MAX_BYTES}")
+            self._valid = np.zeros(0, dtype=np.uint8)
+            return
+        self._vectors = np.memmap(self._path("vectors.f32"), dtype=np.float32, mode="r+",
+                                  shape=(capacity, self.dimensions))
+        self._ids = np.memmap(self._path("ids.bin"), dtype=f"S{ID_MAX_BYTES}", mode="r+",
+                              shape=(capacity,))
+        self._valid = np.memmap(self._path("valid.u8"), dtype=np.uint8, mode="r+",
+                                shape=(capacity,))
+
+    def _load_ivf(self):
+        self._ivf = None
+        if self.meta.get("ivf"):
+            self._ivf = {
+                "centroids": np.load(self._path("ivf_centroids.npy"), mmap_mode="r"),
+                "order": np.load(self._path("ivf_order.npy"), mmap_mode="r"),
+                "offsets": np.load(self._path("ivf_offsets.npy")),
+                "trained_count": self.meta["ivf"]["trained_count"],
+            }
+
+    def _meta_signature(self):
+        """Signature de meta.json (remplacé atomiquement à chaque écriture)"""
+        try:
+            stat = os.stat(self._path("meta.json"))
+        except FileNotFoundError:
+            return None
+        return (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+
+    def _refresh(self):
+        """Recharge l'index si un autre worker l'a modifié"""
+        if self._meta_signature() != self._meta_signature_seen:
+            self._load()
+
+    def _save_meta(self):
+        """Écrit meta.json de façon atomique (les autres workers rechargeront)"""
+        for array in (self._vectors, self._ids, self._valid):
+            if isinstance(array, np.memmap):
+                array.flush()
+        self.meta["generation"] += 1
+        tmp_path = self._path("meta.json.tmp")
+        with open(tmp_path, "w") as f:
+            json.dump(self.meta, f)
+        os.replace(tmp_path, self._path("meta.json"))
+        self._meta_signature_seen = self._meta_signature()
+
+    def _ensure_capacity(self, needed):
+        """Agrandit les fichiers (capacité doublée) sans changer leur inode"""
+        capacity = self.meta["capacity"]
+        if needed <= capacity:
+            return
+        new_capacity = max(1024, capacity * 2)
+        while new_capacity < needed:
+            new_capacity *= 2
+        for name, row_bytes in (("vectors.f32", 4 * self.dimensions),
+                                ("ids.bin", ID_MAX_BYTES),
+                                ("valid.u8", 1)):
+            with open(self._path(name), "ab") as f:
+                f.truncate(new_capacity * row_bytes)
+        self.meta["capacity"] = new_capacity
+        self._map_arrays()
+
+    def _get_id_map(self):
+        """Dictionnaire identifiant -> ligne (construit à la première écriture)"""
+        if self._id_map is None:
+            count = self.meta["count"]
+            rows = np.flatnonzero(self._valid[:count])
+            self._id_map = {self._ids[row].decode("utf-8"): int(row) for row in rows}
+        return self._id_map
+
+    # ------------------------------------------------------------------
+    # Écriture
+    # ------------------------------------------------------------------
+
+    def _prepare_vectors(self, embeddings):
+        vectors = np.asarray(embeddings, dtype=np.float32)
+        if vectors.ndim == 1:
+            vectors = vectors[None, :]
+        if vectors.ndim != 2 or vectors.shape[1] != self.dimensions:
+            raise ValueError(
+                f"Embedding de dimension {vectors.shape[-1]}, {self.dimensions} attendue"
+            )
+        if not np.all(np.isfinite(vectors)):
+            raise ValueError("Embedding invalide : valeurs non finies")
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return vectors / norms
+
+    def add(self, ids, embeddings):
+        """
+        Insère ou remplace des vecteurs
+
+        Args:
+            ids: Liste d'identifiants (str)
+            embeddings: Matrice (n, dimensions) ou liste de vecteurs
+
+        Raises:
+            ValueError: Si un identifiant ou un vecteur est invalide
+        """
+        ids = [str(item_id) for item_id in ids]
+        vectors = self._prepare_vectors(embeddings)
+        if len(ids) != len(vectors):
+            raise ValueError("Autant d'identifiants que d'embeddings sont requis")
+        encoded = [item_id.encode("utf-8") for item_id in ids]
+        for item_id, raw in zip(ids, encoded):
+            if not raw or len(raw) > ID_MAX_BYTES:
+                raise ValueError(f"Identifiant invalide (1 à {ID_MAX_BYTES} octets): {item_id!r}")
+
+        # Dernière occurrence gagnante pour les doublons dans le même appel
+        latest = {item_id: i for i, item_id in enumerate(ids)}
+        keep = sorted(latest.values())
+
+        with self._write_lock():
+            self._refresh()
+            id_map = self._get_id_map()
+
+            # Un remplacement = suppression logique + ajout (listes IVF cohérentes)
+            for i in keep:
+                old_row = id_map.get(ids[i])
+                if old_row is not None:
+                    self._valid[old_row] = 0
+                    self.meta["deleted"] += 1
+
+            start = self.meta["count"]
+            end = start + len(keep)
+            self._ensure_capacity(end)
+            self._vectors[start:end] = vectors[keep]
+            self._ids[start:end] = [encoded[i] for i in keep]
+            self._valid[start:end] = 1
+            for offset, i in enumerate(keep):
+                id_map[ids[i]] = start + offset
+            self.meta["count"] = end
+            self._save_meta()
+        return len(keep)
+
+    def delete(self, item_id):
+        """
+        Supprime un vecteur
+
+        Returns:
+            bool: False si l'identifiant est inconnu
+        """
+        with self._write_lock():
+            self._refresh()
+            id_map = self._get_id_map()
+            row = id_map.pop(str(item_id), None)
+            if row is None:
+                return False
+            self._valid[row] = 0
+            self.meta["deleted"] += 1
+            if self.meta["deleted"] > 1024 and self.meta["deleted"] * 2 > self.meta["count"]:
+                self._compact()
+            else:
+                self._save_meta()
+            return True
+
+    def _compact(self):
+        """Réécrit l'index sans les lignes supprimées (nouveaux fichiers, renommage atomique)"""
+        count = self.meta["count"]
+        rows = np.flatnonzero(self._valid[:count])
+        live = len(rows)
+        capacity = max(1024, 1 << max(0, int(live - 1).bit_length()))
+
+        for name, source, dtype, shape in (
+            ("vectors.f32", self._vectors, np.float32, (capacity, self.dimensions)),
+            ("ids.bin", self._ids, f"S{ID_MAX_BYTES}", (capacity,)),
+            ("valid.u8", self._valid, np.uint8, (capacity,)),
+        ):
+            tmp_path = self._path(name + ".tmp")
+            target = np.memmap(tmp_path, dtype=dtype, mode="w+", shape=shape)
+            if name == "valid.u8":
+                target[:live] = 1
+            else:
+                target[:live] = source[rows]
+            target.flush()
+            del target
+            os.replace(tmp_path, self._path(name))
+
+        self.meta.update({"count": live, "capacity": capacity, "deleted": 0, "ivf": None})
+        self._map_arrays()
+        self._ivf = None
+        self._id_map = None
+        self._save_meta()
+
+    def build_ivf(self, nlist=None, iterations=10, seed=0):
+        """
+        Entraîne l'index approximatif (k-means sphérique) sur les vecteurs vivants
+
+        Returns:
+            dict: Paramètres de l'index construit
+        """
+        with self._write_lock():
+            self._refresh()
+            count = self.meta["count"]
+            rows = np.flatnonzero(self._valid[:count])
+            if len(rows) == 0:
+                raise ValueError("Index vide : rien à entraîner")
+
+            nlist = int(nlist or self.nlist or max(1, min(4096, round(np.sqrt(len(rows))))))
+            nlist = min(nlist, len(rows))
+            rng = np.random.RandomState(seed)
+            sample_size = min(len(rows), max(nlist * 64, 10000))
+            sample = np.sort(rng.choice(rows, sample_size, replace=False))
+            centroids = _spherical_kmeans(np.asarray(self._vectors[sample]), nlist, iterations, rng)
+
+            assignments = np.empty(len(rows), dtype=np.int32)
+            for start in range(0, len(rows), 65536):
+                chunk = rows[start:start + 65536]
+                assignments[start:start + 65536] = np.argmax(
+                    np.asarray(self._vectors[chunk]) @ centroids.T, axis=1
+                )
+            permutation = np.argsort(assignments, kind="stable")
+            order = rows[permutation].astype(np.int64)
+            offsets = np.searchsorted(assignments[permutation], np.arange(nlist + 1)).astype(np.int64)
+
+            np.save(self._path("ivf_centroids.npy"), centroids)
+            np.save(self._path("ivf_order.npy"), order)
+            np.save(self._path("ivf_offsets.npy"), offsets)
+            self.meta["ivf"] = {"nlist": nlist, "trained_count": count}
+            self._load_ivf()
+            self._save_meta()
+            return {"nlist": nlist, "trained_vectors": len(rows)}
+
+    # ------------------------------------------------------------------
+    # Lecture
+    # ------------------------------------------------------------------
+
+    def search(self, embedding, k=10, mode="auto", nprobe=None):
+        """
+        Retourne les k vecteurs les plus proches (similarité cosinus)
+
+        Args:
+            embedding: Vecteur de requête
+            k: Nombre de résultats
+            mode: "exact", "approximate" ou "auto"
+            nprobe: Listes IVF explorées (mode approximatif)
+
+        Returns:
+            tuple: (liste de {"id", "score"}, mode utilisé)
+        """
+        if mode not in ("exact", "approximate", "auto"):
+            raise ValueError(f"Mode de recherche inconnu: {mode}")
+        query = self._prepare_vectors(embedding)[0]
+
+        with self._lock:
+            self._refresh()
+            count = self.meta["count"]
+            live = count - self.meta["deleted"]
+            vectors, ids, valid, ivf = self._vectors, self._ids, self._valid, self._ivf
+
+        if mode == "auto":
+            mode = "approximate" if ivf is not None and live >= self.approximate_min_vectors else "exact"
+        if mode == "approximate" and ivf is None:
+            mode = "exact"
+        if live == 0:
+            return [], mode
+
+        if mode == "exact":
+            candidates = None
+            scores = vectors[:count] @ query
+            scores[valid[:count] == 0] = -np.inf
+        else:
+            candidates = self._ivf_candidates(ivf, query, count, valid, nprobe or self.nprobe)
+            scores = vectors[candidates] @ query
+
+        k = min(int(k), len(scores))
+        if k <= 0:
+            return [], mode
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+
+        results = []
+        for position in top:
+            score = scores[position]
+            if not np.isfinite(score):
+                break
+            row = position if candidates is None else candidates[position]
+            results.append({"id": ids[row].decode("utf-8"), "score": float(score)})
+        return results, mode
+
+    def _ivf_candidates(self, ivf, query, count, valid, nprobe):
+        """Lignes vivantes des nprobe listes les plus proches + lignes non indexées"""
+        centroid_scores = ivf["centroids"] @ query
+        nprobe = min(nprobe, len(centroid_scores))
+        probes = np.argpartition(-centroid_scores, nprobe - 1)[:nprobe]
+        offsets, order = ivf["offsets"], ivf["order"]
+        parts = [order[offsets[c]:offsets[c + 1]] for c in probes]
+        # Vecteurs ajoutés depuis l'entraînement : parcourus exactement
+        parts.append(np.arange(ivf["trained_count"], count, dtype=np.int64))
+        candidates = np.concatenate(parts)
+        return candidates[valid[candidates] == 1]
+
+    def stats(self):
+        """État de l'index"""
+        with self._lock:
+            self._refresh()
+            meta = self.meta
+            ivf = meta.get("ivf")
+            return {
+                "vectors": meta["count"] - meta["deleted"],
+                "rows": meta["count"],
+                "capacity": meta["capacity"],
+                "deleted": meta["deleted"],
+                "dimensions": self.dimensions,
+                "generation": meta["generation"],
+                "ivf_nlist": ivf["nlist"] if ivf else None,
+                "ivf_unindexed_rows": meta["count"] - ivf["trained_count"] if ivf else None,
+            }
+
+
+def _spherical_kmeans(data, nlist, iterations, rng):
+    """k-means sur vecteurs normalisés (similarité cosinus)"""
+    centroids = data[rng.choice(len(data), nlist, replace=False)].copy()
+    for _ in range(iterations):
+        assignments = np.argmax(data @ centroids.T, axis=1)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assignments, data)
+        counts = np.bincount(assignments, minlength=nlist)
+        empty = counts == 0
+        if empty.any():
+            # Listes vides : réinitialisées sur des points aléatoires
+            sums[empty] = data[rng.choice(len(data), int(empty.sum()), replace=False)]
+        norms = np.linalg.norm(sums, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        centroids = (sums / norms).astype(np.float32)
+    return centroids
+
+
+# Instance globale de l'index (créée à la première utilisation)
+_similarity_index = None
+_similarity_index_lock = threading.Lock()
+
+
+def get_similarity_index():
+    """Retourne l'index global configuré par SIMILARITY_CONFIG"""
+    global _similarity_index
+    if _similarity_index is None:
+        with _similarity_index_lock:
+            if _similarity_index is None:
+                _similarity_index = SimilarityIndex(
+                    index_dir=SIMILARITY_CONFIG["index_dir"],
+                    dimensions=SIMILARITY_CONFIG["dimensions"],
+                    nlist=SIMILARITY_CONFIG["ivf_nlist"],
+                    nprobe=SIMILARITY_CONFIG["ivf_nprobe"],
+                    approximate_min_vectors=SIMILARITY_CONFIG["approximate_min_vectors"]
+                )
+    return _similarity_index
+
+
+def similarity_stats():
+    """Statistiques de l'index global (None s'il n'a pas encore été ouvert)"""
+    return _similarity_index.stats() if _similarity_index is not None else None
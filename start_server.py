@@ -1,33 +1,51 @@
 #!/usr/bin/env python3
 """
 Script de démarrage du serveur avec gestion d'erreurs
+
+    python start_server.py                 # un seul processus (développement)
+    python start_server.py --workers 4     # production : workers pré-forkés (prefork.py)
 """
 
+import argparse
 import sys
 import traceback
 
-try:
-    from main import app
-    import uvicorn
+parser = argparse.ArgumentParser(description="Démarrage du AI Clothing Service")
+parser.add_argument("--host", default="127.0.0.1")
+parser.add_argument("--port", type=int, default=8000)
+parser.add_argument("--workers", type=int, default=1,
+                    help="Nombre de workers pré-forkés (0 = un par cœur)")
+args = parser.parse_args()
 
+try:
     print("🚀 Démarrage du serveur AI Clothing Service...")
     print("📍 Endpoints disponibles:")
     print("   - GET  /")
     print("   - GET  /health")
+    print("   - GET  /ready")
     print("   - GET  /config")
     print("   - POST /analyze")
     print("   - POST /remove-background")
     print("")
 
-    uvicorn.run(
-        app,
-        host="127.0.0.1",
-        port=8000,
-        log_level="info",
-        access_log=True
-    )
+    if args.workers != 1:
+        # Modèles chargés une fois dans le maître, partagés par les workers
+        from prefork import PreforkServer
+
+        PreforkServer(workers=args.workers or None, host=args.host, port=args.port).run()
+    else:
+        from main import app
+        import uvicorn
+
+        uvicorn.run(
+            app,
+            host=args.host,
+            port=args.port,
+            log_level="info",
+            access_log=True
+        )
 
 except Exception as e:
     print(f"❌ Erreur lors du démarrage du serveur: {e}")
     traceback.print_exc()
-    sys.exit(1)
\ No newline at end of file
+    sys.exit(1)
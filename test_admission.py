@@ -0,0 +1,118 @@
+"""
+Tests du contrôle d'admission (admission.py)
+"""
+import asyncio
+import httpx
+import admission
+import main
+from admission import AdmissionGate, AdmissionRejected
+from config import UPLOAD_CONFIG
+from test_helpers import make_image_bytes
+
+
+def test_gate_queue_full_and_fifo():
+    """Au-delà de concurrency + max_queue : refus immédiat ; les places passent dans l'ordre"""
+    async def run():
+        gate = AdmissionGate("/analyze", concurrency=1, max_queue=2, max_wait_seconds=5)
+        assert await gate.acquire() == 0.0
+
+        order = []
+
+        async def waiter(name):
+            await gate.acquire()
+            order.append(name)
+
+        tasks = [asyncio.create_task(waiter("a")), asyncio.create_task(waiter("b"))]
+        await asyncio.sleep(0)
+        assert gate.stats()["waiting"] == 2
+
+        try:
+            await gate.acquire()
+        except AdmissionRejected as e:
+            assert e.reason == "queue_full"
+            assert e.retry_after >= 1
+        else:
+            raise AssertionError("AdmissionRejected attendue")
+
+        gate.release(0.01)
+        await asyncio.sleep(0)
+        gate.release(0.01)
+        await asyncio.gather(*tasks)
+        assert order == ["a", "b"]
+        gate.release(0.01)
+
+        stats = gate.stats()
+        assert stats["active"] == 0 and stats["waiting"] == 0
+        assert stats["admitted"] == 3
+        assert stats["rejected"]["queue_full"] == 1
+    asyncio.run(run())
+
+
+def test_gate_timeout_and_cancel():
+    """Attente trop longue : refus ; client parti : sa place n'est pas perdue"""
+    async def run():
+        gate = AdmissionGate("/remove-background", concurrency=1, max_queue=4, max_wait_seconds=0.05)
+        await gate.acquire()
+        try:
+            await gate.acquire()
+        except AdmissionRejected as e:
+            assert e.reason == "timeout"
+        else:
+            raise AssertionError("AdmissionRejected attendue")
+        assert gate.stats()["waiting"] == 0
+
+        gate.max_wait = 5
+        cancelled = asyncio.create_task(gate.acquire())
+        await asyncio.sleep(0)
+        cancelled.cancel()
+        await asyncio.gather(cancelled, return_exceptions=True)
+
+        gate.release()
+        assert gate.active == 0
+        assert await gate.acquire() == 0.0
+    asyncio.run(run())
+
+
+def test_middleware_sheds_without_starving_cheap_endpoints(monkeypatch):
+    """Endpoint saturé : 503 server_busy avec Retry-After et CORS ; /health et /config répondent toujours"""
+    gate = AdmissionGate("/analyze", concurrency=1, max_queue=0, max_wait_seconds=1)
+    gate.active = 1
+    monkeypatch.setitem(admission.gates, "/analyze", gate)
+
+    async def run():
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            busy = await client.post(
+                "/analyze",
+                files={"file": ("robe.png", make_image_bytes(), "image/png")},
+                headers={"Origin": "https://app.serahly.fr"}
+            )
+            too_large = await client.post(
+                "/analyze",
+                files={"file": ("robe.png", b"0" * (UPLOAD_CONFIG["max_bytes"] + UPLOAD_CONFIG["multipart_overhead_bytes"]), "image/png")}
+            )
+            health = await client.get("/health")
+            config = await client.get("/config")
+            stats = await client.get("/stats")
+            return busy, too_large, health, config, stats
+
+    busy, too_large, health, config, stats = asyncio.run(run())
+    assert busy.status_code == 503
+    assert busy.json()["detail"]["error"] == "server_busy"
+    assert busy.json()["detail"]["reason"] == "queue_full"
+    assert int(busy.headers["retry-after"]) >= 1
+    # Refus lisible par un navigateur : en-têtes CORS et Retry-After exposé
+    assert busy.headers["access-control-allow-origin"] == "*"
+    assert "retry-after" in busy.headers["access-control-expose-headers"].lower()
+    # Upload trop volumineux refusé sans attendre de place dans la file
+    assert too_large.status_code == 400
+    assert too_large.json()["detail"]["error"] == "file_too_large"
+    assert health.status_code == 200
+    assert config.status_code == 200
+    assert stats.json()["admission"]["/analyze"]["rejected"]["queue_full"] == 1
+
+
+if __name__ == "__main__":
+    test_gate_queue_full_and_fifo()
+    test_gate_timeout_and_cancel()
+    print("✅ Tests du contrôle d'admission réussis")
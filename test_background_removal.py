@@ -3,7 +3,10 @@
 Tests pour le service de suppression d'arrière-plan
 """
 
-from background_removal import BackgroundRemovalService
+import io
+import numpy as np
+from PIL import Image
+from background_removal import BackgroundRemovalService, encode_output
 
 def test_background_removal_service():
     """Test basique du service de suppression d'arrière-plan"""
@@ -41,6 +44,82 @@ def test_background_removal_service():
 
     print(f"✅ Test réussi - Méthode utilisée: {metadata['method']}")
 
+def test_session_pool_reuses_sessions():
+    """Les sessions rembg sont créées une fois puis réutilisées"""
+    service = BackgroundRemovalService(model_name='u2netp', pool_size=2)
+
+    # Sessions factices : on vérifie uniquement la gestion du pool
+    created = []
+    def fake_create_session():
+        created.append(service.model_name)
+        return object()
+    service._create_session = fake_create_session
+
+    used = []
+    for _ in range(5):
+        with service.session() as session:
+            used.append(session)
+
+    assert created == ['u2netp']
+    assert len(set(map(id, used))) == 1
+    assert service.stats()['sessions_created'] == 1
+    assert service.stats()['sessions_idle'] == 1
+
+def make_cutout(width=120, height=80):
+    """Image RGBA avec un alpha varié (détourage)"""
+    rng = np.random.RandomState(0)
+    data = rng.randint(0, 256, size=(height, width, 4)).astype(np.uint8)
+    data[: height // 2, :, 3] = 0
+    return Image.fromarray(data, 'RGBA')
+
+def test_output_formats():
+    """PNG, WebP sans perte et masque conservent l'alpha exact"""
+    image = make_cutout()
+    alpha = np.asarray(image.getchannel('A'))
+
+    png, info = encode_output(image, 'png', compress_level=1)
+    assert info['media_type'] == 'image/png' and info['output_bytes'] == len(png)
+    assert np.array_equal(np.asarray(Image.open(io.BytesIO(png))), np.asarray(image))
+
+    webp, info = encode_output(image, 'webp', lossless=True)
+    decoded = Image.open(io.BytesIO(webp))
+    assert info['media_type'] == 'image/webp' and decoded.format == 'WEBP'
+    assert np.array_equal(np.asarray(decoded.getchannel('A')), alpha)
+
+    mask, info = encode_output(image, 'mask')
+    decoded = Image.open(io.BytesIO(mask))
+    assert info['mode'] == 'L' and decoded.mode == 'L'
+    assert np.array_equal(np.asarray(decoded), alpha)
+    assert info['encode_ms'] >= 0
+
+def test_invalid_output_options():
+    """Format ou réglage hors limites : ValueError"""
+    image = make_cutout()
+    for options in ({'output_format': 'gif'}, {'compress_level': 10}, {'quality': 101}):
+        try:
+            encode_output(image, **options)
+        except ValueError:
+            pass
+        else:
+            raise AssertionError(f"ValueError attendue pour {options}")
+
+def test_output_format_metadata():
+    """Le service rapporte le format, le temps d'encodage et la taille"""
+    service = BackgroundRemovalService()
+    buffer = io.BytesIO()
+    Image.new('RGB', (64, 64), 'white').save(buffer, format='PNG')
+
+    output_bytes, metadata = service.remove_background(buffer.getvalue(), output_format='mask')
+    assert metadata['output_format'] == 'mask'
+    assert metadata['processed_mode'] == 'L'
+    assert metadata['has_transparency'] is False
+    assert metadata['output_bytes'] == len(output_bytes)
+    assert Image.open(io.BytesIO(output_bytes)).mode == 'L'
+
 if __name__ == "__main__":
     test_background_removal_service()
+    test_session_pool_reuses_sessions()
+    test_output_formats()
+    test_invalid_output_options()
+    test_output_format_metadata()
     print("✅ Tests du service de suppression d'arrière-plan réussis")
\ No newline at end of file
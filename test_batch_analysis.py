@@ -0,0 +1,106 @@
+"""
+Tests de l'analyse en lot (collecte des images et flux NDJSON)
+"""
+import asyncio
+import io
+import json
+import zipfile
+import httpx
+from PIL import Image
+from starlette.datastructures import UploadFile, Headers
+import main
+from batch_analysis import collect_batch_items, stream_batch_analysis, BatchTooLargeError
+from config import BATCH_CONFIG, UPLOAD_CONFIG
+
+
+def make_upload(filename, content, content_type):
+    return UploadFile(
+        file=io.BytesIO(content),
+        size=len(content),
+        filename=filename,
+        headers=Headers({"content-type": content_type})
+    )
+
+
+def make_zip(entries):
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w") as archive:
+        for name, content in entries.items():
+            archive.writestr(name, content)
+    return buffer.getvalue()
+
+
+def test_collect_files_and_zip_entries():
+    """Les fichiers et les entrées d'archive deviennent des éléments du lot"""
+    archive = make_zip({"haut.jpg": b"a", "dossier/bas.png": b"b", "__MACOSX/._haut.jpg": b"x"})
+    uploads = [
+        make_upload("veste.jpg", b"veste", "image/jpeg"),
+        make_upload("import.zip", archive, "application/zip"),
+    ]
+
+    items, owned_files = collect_batch_items(uploads)
+
+    assert [name for name, _, _ in items] == ["veste.jpg", "haut.jpg", "dossier/bas.png"]
+    assert bytes(items[0][2]()) == b"veste"
+    assert items[2][2]() == b"b"
+    # Le lot possède les fichiers : fermer l'upload ne les ferme pas
+    uploads[0].file.close()
+    assert bytes(items[0][2]()) == b"veste"
+    for f in owned_files:
+        f.close()
+
+
+def test_too_many_items_is_rejected():
+    """Un lot au-delà de max_items est refusé avant tout traitement"""
+    archive = make_zip({f"{i}.jpg": b"x" for i in range(BATCH_CONFIG["max_items"] + 1)})
+    try:
+        collect_batch_items([make_upload("import.zip", archive, "application/zip")])
+    except BatchTooLargeError:
+        pass
+    else:
+        raise AssertionError("BatchTooLargeError attendue")
+
+
+def test_item_errors_are_reported_inline():
+    """Les images invalides produisent une ligne d'erreur sans interrompre le flux"""
+    items = [
+        ("invalide.jpg", 9, lambda: b"pas image"),
+        ("enorme.jpg", UPLOAD_CONFIG["max_bytes"] + 1, lambda: b""),
+    ]
+
+    async def consume():
+        return [json.loads(line) async for line in stream_batch_analysis(items)]
+
+    lines = asyncio.run(consume())
+
+    errors = sorted(lines[:-1], key=lambda line: line["index"])
+    assert [line["status"] for line in errors] == ["error", "error"]
+    assert [line["error"] for line in errors] == ["invalid_image", "file_too_large"]
+    assert lines[-1] == {"summary": {"total": 2, "succeeded": 0, "failed": 2}}
+    print("✅ Erreurs reportées ligne par ligne")
+
+
+def test_cached_result_is_still_moderated():
+    """Une image déjà analysée par /analyze (sans modération) reste bloquée dans un lot"""
+    buffer = io.BytesIO()
+    Image.new("RGB", (128, 128), (220, 180, 150)).save(buffer, format="PNG")  # entièrement couleur chair
+    image_bytes = buffer.getvalue()
+
+    async def run():
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            primed = await client.post("/analyze", files={"file": ("peau.png", image_bytes, "image/png")})
+        items = [("peau.png", len(image_bytes), lambda: image_bytes)]
+        return primed, [json.loads(line) async for line in stream_batch_analysis(items)]
+
+    primed, lines = asyncio.run(run())
+    assert primed.status_code == 200
+    assert lines[0]["status"] == "error"
+    assert lines[0]["error"] == "content_blocked"
+
+
+if __name__ == "__main__":
+    test_collect_files_and_zip_entries()
+    test_too_many_items_is_rejected()
+    test_item_errors_are_reported_inline()
+    print("✅ Tests de l'analyse en lot réussis")
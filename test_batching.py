@@ -0,0 +1,76 @@
+"""
+Tests du micro-batcher d'inférence
+"""
+import asyncio
+from batching import MicroBatcher
+
+
+def test_concurrent_requests_are_batched():
+    """Les requêtes concurrentes sont regroupées en un seul appel"""
+    calls = []
+
+    def run_batch(items):
+        calls.append(list(items))
+        return [item * 2 for item in items]
+
+    batcher = MicroBatcher(run_batch, max_batch_size=8, max_wait_ms=50)
+
+    async def scenario():
+        return await asyncio.gather(*(batcher.submit(i) for i in range(5)))
+
+    results = asyncio.run(scenario())
+
+    assert results == [0, 2, 4, 6, 8]
+    assert len(calls) == 1
+    stats = batcher.stats()
+    assert stats["total_batches"] == 1
+    assert stats["total_items"] == 5
+    assert stats["batch_size_histogram"] == {"5": 1}
+    assert stats["queue_depth"] == 0
+    print(f"✅ 5 requêtes traitées en {len(calls)} batch")
+
+
+def test_max_batch_size_is_respected():
+    """Un batch ne dépasse jamais max_batch_size"""
+    sizes = []
+
+    def run_batch(items):
+        sizes.append(len(items))
+        return items
+
+    batcher = MicroBatcher(run_batch, max_batch_size=4, max_wait_ms=20)
+
+    async def scenario():
+        return await asyncio.gather(*(batcher.submit(i) for i in range(10)))
+
+    results = asyncio.run(scenario())
+
+    assert results == list(range(10))
+    assert max(sizes) <= 4
+    assert sum(sizes) == 10
+    assert batcher.stats()["max_batch_size_seen"] <= 4
+
+
+def test_errors_are_propagated_to_each_request():
+    """Une erreur du batch est renvoyée à chaque requête du batch"""
+    def run_batch(items):
+        raise ValueError("forward pass impossible")
+
+    batcher = MicroBatcher(run_batch, max_batch_size=4, max_wait_ms=10)
+
+    async def scenario():
+        return await asyncio.gather(
+            *(batcher.submit(i) for i in range(3)),
+            return_exceptions=True
+        )
+
+    results = asyncio.run(scenario())
+
+    assert all(isinstance(r, ValueError) for r in results)
+
+
+if __name__ == "__main__":
+    test_concurrent_requests_are_batched()
+    test_max_batch_size_is_respected()
+    test_errors_are_propagated_to_each_request()
+    print("✅ Tests du micro-batcher réussis")
@@ -0,0 +1,72 @@
+"""
+Tests des budgets de threads CPU et du fichier de réglages de l'autotuning
+"""
+import json
+import os
+import tempfile
+import config
+from config import THREADING_CONFIG, BATCHING_CONFIG, apply_overlay
+from cpu_threads import thread_budget, available_cpus, default_session_pool_size, rembg_session_threads
+
+
+def test_thread_budget_splits_cores_between_workers():
+    """Les cœurs sont partagés entre les workers, au moins un thread chacun"""
+    assert available_cpus() >= 1
+
+    budget = thread_budget(workers=4, cpus=16)
+    assert budget["torch_intra_op_threads"] == 4
+    assert budget["classifier_intra_op_threads"] == 4
+    assert budget["torch_inter_op_threads"] == THREADING_CONFIG["torch_inter_op_threads"]
+
+    assert thread_budget(workers=8, cpus=2)["torch_intra_op_threads"] == 1
+
+
+def test_rembg_threads_follow_worker_budget():
+    """Sans réglage, les cœurs du worker sont partagés entre les sessions rembg"""
+    sessions = default_session_pool_size()
+    budget = thread_budget(workers=1, cpus=16)
+    assert budget["rembg_intra_op_threads"] == max(1, 16 // sessions)
+    assert thread_budget(workers=16, cpus=16)["rembg_intra_op_threads"] == 1
+    assert rembg_session_threads(per_worker=8, sessions=4) == 2
+
+
+def test_explicit_thread_config_wins():
+    """Une valeur explicite dans THREADING_CONFIG remplace le calcul par défaut"""
+    previous = THREADING_CONFIG["torch_intra_op_threads"]
+    THREADING_CONFIG["torch_intra_op_threads"] = 3
+    try:
+        budget = thread_budget(workers=1, cpus=16)
+        assert budget["torch_intra_op_threads"] == 3
+        assert budget["classifier_intra_op_threads"] == 3
+    finally:
+        THREADING_CONFIG["torch_intra_op_threads"] = previous
+
+
+def test_autotune_overlay_updates_known_keys_only():
+    """Le fichier d'autotuning complète les configurations existantes"""
+    previous_batching = dict(BATCHING_CONFIG)
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "autotune.json")
+        with open(path, "w") as f:
+            json.dump({
+                "BATCHING_CONFIG": {"max_batch_size": 4, "inconnu": 1},
+                "_autotune": {"results": []},
+            }, f)
+        try:
+            assert apply_overlay(path) is True
+            assert BATCHING_CONFIG["max_batch_size"] == 4
+            assert "inconnu" not in BATCHING_CONFIG
+            assert not hasattr(config, "_autotune")
+        finally:
+            BATCHING_CONFIG.clear()
+            BATCHING_CONFIG.update(previous_batching)
+
+    assert apply_overlay(os.path.join(tmp, "absent.json")) is False
+
+
+if __name__ == "__main__":
+    test_thread_budget_splits_cores_between_workers()
+    test_rembg_threads_follow_worker_budget()
+    test_explicit_thread_config_wins()
+    test_autotune_overlay_updates_known_keys_only()
+    print("✅ Tests des budgets de threads réussis")
@@ -0,0 +1,103 @@
+"""
+Tests des pools d'exécution bornés
+"""
+import asyncio
+import threading
+import time
+from executors import BoundedExecutor, ExecutorSaturatedError
+
+
+def test_work_runs_off_event_loop():
+    """Le travail s'exécute dans un thread du pool, pas dans la boucle"""
+    executor = BoundedExecutor("test", kind="thread", max_workers=1, max_queue=1)
+
+    async def scenario():
+        loop_thread = threading.get_ident()
+        worker_thread = await executor.run(threading.get_ident)
+        return loop_thread, worker_thread
+
+    loop_thread, worker_thread = asyncio.run(scenario())
+    executor.shutdown()
+
+    assert loop_thread != worker_thread
+    assert executor.stats()["completed"] == 1
+
+
+def test_event_loop_stays_responsive():
+    """Une tâche lente ne bloque pas les autres coroutines"""
+    executor = BoundedExecutor("test", kind="thread", max_workers=1, max_queue=0)
+
+    async def scenario():
+        slow = asyncio.ensure_future(executor.run(time.sleep, 0.3))
+        start = time.perf_counter()
+        await asyncio.sleep(0.01)
+        elapsed = time.perf_counter() - start
+        await slow
+        return elapsed
+
+    elapsed = asyncio.run(scenario())
+    executor.shutdown()
+
+    assert elapsed < 0.2
+    print(f"✅ Boucle réactive pendant la tâche lente ({elapsed * 1000:.1f} ms)")
+
+
+def test_queue_limit_rejects_excess_work():
+    """Au-delà de max_workers + max_queue, les tâches sont refusées"""
+    executor = BoundedExecutor("test", kind="thread", max_workers=1, max_queue=1)
+
+    async def scenario():
+        return await asyncio.gather(
+            *(executor.run(time.sleep, 0.1) for _ in range(4)),
+            return_exceptions=True
+        )
+
+    results = asyncio.run(scenario())
+    executor.shutdown()
+
+    rejected = [r for r in results if isinstance(r, ExecutorSaturatedError)]
+    assert len(rejected) == 2
+    assert executor.stats()["rejected"] == 2
+
+
+def test_cancelled_caller_keeps_slot_until_task_ends():
+    """Annuler l'attente ne libère pas la place tant que la tâche tourne ; échecs comptés à part"""
+    executor = BoundedExecutor("test", kind="thread", max_workers=1, max_queue=0)
+
+    def fail():
+        raise RuntimeError("échec")
+
+    async def scenario():
+        waiter = asyncio.ensure_future(executor.run(time.sleep, 0.2))
+        await asyncio.sleep(0.05)
+        waiter.cancel()
+        await asyncio.gather(waiter, return_exceptions=True)
+
+        # La tâche occupe toujours le seul worker : nouvelle tâche refusée
+        try:
+            await executor.run(time.sleep, 0)
+        except ExecutorSaturatedError:
+            pass
+        else:
+            raise AssertionError("ExecutorSaturatedError attendue")
+
+        await asyncio.sleep(0.3)
+        assert executor.stats()["running"] == 0
+        await asyncio.gather(executor.run(fail), return_exceptions=True)
+        await asyncio.sleep(0.01)
+        return executor.stats()
+
+    stats = asyncio.run(scenario())
+    executor.shutdown()
+
+    assert stats["completed"] == 1
+    assert stats["failed"] == 1
+    assert stats["rejected"] == 1
+
+
+if __name__ == "__main__":
+    test_work_runs_off_event_loop()
+    test_event_loop_stays_responsive()
+    test_queue_limit_rejects_excess_work()
+    test_cancelled_caller_keeps_slot_until_task_ends()
+    print("✅ Tests des pools d'exécution réussis")
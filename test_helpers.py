@@ -0,0 +1,21 @@
+"""
+Utilitaires partagés par les tests (aucun test ici)
+"""
+import io
+import random
+from PIL import Image
+
+
+def make_image_bytes(color=None, size=(160, 120), fmt="PNG"):
+    """
+    Image unie encodée
+
+    Args:
+        color: Couleur RGB (défaut: aléatoire, donc jamais servie par le cache
+               d'analyse, et bleue dominante pour ne jamais passer pour de la peau)
+    """
+    if color is None:
+        color = (random.randrange(96), random.randrange(256), random.randrange(160, 256))
+    buffer = io.BytesIO()
+    Image.new("RGB", size, color).save(buffer, format=fmt)
+    return buffer.getvalue()
@@ -0,0 +1,84 @@
+"""
+Tests du contexte d'image partagé (décodage unique)
+"""
+from image_context import ImageContext
+from content_moderation import detect_inappropriate_content
+from background_removal import BackgroundRemovalService
+from PIL import Image
+import io
+
+
+def create_test_image(size=(120, 80), fmt='JPEG'):
+    """Crée une image de test simple"""
+    img = Image.new('RGB', size, color=(30, 60, 200))
+    img_bytes = io.BytesIO()
+    img.save(img_bytes, format=fmt)
+    return img_bytes.getvalue()
+
+
+def test_lazy_representations_are_cached():
+    """Chaque représentation est calculée une seule fois"""
+    context = ImageContext(create_test_image())
+
+    assert context.size == (120, 80)
+    assert context.format == 'JPEG'
+    assert "image" not in context._cache  # l'en-tête suffit pour les dimensions
+
+    assert context.rgb is context.rgb
+    assert context.rgba.mode == 'RGBA'
+    assert context.rgb_array.shape == (80, 120, 3)
+    assert context.rgba_array.shape == (80, 120, 4)
+    assert context.thumbnail(32) is context.thumbnail(32)
+    assert max(context.thumbnail(32).size) == 32
+
+
+def test_single_decode_across_stages():
+    """La modération et la suppression d'arrière-plan partagent le même décodage"""
+    context = ImageContext(create_test_image(fmt='PNG'))
+
+    decodes = []
+    original_decode = context._decode
+    def counting_decode():
+        decodes.append(1)
+        return original_decode()
+    context._decode = counting_decode
+
+    detect_inappropriate_content(context)
+    BackgroundRemovalService().remove_background(context)
+
+    assert len(decodes) == 1
+    print("✅ Image décodée une seule fois pour la modération et le détourage")
+
+
+def test_from_input_accepts_bytes_and_context():
+    """from_input réutilise un contexte existant"""
+    image_bytes = create_test_image()
+    context = ImageContext.from_input(image_bytes)
+
+    assert ImageContext.from_input(context) is context
+    assert context.image_bytes is image_bytes
+
+
+def test_fast_decode_skips_full_resolution():
+    """Le tenseur et la miniature d'un grand JPEG sont décodés à échelle réduite"""
+    image_bytes = create_test_image(size=(2400, 1800))
+    context = ImageContext(image_bytes, fast_decode=True)
+
+    reduced = context.reduced(224, 224)
+    assert reduced.width >= 224 and reduced.height >= 224
+    assert reduced.width <= 600  # décodé à 1/4 ou 1/8, pas en 2400x1800
+    assert tuple(context.tensor.shape) == (3, 224, 224)
+    assert max(context.thumbnail(256).size) == 256
+    assert "image" not in context._cache
+
+    full = ImageContext(image_bytes, fast_decode=False)
+    assert full.reduced(224, 224).size == (2400, 1800)
+    print(f"✅ JPEG 2400x1800 décodé en {reduced.width}x{reduced.height} pour le modèle")
+
+
+if __name__ == "__main__":
+    test_lazy_representations_are_cached()
+    test_single_decode_across_stages()
+    test_from_input_accepts_bytes_and_context()
+    test_fast_decode_skips_full_resolution()
+    print("✅ Tests du contexte d'image réussis")
@@ -0,0 +1,62 @@
+"""
+Tests des backends d'inférence : équivalence onnxruntime / PyTorch
+"""
+import os
+import tempfile
+import torch
+from torchvision import models
+from inference_backends import TorchBackend, OnnxRuntimeBackend, export_onnx, create_backend
+
+
+def random_model(seed=0):
+    """
+    MobileNetV2 sans téléchargement : poids aléatoires et statistiques BatchNorm
+    réalistes (l'initialisation par défaut donne des logits quasi nuls)
+    """
+    torch.manual_seed(seed)
+    model = models.mobilenet_v2(weights=None).eval()
+    for module in model.modules():
+        if isinstance(module, torch.nn.BatchNorm2d):
+            module.running_mean.uniform_(-0.1, 0.1)
+            module.running_var.uniform_(0.5, 1.5)
+            module.weight.data.uniform_(0.5, 1.5)
+            module.bias.data.uniform_(-0.1, 0.1)
+        elif isinstance(module, torch.nn.Linear):
+            module.weight.data.normal_(0, 0.1)
+    return model
+
+
+def test_onnxruntime_matches_torch():
+    """Le modèle exporté donne les mêmes logits que PyTorch (batch dynamique)"""
+    model = random_model()
+    reference = TorchBackend(model)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = export_onnx(model, os.path.join(tmp, "mobilenet_v2.onnx"))
+        backend = OnnxRuntimeBackend(path, graph_optimization="all", intra_op_threads=1)
+
+        for batch_size in (1, 4):
+            batch = torch.rand(batch_size, 3, 224, 224)
+            expected = reference.run(batch)
+            outputs = backend.run(batch)
+
+            assert outputs.shape == expected.shape
+            assert torch.equal(outputs.argmax(1), expected.argmax(1))
+            assert torch.allclose(outputs, expected, atol=1e-4, rtol=1e-3)
+
+        print(f"✅ Écart max onnxruntime/torch : {(outputs - expected).abs().max().item():.2e}")
+
+
+def test_unknown_backend_is_rejected():
+    try:
+        create_backend("tensorrt")
+    except ValueError:
+        pass
+    else:
+        raise AssertionError("ValueError attendue")
+
+
+if __name__ == "__main__":
+    test_onnxruntime_matches_torch()
+    test_unknown_backend_is_rejected()
+    print("✅ Tests des backends d'inférence réussis")
@@ -0,0 +1,219 @@
+"""
+Tests des jobs asynchrones de suppression d'arrière-plan (jobs.py, /jobs/...)
+"""
+import asyncio
+import os
+import tempfile
+import time
+import httpx
+import main
+from jobs import JobStore, JobRunner, JobQueueFullError, QUEUED, RUNNING, DONE, FAILED
+from test_helpers import make_image_bytes
+
+
+def new_store(**options):
+    return JobStore(os.path.join(tempfile.mkdtemp(), "jobs.sqlite3"), **options)
+
+
+def test_priority_order():
+    """Le job le plus prioritaire est servi d'abord, puis le plus ancien"""
+    store = new_store()
+    low = store.submit("remove_background", b"a", {}, priority=0)
+    high = store.submit("remove_background", b"b", {}, priority=5)
+    low_2 = store.submit("remove_background", b"c", {}, priority=0)
+
+    assert store.get(high["id"])["queue_position"] == 0
+    assert store.get(low_2["id"])["queue_position"] == 2
+
+    order = []
+    while True:
+        claimed = store.claim("worker")
+        if claimed is None:
+            break
+        job, input_bytes = claimed
+        assert job["status"] == RUNNING
+        order.append(input_bytes)
+    assert order == [b"b", b"a", b"c"]
+    assert low["status"] == QUEUED
+
+
+def test_state_survives_restart():
+    """Une nouvelle instance (worker redémarré) retrouve la file et les résultats"""
+    store = new_store()
+    job = store.submit("remove_background", b"image", {"output_format": "png"}, idempotency_key="cle")
+    store.claim("worker")
+    store.complete(job["id"], "worker", b"png", "image/png", {"output_format": "png"})
+
+    reopened = JobStore(store.path)
+    assert reopened.get(job["id"])["status"] == DONE
+    assert reopened.result(job["id"]) == b"png"
+    # Même clé d'idempotence : le job existant, pas un nouveau
+    assert reopened.submit("remove_background", b"image", {}, idempotency_key="cle")["id"] == job["id"]
+
+
+def test_lost_worker_lease():
+    """Un job dont le bail expire est repris, puis échoue après max_attempts"""
+    store = new_store(lease_seconds=0.05, max_attempts=2)
+    job = store.submit("remove_background", b"image", {})
+
+    assert store.claim("mort")[0]["id"] == job["id"]
+    time.sleep(0.1)
+    claimed, _ = store.claim("vivant")
+    assert claimed["id"] == job["id"] and claimed["attempts"] == 2
+
+    time.sleep(0.1)
+    assert store.claim("autre") is None
+    failed = store.get(job["id"])
+    assert failed["status"] == FAILED
+    assert failed["error"]["error"] == "worker_lost"
+
+
+def test_reclaimed_job_ignores_previous_owner():
+    """Un worker dont le bail a expiré ne peut plus terminer le job repris par un autre"""
+    store = new_store(lease_seconds=0.05)
+    job = store.submit("remove_background", b"image", {})
+    store.claim("lent")
+    time.sleep(0.1)
+    store.claim("repreneur")
+
+    assert not store.complete(job["id"], "lent", b"ancien", "image/png", {})
+    assert not store.fail(job["id"], "lent", "background_removal_failed", "trop tard")
+    assert store.get(job["id"])["status"] == RUNNING
+
+    assert store.complete(job["id"], "repreneur", b"nouveau", "image/png", {})
+    assert store.result(job["id"]) == b"nouveau"
+    # Deuxième issue ignorée : le job n'est terminé qu'une fois
+    assert not store.complete(job["id"], "repreneur", b"encore", "image/png", {})
+    assert store.result(job["id"]) == b"nouveau"
+
+
+def test_bounded_results_and_queue():
+    """Résultats bornés en taille et expirés après le TTL ; file bornée"""
+    store = new_store(max_result_bytes=10, max_queued=3)
+    first = store.submit("remove_background", b"1", {})
+    second = store.submit("remove_background", b"2", {})
+    store.claim("worker")
+    store.complete(first["id"], "worker", b"x" * 8, "image/png", {})
+    store.claim("worker")
+    store.complete(second["id"], "worker", b"y" * 8, "image/png", {})
+    assert store.get(first["id"]) is None
+    assert store.result(second["id"]) == b"y" * 8
+
+    store.submit("remove_background", b"3", {})
+    store.submit("remove_background", b"4", {})
+    store.submit("remove_background", b"5", {})
+    try:
+        store.submit("remove_background", b"6", {})
+    except JobQueueFullError:
+        pass
+    else:
+        raise AssertionError("JobQueueFullError attendue")
+
+    expiring = new_store(result_ttl_seconds=0)
+    job = expiring.submit("remove_background", b"image", {})
+    expiring.claim("worker")
+    expiring.fail(job["id"], "worker", "invalid_image", "illisible")
+    assert expiring.get(job["id"]) is None
+
+
+def run_with_runner(scenario, monkeypatch):
+    """Exécute scenario(client) avec un JobRunner sur une base temporaire"""
+    store = new_store()
+    runner = JobRunner(store, poll_interval=0.05)
+    monkeypatch.setattr(main, "job_store", store)
+    monkeypatch.setattr(main, "job_runner", runner)
+
+    async def run():
+        runner.start()
+        try:
+            transport = httpx.ASGITransport(app=main.app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+                return await scenario(client)
+        finally:
+            await runner.stop()
+    return asyncio.run(run())
+
+
+async def wait_for_job(client, job_id, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        job = (await client.get(f"/jobs/{job_id}")).json()
+        if job["status"] in (DONE, FAILED):
+            return job
+        await asyncio.sleep(0.05)
+    raise AssertionError("Job non terminé")
+
+
+def test_job_api(monkeypatch):
+    """Soumission (202), suivi, résultat identique à /remove-background"""
+    image_bytes = make_image_bytes()
+
+    async def scenario(client):
+        response = await client.post(
+            "/jobs/remove-background",
+            files={"file": ("veste.png", image_bytes, "image/png")},
+            data={"output_format": "mask", "priority": "3"}
+        )
+        assert response.status_code == 202
+        job_id = response.json()["job_id"]
+        assert response.headers["location"] == f"/jobs/{job_id}"
+
+        job = await wait_for_job(client, job_id)
+        assert job["status"] == DONE
+        assert job["metadata"]["output_format"] == "mask"
+
+        result = await client.get(f"/jobs/{job_id}/result")
+        direct = await client.post(
+            "/remove-background",
+            files={"file": ("veste.png", image_bytes, "image/png")},
+            data={"output_format": "mask"}
+        )
+        assert result.status_code == 200
+        assert result.content == direct.content
+        assert result.headers["content-disposition"] == direct.headers["content-disposition"]
+
+    run_with_runner(scenario, monkeypatch)
+
+
+def test_job_api_errors(monkeypatch):
+    """Job inconnu (404), résultat pas prêt (409), requêtes invalides (400)"""
+    async def scenario(client):
+        missing = await client.get("/jobs/inconnu")
+        assert missing.status_code == 404
+        assert missing.json()["detail"]["error"] == "not_found"
+
+        invalid = await client.post("/jobs/remove-background", files={"file": ("veste.png", b"zz", "image/png")})
+        assert invalid.status_code == 400
+        assert invalid.json()["detail"]["error"] == "invalid_image"
+
+        priority = await client.post(
+            "/jobs/remove-background",
+            files={"file": ("veste.png", make_image_bytes(), "image/png")},
+            data={"priority": "99"}
+        )
+        assert priority.json()["detail"]["error"] == "invalid_priority"
+
+    run_with_runner(scenario, monkeypatch)
+
+    store = new_store()
+    job = store.submit("remove_background", make_image_bytes(), {})
+    monkeypatch.setattr(main, "job_store", store)
+
+    async def not_ready():
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            return await client.get(f"/jobs/{job['id']}/result")
+
+    response = asyncio.run(not_ready())
+    assert response.status_code == 409
+    assert response.json()["detail"]["error"] == "job_not_ready"
+    assert response.headers["retry-after"] == "1"
+
+
+if __name__ == "__main__":
+    test_priority_order()
+    test_state_survives_restart()
+    test_lost_worker_lease()
+    test_reclaimed_job_ignores_previous_owner()
+    test_bounded_results_and_queue()
+    print("✅ Tests des jobs réussis")
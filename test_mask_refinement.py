@@ -0,0 +1,89 @@
+"""
+Tests de l'agrandissement du masque par filtre guidé et du détourage à basse résolution
+"""
+import io
+import numpy as np
+from PIL import Image, ImageDraw
+from background_removal import BackgroundRemovalService
+from mask_refinement import _box_filter, upsample_mask
+
+
+def product_photo(width=1200, height=900, mode="RGB"):
+    """Vêtement sombre sur fond blanc"""
+    image = Image.new(mode, (width, height), (250, 250, 250, 255)[:len(mode)])
+    draw = ImageDraw.Draw(image)
+    draw.ellipse([width * 0.2, height * 0.15, width * 0.8, height * 0.85], fill=(120, 40, 60, 255)[:len(mode)])
+    return image
+
+
+def encode(image, fmt="PNG"):
+    buffer = io.BytesIO()
+    image.save(buffer, format=fmt)
+    return buffer.getvalue()
+
+
+def test_box_filter_matches_window_mean():
+    """Moyenne exacte sur la fenêtre tronquée aux bords"""
+    x = np.random.RandomState(0).rand(20, 30).astype(np.float32)
+    expected = np.array([
+        [x[max(0, i - 2):i + 3, max(0, j - 2):j + 3].mean() for j in range(30)]
+        for i in range(20)
+    ])
+    assert np.allclose(_box_filter(x, 2), expected, atol=1e-5)
+
+
+def test_upsample_follows_full_resolution_edges():
+    """Le bord du masque agrandi suit le contour de l'image pleine résolution"""
+    full = Image.new("L", (400, 40), 30)
+    full.paste(220, (203, 0, 400, 40))  # contour entre deux pixels de la version réduite
+    small = full.resize((100, 10), Image.BILINEAR)
+    mask = Image.fromarray(np.where(np.asarray(small) > 125, 255, 0).astype(np.uint8), "L")
+
+    alpha = np.asarray(upsample_mask(mask, small, full))
+    naive = np.asarray(mask.resize(full.size, Image.BILINEAR))
+    assert alpha.shape == (40, 400)
+
+    expected = np.zeros(400, dtype=bool)
+    expected[203:] = True
+    guided_errors = ((alpha[20] > 127) != expected).sum()
+    naive_errors = ((naive[20] > 127) != expected).sum()
+    assert guided_errors < naive_errors
+    assert guided_errors <= 1
+
+
+def test_downscaled_removal_matches_full_resolution():
+    """Même détourage qu'en pleine résolution, masque calculé sur 256 px"""
+    image_bytes = encode(product_photo())
+    reference, _ = BackgroundRemovalService(mask_max_side=None).remove_background(image_bytes, output_format="mask")
+    output_bytes, metadata = BackgroundRemovalService(mask_max_side=256).remove_background(image_bytes, output_format="mask")
+
+    assert metadata["mask_size"] == (256, 192)
+    assert metadata["processed_size"] == (1200, 900)
+    expected = np.asarray(Image.open(io.BytesIO(reference))) > 127
+    alpha = np.asarray(Image.open(io.BytesIO(output_bytes))) > 127
+    iou = (expected & alpha).sum() / (expected | alpha).sum()
+    assert iou > 0.99
+
+
+def test_downscaled_removal_keeps_original_alpha():
+    """La transparence d'origine d'un PNG RGBA est conservée"""
+    image = product_photo(mode="RGBA")
+    image.putalpha(Image.new("L", image.size, 255))
+    alpha = np.asarray(image.getchannel("A")).copy()
+    alpha[:, :100] = 0
+    image.putalpha(Image.fromarray(alpha, "L"))
+
+    output_bytes, metadata = BackgroundRemovalService(mask_max_side=256).remove_background(encode(image))
+    output = Image.open(io.BytesIO(output_bytes))
+    assert output.mode == "RGBA" and output.size == image.size
+    assert np.asarray(output.getchannel("A"))[:, :100].max() == 0
+    # Le centre du vêtement reste opaque
+    assert output.getpixel((600, 450))[3] == 255
+
+
+if __name__ == "__main__":
+    test_box_filter_matches_window_mean()
+    test_upsample_follows_full_resolution_edges()
+    test_downscaled_removal_matches_full_resolution()
+    test_downscaled_removal_keeps_original_alpha()
+    print("✅ Tests du détourage à basse résolution réussis")
@@ -0,0 +1,128 @@
+"""
+Tests des métriques Prometheus (metrics.py, GET /metrics)
+"""
+import asyncio
+import time
+import httpx
+import metrics
+from main import app
+from metrics import MetricsRegistry
+from test_helpers import make_image_bytes
+
+
+def request(method, path, **kwargs):
+    async def send():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            return await client.request(method, path, **kwargs)
+    return asyncio.run(send())
+
+
+def test_exposition_format():
+    """Compteurs étiquetés et buckets d'histogramme cumulés"""
+    registry = MetricsRegistry()
+    counter = registry.counter("test_total", "Compteur", labels=[("kind", ("a", "b", "other"))])
+    histogram = registry.histogram("test_seconds", "Durées", buckets=[0.1, 1.0])
+
+    counter.inc("a")
+    counter.inc("a")
+    counter.inc("inconnu")
+    for value in (0.05, 0.5, 0.5, 5.0):
+        histogram.observe(value)
+
+    text = registry.expose()
+    assert "# TYPE test_total counter" in text
+    assert 'test_total{kind="a"} 2' in text
+    assert 'test_total{kind="other"} 1' in text
+    assert 'test_total{kind="b"}' not in text
+    assert 'test_seconds_bucket{le="0.1"} 1' in text
+    assert 'test_seconds_bucket{le="1"} 3' in text
+    assert 'test_seconds_bucket{le="+Inf"} 4' in text
+    assert "test_seconds_count 4" in text
+    assert histogram.snapshot() == {"count": 4.0, "sum": 6.05}
+
+
+def test_shared_rows_are_summed():
+    """En mode pré-forké, chaque worker écrit sa ligne et l'exposition additionne"""
+    registry = MetricsRegistry()
+    counter = registry.counter("test_total", "Compteur")
+    gauge = registry.gauge("test_in_flight", "Jauge")
+    registry.share(3)
+
+    for row in range(3):
+        registry.bind_worker(row)
+        counter.inc(amount=row + 1)
+        gauge.inc()
+
+    assert counter.value() == 6.0
+    assert gauge.value() == 3.0
+    # Un worker remplacé repart avec une jauge à zéro mais garde les compteurs
+    registry.bind_worker(1)
+    assert gauge.value() == 2.0
+    assert counter.value() == 6.0
+
+
+def test_analyze_request_is_recorded():
+    """Une requête /analyze compte dans les requêtes et les étapes traversées"""
+    before_requests = metrics.requests_total.value("/analyze", "2xx")
+    before = {name: metrics.stage_duration.snapshot(name)["count"]
+              for name in ("upload_read", "decode", "preprocess", "forward", "serialization")}
+
+    response = request("POST", "/analyze", files={"file": ("veste.png", make_image_bytes(), "image/png")})
+    assert response.status_code == 200
+
+    assert metrics.requests_total.value("/analyze", "2xx") == before_requests + 1
+    for name, count in before.items():
+        assert metrics.stage_duration.snapshot(name)["count"] > count, name
+
+    text = request("GET", "/metrics").text
+    assert 'ai_service_requests_total{endpoint="/analyze",status="2xx"}' in text
+    assert 'ai_service_stage_duration_seconds_bucket{stage="forward",le="+Inf"}' in text
+
+
+def test_errors_are_counted():
+    """Les réponses d'erreur sont comptées par code et par classe de statut"""
+    before_errors = metrics.errors_total.value("invalid_pipeline")
+    before_requests = metrics.requests_total.value("/process", "4xx")
+
+    response = request(
+        "POST", "/process",
+        files={"file": ("veste.png", make_image_bytes(), "image/png")},
+        data={"steps": "ocr"}
+    )
+
+    assert response.status_code == 400
+    assert response.json()["detail"]["error"] == "invalid_pipeline"
+    assert metrics.errors_total.value("invalid_pipeline") == before_errors + 1
+    assert metrics.requests_total.value("/process", "4xx") == before_requests + 1
+
+
+def test_non_image_upload_is_a_client_error():
+    """/analyze : un fichier qui n'est pas une image est une erreur 400, pas 500"""
+    before = metrics.requests_total.value("/analyze", "4xx")
+
+    response = request("POST", "/analyze", files={"file": ("notes.txt", b"texte", "text/plain")})
+
+    assert response.status_code == 400
+    assert metrics.requests_total.value("/analyze", "4xx") == before + 1
+
+
+def test_overhead():
+    """Une mesure d'étape coûte quelques microsecondes"""
+    iterations = 10000
+    start = time.perf_counter()
+    for _ in range(iterations):
+        with metrics.stage("encode"):
+            pass
+    per_call_us = (time.perf_counter() - start) / iterations * 1e6
+    assert per_call_us < 50, per_call_us
+
+
+if __name__ == "__main__":
+    test_exposition_format()
+    test_shared_rows_are_summed()
+    test_analyze_request_is_recorded()
+    test_errors_are_counted()
+    test_non_image_upload_is_a_client_error()
+    test_overhead()
+    print("✅ Tests des métriques réussis")
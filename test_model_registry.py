@@ -0,0 +1,82 @@
+"""
+Tests du registre des modèles (chargement paresseux, préchauffage, readiness)
+"""
+import asyncio
+import threading
+import time
+from model_registry import ModelRegistry, preload_models, READY, FAILED, NOT_LOADED
+
+
+def test_lazy_load_once_and_warmup():
+    """Le modèle est chargé au premier appel, une seule fois, puis préchauffé"""
+    registry = ModelRegistry()
+    loads = []
+    warmups = []
+
+    def loader():
+        loads.append(1)
+        time.sleep(0.05)
+        return "modèle"
+
+    registry.register("classifier", loader, warmup=warmups.append, executor="analyze")
+    assert registry.status()["classifier"]["state"] == NOT_LOADED
+    assert not registry.is_ready()
+
+    threads = [threading.Thread(target=registry.get, args=("classifier",)) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    status = registry.status()["classifier"]
+    assert loads == [1]
+    assert warmups == ["modèle"]
+    assert status["state"] == READY
+    assert status["load_ms"] >= 50
+    assert status["last_warmup_ms"] is not None
+    assert registry.get("classifier") == "modèle"
+    assert registry.is_ready()
+
+
+def test_failed_load_is_reported_and_retried():
+    """Un échec est visible dans l'état et le chargement est retenté"""
+    registry = ModelRegistry()
+    attempts = []
+
+    def loader():
+        attempts.append(1)
+        if len(attempts) == 1:
+            raise OSError("poids introuvables")
+        return "modèle"
+
+    registry.register("classifier", loader)
+    try:
+        registry.get("classifier")
+    except RuntimeError:
+        pass
+    else:
+        raise AssertionError("RuntimeError attendue")
+
+    assert registry.status()["classifier"]["state"] == FAILED
+    assert "poids introuvables" in registry.status()["classifier"]["error"]
+    assert registry.get("classifier") == "modèle"
+
+
+def test_preload_only_gates_preloaded_models():
+    """Le préchargement ne charge que les modèles marqués preload"""
+    registry = ModelRegistry()
+    registry.register("classifier", lambda: "modèle", executor="analyze")
+    registry.register("background_removal", lambda: "rembg", executor="remove_background", preload=False)
+
+    asyncio.run(preload_models(registry))
+
+    assert registry.status()["classifier"]["state"] == READY
+    assert registry.status()["background_removal"]["state"] == NOT_LOADED
+    assert registry.is_ready()
+
+
+if __name__ == "__main__":
+    test_lazy_load_once_and_warmup()
+    test_failed_load_is_reported_and_retried()
+    test_preload_only_gates_preloaded_models()
+    print("✅ Tests du registre des modèles réussis")
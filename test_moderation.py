@@ -4,8 +4,10 @@ Script de test pour la modération de contenu
 from content_moderation import (
     detect_inappropriate_content, 
     validate_image_for_clothing,
+    moderation_stats,
     ContentModerationError
 )
+from PIL import ImageStat
 from PIL import Image
 import io
 import numpy as np
@@ -129,6 +131,55 @@ def test_validation():
     except ValueError as e:
         print(f"   ❌ Image invalide: {str(e)}")
 
+def test_signed_arithmetic():
+    """r - g ne doit pas reboucler : un pixel vert n'est pas de la peau"""
+    img = np.zeros((64, 64, 3), dtype=np.uint8)
+    img[:, :] = [100, 200, 30]  # r < g : 100 - 200 vaut 156 en uint8
+    stats = moderation_stats(img)
+    assert stats["skin_percentage"] == 0.0
+
+    img[:, :] = [220, 180, 150]
+    assert moderation_stats(img)["skin_percentage"] == 1.0
+    print("✅ Arithmétique signée correcte")
+
+def test_stats_match_imagestat():
+    """Une seule passe : mêmes peau et luminosité que le masque complet et ImageStat"""
+    rng = np.random.RandomState(0)
+    img = rng.randint(0, 256, size=(300, 200, 3)).astype(np.uint8)
+    stats = moderation_stats(img)
+
+    r, g, b = [img[:, :, i].astype(np.int16) for i in range(3)]
+    expected_skin = ((r > 95) & (g > 40) & (b > 20) & (r > g) & (r > b) & (r - g > 15)).mean()
+    expected_brightness = sum(ImageStat.Stat(Image.fromarray(img)).mean) / 3
+    assert abs(stats["skin_percentage"] - expected_skin) < 1e-9
+    assert abs(stats["brightness"] - expected_brightness) < 1e-6
+    assert stats["scanned"] == 1.0
+    print("✅ Statistiques identiques à la référence")
+
+def test_early_exit():
+    """Le parcours s'arrête dès que la décision est certaine"""
+    img = np.zeros((512, 512, 3), dtype=np.uint8)
+    img[:, :] = [220, 180, 150]
+    stats = moderation_stats(img, safe_below=0.4, unsafe_above=0.6)
+    assert stats["scanned"] < 1.0
+    assert stats["skin_percentage"] > 0.6
+
+    img[:, :] = [50, 50, 100]
+    stats = moderation_stats(img, safe_below=0.4, unsafe_above=0.6)
+    assert stats["scanned"] < 1.0
+    assert stats["skin_percentage"] <= 0.4
+    print("✅ Arrêt anticipé")
+
+def test_bounded_thumbnail():
+    """La modération d'une grande image ne parcourt qu'une miniature bornée"""
+    img = Image.new("RGB", (3000, 2000), (50, 50, 100))
+    buffer = io.BytesIO()
+    img.save(buffer, format="JPEG")
+    result = detect_inappropriate_content(buffer.getvalue())
+    assert result["is_safe"]
+    assert result["skin_percentage"] == 0.0
+    print("✅ Miniature bornée")
+
 def main():
     """Exécuter tous les tests"""
     print("\n" + "🛡️ " * 20)
@@ -139,6 +190,10 @@ def main():
     test_nsfw_image()
     test_borderline_image()
     test_validation()
+    test_signed_arithmetic()
+    test_stats_match_imagestat()
+    test_early_exit()
+    test_bounded_thumbnail()
     
     print("\n" + "="*60)
     print("📊 RÉSUMÉ")
@@ -0,0 +1,142 @@
+"""
+Tests du pipeline combiné /process (modération, analyse, suppression d'arrière-plan)
+"""
+import asyncio
+import base64
+import io
+import json
+import httpx
+from PIL import Image
+import pipeline
+from main import app
+from pipeline import parse_steps, run_pipeline
+from test_helpers import make_image_bytes
+
+
+def post(data=None, content=None):
+    async def send():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            return await client.post(
+                "/process",
+                files={"file": ("veste.png", content or make_image_bytes(), "image/png")},
+                data=data or {}
+            )
+    return asyncio.run(send())
+
+
+def test_parse_steps():
+    """Étapes dans l'ordre du pipeline, modération toujours incluse"""
+    assert parse_steps("background_removal,analysis") == ["moderation", "analysis", "background_removal"]
+    assert parse_steps(None) == ["moderation", "analysis", "background_removal"]
+    for invalid in ("analysis,ocr", " , "):
+        try:
+            parse_steps(invalid)
+        except ValueError:
+            pass
+        else:
+            raise AssertionError(f"ValueError attendue pour {invalid!r}")
+
+
+def test_blocked_image_never_reaches_models(monkeypatch):
+    """Une image refusée par la modération n'est ni analysée ni détourée"""
+    called = []
+
+    async def fake_analyze(context):
+        called.append("analysis")
+
+    monkeypatch.setattr(pipeline, "_analyze", fake_analyze)
+    monkeypatch.setattr(pipeline, "remove_background", lambda context: called.append("background_removal"))
+
+    response = post(content=make_image_bytes(size=(200, 200), color=(220, 180, 150)))
+
+    assert response.status_code == 451
+    assert response.json()["detail"]["error"] == "content_blocked"
+    assert called == []
+
+
+def test_unsupported_format_fails_before_any_step(monkeypatch):
+    """Un GIF est refusé avant la modération et l'analyse quand le détourage est demandé"""
+    called = []
+
+    async def fake_analyze(context):
+        called.append("analysis")
+
+    monkeypatch.setattr(pipeline, "_analyze", fake_analyze)
+    monkeypatch.setattr(pipeline, "validate_image_for_clothing", lambda context: called.append("moderation"))
+    response = post(content=make_image_bytes(size=(64, 64), fmt="GIF"))
+
+    assert response.status_code == 400
+    assert response.json()["detail"]["error"] == "invalid_image"
+    assert called == []
+
+
+def test_json_response():
+    """Réponse JSON : analyse, métadonnées et PNG en base64"""
+    response = post()
+    assert response.status_code == 200
+    body = response.json()
+
+    assert body["steps"] == ["moderation", "analysis", "background_removal"]
+    assert body["moderation"]["is_safe"]
+    assert len(body["analysis"]["embedding"]) == 128
+    image = Image.open(io.BytesIO(base64.b64decode(body["background_removal"]["image_base64"])))
+    assert image.format == "PNG" and image.size == (160, 120)
+    assert set(body["timings_ms"]) == {"moderation", "analysis", "background_removal"}
+
+
+def test_multipart_response():
+    """Réponse multipart/mixed : une partie JSON puis le PNG binaire"""
+    response = post(data={"steps": "background_removal", "response_format": "multipart"})
+    assert response.status_code == 200
+    content_type = response.headers["content-type"]
+    assert content_type.startswith("multipart/mixed; boundary=")
+    boundary = content_type.split("boundary=")[1].encode()
+
+    parts = [p for p in response.content.split(b"--" + boundary) if p.strip(b"-\r\n")]
+    assert len(parts) == 2
+    headers, result = parts[0].split(b"\r\n\r\n", 1)
+    assert b"application/json" in headers
+    body = json.loads(result.rstrip(b"\r\n"))
+    assert body["steps"] == ["moderation", "background_removal"]
+    assert "analysis" not in body
+
+    headers, image_bytes = parts[1].split(b"\r\n\r\n", 1)
+    assert b"image/png" in headers
+    assert Image.open(io.BytesIO(image_bytes[:-2])).size == (160, 120)
+
+
+def test_mask_output_format():
+    """Le masque seul passe aussi par /process"""
+    response = post(data={"steps": "background_removal", "output_format": "mask"})
+    assert response.status_code == 200
+    result = response.json()["background_removal"]
+    assert result["metadata"]["output_format"] == "mask"
+    assert Image.open(io.BytesIO(base64.b64decode(result["image_base64"]))).mode == "L"
+
+
+def test_invalid_steps_and_format():
+    """Étapes ou format inconnus : 400 invalid_pipeline"""
+    for data in ({"steps": "ocr"}, {"response_format": "xml"}):
+        response = post(data=data)
+        assert response.status_code == 400
+        assert response.json()["detail"]["error"] == "invalid_pipeline"
+
+
+def test_parallel_and_sequential_agree():
+    """Les deux modes d'exécution produisent le même résultat"""
+    image_bytes = make_image_bytes(color=(90, 30, 30))
+    parallel = asyncio.run(run_pipeline(image_bytes, parallel=True))
+    sequential = asyncio.run(run_pipeline(image_bytes, parallel=False))
+    assert parallel["analysis"] == sequential["analysis"]
+    assert parallel["background_removal"][0] == sequential["background_removal"][0]
+
+
+if __name__ == "__main__":
+    test_parse_steps()
+    test_json_response()
+    test_multipart_response()
+    test_mask_output_format()
+    test_invalid_steps_and_format()
+    test_parallel_and_sequential_agree()
+    print("✅ Tests du pipeline réussis")
@@ -0,0 +1,70 @@
+"""
+Tests de la supervision des workers du serveur pré-forké
+"""
+import mmap
+import os
+import signal
+import time
+from prefork import PreforkServer, _HEARTBEAT
+
+
+class SleepingServer(PreforkServer):
+    """Workers factices : dorment au lieu de servir l'application"""
+
+    def _run_worker(self, slot):
+        time.sleep(30)
+
+
+def make_server(**kwargs):
+    server = SleepingServer(workers=2, **kwargs)
+    server._heartbeats = mmap.mmap(-1, _HEARTBEAT.size * server.workers)
+    return server
+
+
+def wait_reaped(server, pid, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while pid in server._children and time.monotonic() < deadline:
+        server._reap()
+        time.sleep(0.05)
+
+
+def test_dead_worker_is_replaced():
+    """Un worker terminé est remplacé dans le même emplacement"""
+    server = make_server()
+    try:
+        for slot in range(server.workers):
+            server._spawn(slot)
+        old_pid = next(pid for pid, w in server._children.items() if w.slot == 0)
+
+        os.kill(old_pid, signal.SIGKILL)
+        wait_reaped(server, old_pid)
+
+        slots = sorted(w.slot for w in server._children.values())
+        assert old_pid not in server._children
+        assert slots == [0, 1]
+    finally:
+        server._stopping = True
+        server.graceful_timeout = 1.0
+        server._stop_workers()
+
+
+def test_worker_without_heartbeat_is_killed():
+    """Un worker sans battement de cœur au-delà du délai est tué"""
+    server = make_server(heartbeat_timeout=0.01)
+    try:
+        server._spawn(0)
+        pid = next(iter(server._children))
+        time.sleep(0.05)
+        server._check_heartbeats()
+        server._stopping = True  # pas de remplacement
+        wait_reaped(server, pid)
+        assert pid not in server._children
+    finally:
+        server.graceful_timeout = 1.0
+        server._stop_workers()
+
+
+if __name__ == "__main__":
+    test_dead_worker_is_replaced()
+    test_worker_without_heartbeat_is_killed()
+    print("✅ Tests du serveur pré-forké réussis")
@@ -0,0 +1,130 @@
+"""
+Tests de l'en-tête Server-Timing et du profilage à la demande (profiling.py)
+"""
+import json
+import os
+import threading
+import time
+from config import PROFILING_CONFIG
+from metrics import server_timing_header
+from profiling import ProfileGate, ProfilingMiddleware, SamplingProfiler, profile_gate
+from test_helpers import make_image_bytes
+from test_metrics import request
+
+
+def busy_loop(seconds):
+    deadline = time.perf_counter() + seconds
+    total = 0
+    while time.perf_counter() < deadline:
+        total += 1
+    return total
+
+
+def test_server_timing_header():
+    """Durées cumulées par étape, dans l'ordre d'apparition, puis le total"""
+    header = server_timing_header([("decode", 0.010), ("forward", 0.020), ("decode", 0.005)], 0.05)
+    assert header == "decode;dur=15.0, forward;dur=20.0, total;dur=50.0"
+
+
+def test_response_carries_stage_breakdown():
+    """Chaque réponse de /analyze porte les étapes traversées par la requête"""
+    response = request("POST", "/analyze", files={"file": ("veste.png", make_image_bytes(), "image/png")})
+
+    assert response.status_code == 200
+    entries = [entry.split(";")[0] for entry in response.headers["server-timing"].split(", ")]
+    for name in ("upload_read", "decode", "preprocess", "inference", "serialization"):
+        assert name in entries, entries
+    assert entries[-1] == "total"
+    assert "x-profile-id" not in response.headers
+
+
+def test_sampling_profiler():
+    """Les piles du thread actif sont échantillonnées, celles des threads en attente ignorées"""
+    idle = threading.Event()
+    waiter = threading.Thread(target=idle.wait, name="waiter")
+    worker = threading.Thread(target=busy_loop, args=(0.2,), name="worker")
+    waiter.start()
+
+    profiler = SamplingProfiler(interval=0.002)
+    profiler.start()
+    worker.start()
+    worker.join()
+    profiler.stop()
+    idle.set()
+    waiter.join()
+
+    profile = profiler.to_speedscope("test")
+    names = [p["name"] for p in profile["profiles"]]
+    assert names[0] == "worker"
+    assert "waiter" not in names
+    frames = profile["shared"]["frames"]
+    # Le premier échantillon peut tomber dans le démarrage du thread, avant busy_loop
+    leaves = {frames[sample[-1]]["name"] for sample in profile["profiles"][0]["samples"]}
+    assert "busy_loop" in leaves
+    assert "busy_loop (test_profiling.py" in profiler.to_collapsed()
+
+
+def test_gate_requires_token_and_limits_rate():
+    """Sans jeton, l'en-tête est ignoré ; un seul profil à la fois et quota par minute"""
+    config = dict(PROFILING_CONFIG, token=None, sample_rate=0.0, max_per_minute=2)
+    gate = ProfileGate(config)
+    assert not gate.wanted([(b"x-profile", b"1")])
+
+    config["token"] = "secret"
+    assert gate.wanted([(b"x-profile", b"secret")])
+    assert not gate.wanted([(b"x-profile", b"autre")])
+
+    assert gate.acquire()
+    assert not gate.acquire()  # profil en cours
+    gate.release()
+    assert gate.acquire()
+    gate.release()
+    assert not gate.acquire()  # quota atteint
+
+
+def test_profiled_request(tmp_path, monkeypatch):
+    """L'en-tête avec le jeton produit un fichier speedscope nommé dans X-Profile-Id"""
+    monkeypatch.setitem(PROFILING_CONFIG, "token", "secret")
+    monkeypatch.setitem(PROFILING_CONFIG, "output_dir", str(tmp_path))
+
+    response = request(
+        "POST", "/analyze",
+        files={"file": ("veste.png", make_image_bytes(), "image/png")},
+        headers={"X-Profile": "secret"}
+    )
+
+    assert response.status_code == 200
+    path = os.path.join(str(tmp_path), response.headers["x-profile-id"])
+    with open(path) as f:
+        profile = json.load(f)
+    assert profile["name"] == "POST /analyze"
+    assert all(p["type"] == "sampled" for p in profile["profiles"])
+
+
+def test_unknown_format_never_holds_the_gate(monkeypatch):
+    """Format inconnu : refusé à la création du middleware, requête servie sans profil ensuite"""
+    try:
+        ProfilingMiddleware(None, ProfileGate(dict(PROFILING_CONFIG, format="pstats")))
+    except ValueError:
+        pass
+    else:
+        raise AssertionError("ValueError attendue")
+
+    monkeypatch.setitem(PROFILING_CONFIG, "token", "secret")
+    monkeypatch.setitem(PROFILING_CONFIG, "format", "pstats")
+    response = request(
+        "POST", "/analyze",
+        files={"file": ("veste.png", make_image_bytes(), "image/png")},
+        headers={"X-Profile": "secret"}
+    )
+    assert response.status_code == 200
+    assert "x-profile-id" not in response.headers
+    assert not profile_gate._active
+
+
+if __name__ == "__main__":
+    test_server_timing_header()
+    test_response_carries_stage_breakdown()
+    test_sampling_profiler()
+    test_gate_requires_token_and_limits_rate()
+    print("✅ Tests du profilage réussis")
@@ -0,0 +1,53 @@
+"""
+Tests de la quantification INT8 du classifieur
+"""
+import os
+import tempfile
+from inference_backends import OnnxRuntimeBackend, export_onnx
+from config import QUANTIZATION_CONFIG
+from quantization import calibration_tensors, evaluation_tensors, quantize_model, drift_report
+from test_inference_backends import random_model
+
+
+def test_int8_model_is_smaller_and_close_to_float():
+    """Le modèle INT8 est ~4x plus petit et ses embeddings restent proches du float"""
+    with tempfile.TemporaryDirectory() as tmp:
+        float_path = export_onnx(random_model(), os.path.join(tmp, "mobilenet_v2.onnx"))
+        int8_path = quantize_model(
+            float_path,
+            os.path.join(tmp, "mobilenet_v2-int8.onnx"),
+            calibration_tensors(8)
+        )
+
+        assert os.path.getsize(int8_path) < os.path.getsize(float_path) / 3
+        assert sorted(os.listdir(tmp)) == ["mobilenet_v2-int8.onnx", "mobilenet_v2.onnx"]
+
+        report = drift_report(
+            OnnxRuntimeBackend(float_path, intra_op_threads=1),
+            OnnxRuntimeBackend(int8_path, intra_op_threads=1),
+            calibration_tensors(8, seed=1)
+        )
+        assert report["images"] == 8
+        assert 0.0 <= report["top1_agreement"] <= 1.0
+        assert report["embedding_cosine_mean"] > 0.9
+        print(f"✅ Top-1 identique {report['top1_agreement']:.0%}, "
+              f"cosinus moyen {report['embedding_cosine_mean']:.4f}")
+
+
+def test_evaluation_never_uses_calibration_images(monkeypatch):
+    """La dérive n'est jamais mesurée sur les images de calibration"""
+    with tempfile.TemporaryDirectory() as tmp:
+        monkeypatch.setitem(QUANTIZATION_CONFIG, "calibration_dir", tmp)
+        try:
+            evaluation_tensors(4, tmp)
+        except ValueError:
+            pass
+        else:
+            raise AssertionError("ValueError attendue")
+        # Sans répertoire d'évaluation : images synthétiques, pas la calibration
+        assert len(evaluation_tensors(4)) == 4
+
+
+if __name__ == "__main__":
+    test_int8_model_is_smaller_and_close_to_float()
+    print("✅ Tests de la quantification réussis")
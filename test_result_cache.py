@@ -0,0 +1,111 @@
+"""
+Tests du cache de résultats d'analyse
+"""
+import asyncio
+import os
+import tempfile
+import threading
+import time
+import result_cache
+from config import DECODE_CONFIG
+from result_cache import ResultCache, cached_analysis, config_version
+
+
+def test_memory_hit_and_miss():
+    """Un upload identique est servi depuis le cache"""
+    cache = ResultCache(max_entries=4, ttl_seconds=60)
+    key = cache.make_key(b"image-1")
+
+    assert cache.get(key) is None
+    cache.set(key, {"type": "haut", "embedding": [0.1, 0.2]})
+
+    assert cache.get(key) == {"type": "haut", "embedding": [0.1, 0.2]}
+    assert cache.make_key(b"image-1") == key
+    assert cache.make_key(b"image-2") != key
+
+    stats = cache.stats()
+    assert stats["hits"] == 1
+    assert stats["misses"] == 1
+
+
+def test_lru_eviction_and_ttl():
+    """Le LRU est borné et les entrées expirent"""
+    cache = ResultCache(max_entries=2, ttl_seconds=60)
+    for name in (b"a", b"b", b"c"):
+        cache.set(cache.make_key(name), {"name": name.decode()})
+
+    assert cache.get(cache.make_key(b"a")) is None
+    assert cache.get(cache.make_key(b"c")) == {"name": "c"}
+    assert cache.stats()["evictions"] == 1
+
+    short = ResultCache(max_entries=2, ttl_seconds=0.01)
+    short.set("k", {"name": "x"})
+    time.sleep(0.02)
+    assert short.get("k") is None
+    assert short.stats()["expirations"] == 1
+
+
+def test_disk_tier_survives_restart():
+    """Le niveau SQLite est relu par une nouvelle instance"""
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "cache.sqlite3")
+        first = ResultCache(max_entries=2, ttl_seconds=60, disk_path=path)
+        key = first.make_key(b"image")
+        first.set(key, {"type": "bas"})
+
+        second = ResultCache(max_entries=2, ttl_seconds=60, disk_path=path)
+        assert second.get(key) == {"type": "bas"}
+        assert second.stats()["disk_hits"] == 1
+        print("✅ Résultat relu depuis le cache disque après redémarrage")
+
+
+def test_version_changes_key():
+    """Une nouvelle version de modèle/config invalide les clés"""
+    old = ResultCache(version="v1")
+    new = ResultCache(version="v2")
+    assert old.make_key(b"image") != new.make_key(b"image")
+
+
+def test_decode_config_changes_version(monkeypatch):
+    """Activer ou non le décodage réduit change la version du cache"""
+    before = config_version()
+    monkeypatch.setitem(DECODE_CONFIG, "fast_decode", not DECODE_CONFIG["fast_decode"])
+    assert config_version() != before
+
+
+def test_cached_analysis_runs_off_event_loop(monkeypatch):
+    """cached_analysis calcule une seule fois ; hash et SQLite hors de la boucle"""
+    cache = ResultCache(disk_path=os.path.join(tempfile.mkdtemp(), "cache.sqlite3"))
+    lookup_threads = []
+    make_key = cache.make_key
+
+    def tracking_make_key(image_bytes):
+        lookup_threads.append(threading.get_ident())
+        return make_key(image_bytes)
+
+    monkeypatch.setattr(cache, "make_key", tracking_make_key)
+    monkeypatch.setattr(result_cache, "analysis_cache", cache)
+    calls = []
+
+    async def compute():
+        calls.append(1)
+        return {"type": "haut"}
+
+    async def run():
+        first = await cached_analysis(b"image", compute)
+        second = await cached_analysis(b"image", compute)
+        return threading.get_ident(), first, second
+
+    loop_thread, first, second = asyncio.run(run())
+    assert first == second == {"type": "haut"}
+    assert len(calls) == 1
+    assert loop_thread not in lookup_threads
+    assert cache.stats()["disk_entries"] == 1
+
+
+if __name__ == "__main__":
+    test_memory_hit_and_miss()
+    test_lru_eviction_and_ttl()
+    test_disk_tier_survives_restart()
+    test_version_changes_key()
+    print("✅ Tests du cache de résultats réussis")
@@ -0,0 +1,97 @@
+"""
+Tests des encodages compacts de l'embedding et de la sérialisation (serialization.py)
+"""
+import asyncio
+import json
+import tempfile
+import httpx
+import numpy as np
+import main
+from serialization import decode_embedding, dumps, encode_embedding, negotiate_embedding_format
+from similarity_index import SimilarityIndex
+from test_helpers import make_image_bytes
+
+
+def test_embedding_round_trip():
+    """f32 exact, f16 et int8 à la précision attendue ; tailles réduites"""
+    rng = np.random.default_rng(0)
+    values = (rng.standard_normal(128) * 3).tolist()
+    json_size = len(dumps(values))
+
+    for embedding_format, tolerance in (("f32", 1e-6), ("f16", 1e-2), ("int8", 0.05)):
+        encoded = encode_embedding(values, embedding_format)
+        assert encoded["encoding"] == embedding_format and encoded["dims"] == 128
+        assert len(dumps(encoded)) < json_size / 3
+        decoded = decode_embedding(json.loads(dumps(encoded)))
+        assert np.allclose(decoded, values, rtol=tolerance, atol=tolerance * 3)
+
+    assert encode_embedding(values, "json") == values
+    assert decode_embedding(encode_embedding([0.0] * 4, "int8")) == [0.0] * 4
+
+
+def test_negotiation():
+    """Paramètre de requête prioritaire sur Accept ; format inconnu refusé"""
+    assert negotiate_embedding_format() == "json"
+    assert negotiate_embedding_format(accept="application/json; embedding=f16") == "f16"
+    assert negotiate_embedding_format("INT8", "application/json; embedding=f16") == "int8"
+    assert negotiate_embedding_format(accept="text/html, application/json;q=0.9") == "json"
+    try:
+        negotiate_embedding_format("f64")
+    except ValueError:
+        pass
+    else:
+        raise AssertionError("ValueError attendue")
+
+
+def test_analyze_embedding_format():
+    """/analyze : même embedding, encodé selon le format négocié"""
+    image_bytes = make_image_bytes()
+
+    async def run():
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            files = {"file": ("pull.png", image_bytes, "image/png")}
+            plain = await client.post("/analyze", files=files)
+            compact = await client.post("/analyze", files=files, headers={"Accept": "application/json; embedding=f32"})
+            invalid = await client.post("/analyze?embedding_format=f64", files=files)
+            return plain, compact, invalid
+
+    plain, compact, invalid = asyncio.run(run())
+    assert plain.status_code == 200 and compact.status_code == 200
+    embedding = plain.json()["embedding"]
+    assert isinstance(embedding, list) and len(embedding) == 128
+    assert np.allclose(decode_embedding(compact.json()["embedding"]), embedding, rtol=1e-6, atol=1e-6)
+    assert len(compact.content) < len(plain.content)
+    assert invalid.status_code == 400
+    assert invalid.json()["detail"]["error"] == "invalid_embedding_format"
+
+
+def test_similarity_accepts_compact_embeddings(monkeypatch):
+    """Un embedding compact retourné par /analyze peut être renvoyé tel quel à /similar"""
+    index = SimilarityIndex(tempfile.mkdtemp(), dimensions=4)
+    monkeypatch.setattr(main, "get_similarity_index", lambda: index)
+    vectors = {"a": [1.0, 0.0, 0.0, 0.0], "b": [0.0, 1.0, 0.0, 0.0]}
+
+    async def run():
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            inserted = await client.post("/similar/items", json={"items": [
+                {"id": "a", "embedding": encode_embedding(vectors["a"], "f16")},
+                {"id": "b", "embedding": vectors["b"]},
+            ]})
+            found = await client.post("/similar", json={"embedding": encode_embedding([0.9, 0.1, 0.0, 0.0], "int8"), "k": 1})
+            invalid = await client.post("/similar", json={"embedding": {"encoding": "f64", "data": "AAAA"}})
+            return inserted, found, invalid
+
+    inserted, found, invalid = asyncio.run(run())
+    assert inserted.status_code == 200 and inserted.json()["inserted"] == 2
+    assert found.json()["results"][0]["id"] == "a"
+    assert invalid.status_code == 400
+    assert invalid.json()["detail"]["error"] == "invalid_embedding"
+
+
+if __name__ == "__main__":
+    test_embedding_round_trip()
+    test_negotiation()
+    test_analyze_embedding_format()
+    print("✅ Tests de sérialisation réussis")
@@ -0,0 +1,95 @@
+"""
+Tests de l'index de similarité sur les embeddings
+"""
+import tempfile
+import numpy as np
+from similarity_index import SimilarityIndex
+
+
+def random_vectors(n, dimensions=16, seed=0):
+    """Vecteurs regroupés en quelques clusters (cas réaliste pour l'IVF)"""
+    rng = np.random.RandomState(seed)
+    centers = rng.normal(size=(20, dimensions))
+    labels = rng.randint(0, 20, size=n)
+    return (centers[labels] + 0.3 * rng.normal(size=(n, dimensions))).astype(np.float32)
+
+
+def test_exact_search_insert_update_delete():
+    """Insertion, recherche exacte, remplacement et suppression"""
+    with tempfile.TemporaryDirectory() as tmp:
+        index = SimilarityIndex(tmp, dimensions=4)
+        index.add(["a", "b", "c"], [[1, 0, 0, 0], [0, 1, 0, 0], [0.9, 0.1, 0, 0]])
+
+        results, mode = index.search([1, 0, 0, 0], k=2, mode="exact")
+        assert mode == "exact"
+        assert [r["id"] for r in results] == ["a", "c"]
+        assert abs(results[0]["score"] - 1.0) < 1e-6
+
+        # Remplacer "a" : l'ancien vecteur ne doit plus être retrouvé
+        index.add(["a"], [[0, 0, 1, 0]])
+        results, _ = index.search([1, 0, 0, 0], k=1, mode="exact")
+        assert results[0]["id"] == "c"
+
+        assert index.delete("c") is True
+        assert index.delete("inconnu") is False
+        results, _ = index.search([1, 0, 0, 0], k=3, mode="exact")
+        assert "c" not in [r["id"] for r in results]
+        assert index.stats()["vectors"] == 2
+
+
+def test_persistence_and_shared_reload():
+    """L'index est relu depuis le disque et les écritures d'un autre worker sont vues"""
+    with tempfile.TemporaryDirectory() as tmp:
+        writer = SimilarityIndex(tmp, dimensions=4)
+        writer.add(["a"], [[1, 0, 0, 0]])
+
+        reader = SimilarityIndex(tmp, dimensions=4)
+        assert reader.search([1, 0, 0, 0], k=1)[0][0]["id"] == "a"
+
+        writer.add(["b"], [[0, 1, 0, 0]])
+        assert reader.search([0, 1, 0, 0], k=1)[0][0]["id"] == "b"
+
+
+def test_invalid_embedding_is_rejected():
+    """Une dimension incorrecte lève une ValueError"""
+    with tempfile.TemporaryDirectory() as tmp:
+        index = SimilarityIndex(tmp, dimensions=4)
+        try:
+            index.add(["a"], [[1, 0, 0]])
+        except ValueError:
+            pass
+        else:
+            raise AssertionError("ValueError attendue")
+
+
+def test_approximate_search_recall():
+    """L'IVF retrouve l'essentiel des voisins exacts"""
+    with tempfile.TemporaryDirectory() as tmp:
+        vectors = random_vectors(5000)
+        index = SimilarityIndex(tmp, dimensions=16, nprobe=8)
+        index.add([f"item-{i}" for i in range(len(vectors))], vectors)
+        index.build_ivf(nlist=50)
+
+        # Vecteurs ajoutés après l'entraînement : parcourus exactement
+        index.add(["late"], vectors[:1] * 1.0001)
+
+        queries = random_vectors(20, seed=1)
+        found = 0
+        for query in queries:
+            exact = {r["id"] for r in index.search(query, k=10, mode="exact")[0]}
+            approx, mode = index.search(query, k=10, mode="approximate")
+            assert mode == "approximate"
+            found += len(exact & {r["id"] for r in approx})
+        recall = found / (10 * len(queries))
+
+        assert recall >= 0.8
+        assert index.search(vectors[0], k=2, mode="approximate")[0][0]["id"] in ("item-0", "late")
+        print(f"✅ Recall@10 IVF : {recall:.0%}")
+
+
+if __name__ == "__main__":
+    test_exact_search_insert_update_delete()
+    test_persistence_and_shared_reload()
+    test_invalid_embedding_is_rejected()
+    test_approximate_search_recall()
+    print("✅ Tests de l'index de similarité réussis")
@@ -0,0 +1,102 @@
+"""
+Tests de la réception des uploads (limite de taille et lecture sans copie)
+"""
+import asyncio
+import io
+import httpx
+from fastapi import FastAPI, File, UploadFile
+from PIL import Image
+import main
+from image_context import ImageContext
+from uploads import UploadLimitMiddleware, UploadTooLargeError, read_file_buffer, read_upload
+
+
+def make_app():
+    app = FastAPI()
+    app.add_middleware(UploadLimitMiddleware)
+
+    @app.post("/upload")
+    async def upload(file: UploadFile = File(...)):
+        content = await read_upload(file)
+        return {"size": len(content)}
+
+    return app
+
+
+def post(app, path="/upload", **kwargs):
+    async def send():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            return await client.post(path, **kwargs)
+    return asyncio.run(send())
+
+
+def test_read_file_buffer_and_limit():
+    """Le contenu est lu en une fois et la limite est appliquée"""
+    view = read_file_buffer(io.BytesIO(b"x" * 1000), max_bytes=1000)
+    assert isinstance(view, memoryview)
+    assert bytes(view) == b"x" * 1000
+
+    try:
+        read_file_buffer(io.BytesIO(b"x" * 1001), max_bytes=1000)
+    except UploadTooLargeError as e:
+        assert e.limit == 1000
+    else:
+        raise AssertionError("UploadTooLargeError attendue")
+
+
+def test_image_context_decodes_memoryview():
+    """Le décodage fonctionne directement sur le buffer de l'upload"""
+    buffer = io.BytesIO()
+    Image.new("RGB", (64, 48), (200, 30, 30)).save(buffer, format="PNG")
+    view = read_file_buffer(io.BytesIO(buffer.getvalue()))
+
+    context = ImageContext(view)
+    assert context.size == (64, 48)
+    assert context.rgb.getpixel((0, 0)) == (200, 30, 30)
+
+
+def test_middleware_rejects_large_upload():
+    """Un upload trop volumineux est refusé avec file_too_large"""
+    app = make_app()
+
+    response = post(app, files={"file": ("a.jpg", b"x" * 100, "image/jpeg")})
+    assert response.status_code == 200
+    assert response.json() == {"size": 100}
+
+    # Content-Length au-delà de la limite : refusé avant la lecture du corps
+    response = post(app, files={"file": ("a.jpg", b"x" * (11 * 1024 * 1024), "image/jpeg")})
+    assert response.status_code == 400
+    assert response.json()["detail"]["error"] == "file_too_large"
+
+    # Corps sans Content-Length : coupé dès que la limite est dépassée
+    async def chunks():
+        yield (b'--b\r\nContent-Disposition: form-data; name="file"; filename="a.jpg"\r\n'
+               b"Content-Type: image/jpeg\r\n\r\n")
+        for _ in range(20):
+            yield b"x" * (1024 * 1024)
+        yield b"\r\n--b--\r\n"
+
+    response = post(app, content=chunks(), headers={"content-type": "multipart/form-data; boundary=b"})
+    assert response.status_code == 400
+    assert response.json()["detail"]["error"] == "file_too_large"
+
+
+def test_rejection_carries_cors_headers():
+    """Sur le service, le refus file_too_large porte les en-têtes CORS"""
+    response = post(
+        main.app, "/analyze",
+        files={"file": ("a.jpg", b"x" * (11 * 1024 * 1024), "image/jpeg")},
+        headers={"Origin": "https://app.serahly.fr"}
+    )
+    assert response.status_code == 400
+    assert response.json()["detail"]["error"] == "file_too_large"
+    assert response.headers["access-control-allow-origin"] == "*"
+
+
+if __name__ == "__main__":
+    test_read_file_buffer_and_limit()
+    test_image_context_decodes_memoryview()
+    test_middleware_rejects_large_upload()
+    test_rejection_carries_cors_headers()
+    print("✅ Tests de réception des uploads réussis")
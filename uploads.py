@@ -0,0 +1,179 @@
+"""
+Réception des uploads, commune à tous les endpoints
+- Refus immédiat d'après Content-Length (avant de lire le corps)
+- Comptage des octets reçus pour les corps sans Content-Length
+- Lecture du fichier spoolé dans un bytearray préalloué, exposé en memoryview
+  (aucune copie supplémentaire jusqu'aux décodeurs)
+"""
+import json
+import time
+from starlette.concurrency import run_in_threadpool
+from config import UPLOAD_CONFIG
+from metrics import observe_stage, record_error, stage
+
+# Endpoints qui acceptent plusieurs images dans une même requête
+BATCH_UPLOAD_PATHS = ("/analyze/batch",)
+
+
+class UploadTooLargeError(ValueError):
+    """Exception levée quand un upload dépasse la limite configurée"""
+    def __init__(self, message, limit):
+        self.message = message
+        self.limit = limit
+        super().__init__(self.message)
+
+
+def too_large_message(limit):
+    return f"Le fichier est trop volumineux (max {limit // (1024 * 1024)}MB)"
+
+
+def request_limit_for(path):
+    """Taille maximale du corps de requête pour un chemin"""
+    if path.startswith(BATCH_UPLOAD_PATHS):
+        return UPLOAD_CONFIG["max_batch_bytes"]
+    return UPLOAD_CONFIG["max_bytes"] + UPLOAD_CONFIG["multipart_overhead_bytes"]
+
+
+def _read_into_buffer(file, max_bytes):
+    """Copie le fichier spoolé dans un bytearray préalloué (une seule copie)"""
+    file.seek(0, 2)
+    size = file.tell()
+    if size > max_bytes:
+        raise UploadTooLargeError(too_large_message(max_bytes), max_bytes)
+    file.seek(0)
+
+    buffer = bytearray(size)
+    view = memoryview(buffer)
+    readinto = getattr(file, "readinto", None)
+    filled = 0
+    while filled < size:
+        if readinto is not None:
+            count = readinto(view[filled:])
+        else:
+            chunk = file.read(size - filled)
+            count = len(chunk)
+            view[filled:filled + count] = chunk
+        if not count:
+            break
+        filled += count
+    return view[:filled]
+
+
+def read_file_buffer(file, max_bytes=None):
+    """Version synchrone de read_upload pour un fichier déjà ouvert"""
+    return _read_into_buffer(file, max_bytes or UPLOAD_CONFIG["max_bytes"])
+
+
+async def read_upload(upload, max_bytes=None):
+    """
+    Lit un UploadFile en respectant la limite de taille
+
+    Args:
+        upload: UploadFile FastAPI
+        max_bytes: Limite (défaut: UPLOAD_CONFIG["max_bytes"])
+
+    Returns:
+        memoryview: Contenu de l'upload, sans copie supplémentaire
+
+    Raises:
+        UploadTooLargeError: Si l'upload dépasse la limite
+    """
+    max_bytes = max_bytes or UPLOAD_CONFIG["max_bytes"]
+    if upload.size is not None and upload.size > max_bytes:
+        raise UploadTooLargeError(too_large_message(max_bytes), max_bytes)
+    with stage("upload_read"):
+        return await run_in_threadpool(_read_into_buffer, upload.file, max_bytes)
+
+
+class UploadLimitMiddleware:
+    """
+    Middleware ASGI : refuse les uploads trop volumineux avant la lecture du
+    corps (Content-Length) ou dès que le flux reçu dépasse la limite
+
+    La réponse 400 est construite ici, hors de l'application : le middleware
+    doit être ajouté avant CORSMiddleware (à l'intérieur) pour que le refus
+    reste lisible par un navigateur.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] not in ("POST", "PUT"):
+            await self.app(scope, receive, send)
+            return
+
+        limit = request_limit_for(scope["path"])
+        content_length = None
+        for name, value in scope["headers"]:
+            if name == b"content-length":
+                try:
+                    content_length = int(value)
+                except ValueError:
+                    pass
+                break
+
+        if content_length is not None and content_length > limit:
+            await self._reject(send, limit)
+            return
+
+        received = 0
+        exceeded = False
+        receive_start = None
+
+        async def limited_receive():
+            nonlocal received, exceeded, receive_start
+            if receive_start is None:
+                receive_start = time.perf_counter()
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > limit:
+                    # Arrêter la lecture : le parseur voit une déconnexion
+                    exceeded = True
+                    return {"type": "http.disconnect"}
+                if not message.get("more_body", False):
+                    observe_stage("upload_receive", time.perf_counter() - receive_start)
+            return message
+
+        response_started = False
+
+        async def guarded_send(message):
+            nonlocal response_started
+            if exceeded:
+                # Remplacer la réponse de l'application par le refus
+                if not response_started:
+                    response_started = True
+                    await self._reject(send, limit)
+                return
+            if message["type"] == "http.response.start":
+                response_started = True
+            await send(message)
+
+        try:
+            await self.app(scope, limited_receive, guarded_send)
+        except Exception:
+            if not exceeded:
+                raise
+        if exceeded and not response_started:
+            await self._reject(send, limit)
+
+    @staticmethod
+    async def _reject(send, limit):
+        record_error("file_too_large")
+        body = json.dumps({
+            "detail": {
+                "error": "file_too_large",
+                "message": too_large_message(limit)
+            }
+        }, ensure_ascii=False).encode("utf-8")
+        await send({
+            "type": "http.response.start",
+            "status": 400,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode()),
+                (b"connection", b"close"),
+            ],
+        })
+        await send({"type": "http.response.body", "body": body})
@@ -1,7 +1,4 @@
-from PIL import Image
-import io
 import torch
-from torchvision import transforms, models
 import random
 from config import (
     CLOTHING_TYPES,
@@ -10,66 +7,157 @@ from config import (
     SIZES,
     MATERIALS,
     PATTERNS,
-    MODEL_CONFIG
+    MODEL_CONFIG,
+    BATCHING_CONFIG,
+    MODEL_LOADING_CONFIG,
+    INFERENCE_CONFIG
 )
+from batching import MicroBatcher
+from executors import run_in_executor
+from image_context import ImageContext, TENSOR_SIZE
+from inference_backends import create_backend
+from metrics import stage, timed
+from model_registry import model_registry
+from result_cache import MODEL_NAME
 
-# Modèle léger pré-entraîné MobileNet pour MVP
-model = models.mobilenet_v2(weights=models.MobileNet_V2_Weights.DEFAULT)
-model.eval()  # mode évaluation
+def load_classifier():
+    """Backend d'inférence du classifieur MobileNet (INFERENCE_CONFIG["backend"])"""
+    return create_backend()
 
-# Transformation image
-transform = transforms.Compose([
-    transforms.Resize((224, 224)),
-    transforms.ToTensor()
-])
+def warmup_classifier(backend):
+    """
+    Inférences de préchauffage sur des tenseurs vides, en alternant un batch
+    unitaire et un batch plein du micro-batcher
+    """
+    batch_sizes = [1, BATCHING_CONFIG["max_batch_size"] if BATCHING_CONFIG["enabled"] else 1]
+    for i in range(MODEL_LOADING_CONFIG["warmup_inferences"]):
+        size = batch_sizes[i % len(batch_sizes)]
+        backend.run(torch.zeros(size, 3, *TENSOR_SIZE))
+
+model_registry.register(
+    "classifier",
+    loader=load_classifier,
+    warmup=warmup_classifier,
+    model_name=f"{MODEL_NAME} ({INFERENCE_CONFIG['backend']}, {INFERENCE_CONFIG['quantization'] or 'float32'})",
+    executor="analyze"
+)
+
+def get_model():
+    """Backend du classifieur chargé (premier appel : chargement + préchauffage)"""
+    return model_registry.get("classifier")
 
-def analyze_image(image_bytes):
+def preprocess_image(image_data):
+    """
+    Décode l'image et la transforme en tenseur (3, 224, 224)
+
+    Args:
+        image_data: Bytes de l'image ou ImageContext déjà décodé
+
+    Raises:
+        ValueError: Si l'image est invalide
+    """
+    return ImageContext.from_input(image_data).tensor
+
+def run_model(batch_tensor):
+    """Forward pass du modèle sur un batch (N, 3, 224, 224)"""
+    model = get_model()
+    with stage("forward"):
+        return model.run(batch_tensor)
+
+def run_model_batch(img_tensors):
+    """
+    Empile des tenseurs individuels, exécute un seul forward pass
+    et retourne une sortie (1, 1000) par image, dans le même ordre
+    """
+    outputs = run_model(torch.stack(img_tensors))
+    return [row.unsqueeze(0) for row in outputs]
+
+# Batcher partagé par les requêtes concurrentes de /analyze
+analysis_batcher = MicroBatcher(
+    run_batch=run_model_batch,
+    max_batch_size=BATCHING_CONFIG["max_batch_size"],
+    max_wait_ms=BATCHING_CONFIG["max_wait_ms"],
+    name="analysis-batcher"
+)
+
+def analyze_image(image_data):
     """
     Analyse une image de vêtement et retourne les infos de base + embedding
     Utilise les vraies données du projet Serahly (Strapi schema)
+
+    Args:
+        image_data: Bytes de l'image ou ImageContext partagé de la requête
     
     Raises:
         ValueError: Si l'image est invalide
     """
     # ANALYSE DE L'IMAGE
     # Chargement image
-    image = Image.open(io.BytesIO(image_bytes)).convert("RGB")
-    img_tensor = transform(image).unsqueeze(0)  # ajout batch dimension
+    img_tensor = preprocess_image(image_data).unsqueeze(0)  # ajout batch dimension
 
     # Prédiction avec le modèle
-    with torch.no_grad():
-        outputs = model(img_tensor)
-        _, predicted = torch.max(outputs, 1)
-    
+    outputs = run_model(img_tensor)
+
+    return build_analysis(outputs)
+
+async def analyze_image_batched(image_data):
+    """
+    Variante asynchrone de analyze_image : le décodage s'exécute dans le pool
+    "analyze" et le forward pass passe par le micro-batcher pour être regroupé
+    avec les requêtes concurrentes
+
+    Raises:
+        ValueError: Si l'image est invalide
+        ExecutorSaturatedError: Si le pool "analyze" est saturé
+    """
+    if not BATCHING_CONFIG["enabled"]:
+        return await run_in_executor("analyze", analyze_image, image_data)
+
+    img_tensor = await run_in_executor("analyze", preprocess_image, image_data)
+    # Attente du batch comprise : le forward pass s'exécute hors de la requête
+    with timed("inference"):
+        outputs = await analysis_batcher.submit(img_tensor)
+    return build_analysis(outputs)
+
+def build_analysis(outputs):
+    """
+    Construit le résultat compatible Strapi à partir des sorties du modèle
+
+    Args:
+        outputs: Tenseur (1, 1000) des logits pour une image
+    """
+    _, predicted = torch.max(outputs, 1)
+
     # Sélection aléatoire basée sur la prédiction (pour MVP)
-    random.seed(predicted.item())
+    # Générateur local : pas d'état global partagé entre requêtes concurrentes
+    rng = random.Random(predicted.item())
     
     # Type de vêtement (mapping vers enum Strapi)
     clothing_type = CLOTHING_TYPES[predicted.item() % len(CLOTHING_TYPES)]
     
     # Sélection de styles compatibles (configurable)
-    num_styles = random.randint(
+    num_styles = rng.randint(
         MODEL_CONFIG["min_styles"],
         MODEL_CONFIG["max_styles"]
     )
-    selected_styles = random.sample(STYLES, num_styles)
+    selected_styles = rng.sample(STYLES, num_styles)
     
     # Couleur aléatoire
-    color = random.choice(COLORS)
+    color = rng.choice(COLORS)
     
     # Taille basée sur le type
-    size = random.choice(SIZES.get(clothing_type, ["M"]))
+    size = rng.choice(SIZES.get(clothing_type, ["M"]))
     
     # Matière et motif
-    material = random.choice(MATERIALS)
-    pattern = random.choice(PATTERNS)
+    material = rng.choice(MATERIALS)
+    pattern = rng.choice(PATTERNS)
     
     # Génération d'un nom descriptif
     name = f"{material} {color}"
 
     # Embedding (vecteur de features pour similarité)
     embedding_size = MODEL_CONFIG["embedding_dimensions"]
-    embedding = outputs.squeeze(0).tolist()[:embedding_size]
+    embedding = outputs[0, :embedding_size].tolist()  # découpé avant la conversion en liste
     
     # Score de confiance
     confidence = float(torch.softmax(outputs, 1).max().item())